@@ -1,6 +1,10 @@
 # %%
 import pandas as pd
 import numpy as np
+import sys
+
+sys.path.append("../..")
+from cei.ranqueamento import utils as utils_ranqueamento  # noqa: E402
 
 trad_tipologia = pd.read_csv("data/ranqueamento/tradutor_tipologia.csv", sep=";")
 trad_reporter = pd.read_csv("data/ranqueamento/tradutor_reporter.csv", sep=";")
@@ -259,3 +263,22 @@ with pd.ExcelWriter(arquivo_acumulado) as writer:
         writer, index=False, sheet_name="base_ranqueamento"
     )
     df_classificacao.to_excel(writer, index=False, sheet_name="classificacao")
+
+# Ranqueamento das duas bases direto dos DataFrames, sem reler as planilhas;
+# os resultados são lidos por destaques.py
+bases_ranqueamento = {
+    "anfacer_destaque_mes": df_comexstat_mes_final,
+    "anfacer_destaque_acumulado": df_comexstat_acumulado_final,
+}
+for arquivo, df_base in bases_ranqueamento.items():
+    df_ranqueamento = utils_ranqueamento.ranquear(
+        base=df_base,
+        classificacao=df_classificacao,
+        colunas_de_renomeacao="coluna",
+    )
+    utils_ranqueamento.salvar_ranqueamento(
+        df_final=df_ranqueamento,
+        classificacao=df_classificacao,
+        arquivo_saida=f"../../cei/ranqueamento/resultados/ranqueamento_{arquivo}.xlsx",
+        colunas_de_renomeacao="coluna",
+    )
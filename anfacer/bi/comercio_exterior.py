@@ -3,6 +3,10 @@ import pandas as pd
 import importlib
 import utils
 import time
+import sys
+
+sys.path.append("../../cei")
+import comexstat  # noqa: E402
 
 script_start_time = time.time()
 
@@ -48,19 +52,15 @@ df_tdm_raw = pd.read_csv(
     "data/comercio_exterior/report.csv", sep=",", encoding="utf_16_le", engine="pyarrow"
 )
 
-df_exp_raw = pd.read_csv(
-    "../../data/EXP_COMPLETA.csv",
-    sep=";",
-    encoding="utf_8",
-    engine="pyarrow",
-).query(f"CO_ANO >= {ano_inicial}")
-
-df_imp_raw = pd.read_csv(
-    "../../data/IMP_COMPLETA.csv",
-    sep=";",
-    encoding="utf_8",
-    engine="pyarrow",
-).query(f"CO_ANO >= {ano_inicial}")
+# Exportação e importação em uma base só (coluna FLUXO); as correções e o
+# tradutor de NCM são aplicados uma vez para os dois fluxos e os dois setores
+df_comex_base = comexstat.ler_comexstat_fluxos(
+    ano_minimo=ano_inicial, rotulos={"EXP": "Exp", "IMP": "Imp"}
+).pipe(
+    utils.ajustes_comexstat_base,
+    updates_config=utils.exp_updates_config + utils.imp_updates_config,
+    trad_ncm=trad_ncm,
+)
 
 # Revestimentos Ceramicos
 ## Arquivo TDM sem Brasil
@@ -69,22 +69,12 @@ df_tdm_sem_brasil = utils.ajuste_tdm_sem_brasil(
 )
 
 ## Comercio exterior do Brasil a partir do Comexstat
-df_exp_comexstat = utils.ajustes_exp_comexstat(
-    df=df_exp_raw,
-    exp_updates_config=utils.exp_updates_config,
-    lista_sh6=lista_sh6_revestimentos,
-    trad_ncm=trad_ncm,
-    trad_cod_pais=trad_cod_pais,
-)
-df_imp_comexstat = utils.ajustes_imp_comexstat(
-    df=df_imp_raw,
-    imp_updates_config=utils.imp_updates_config,
-    lista_sh6=lista_sh6_revestimentos,
-    trad_ncm=trad_ncm,
-    trad_cod_pais=trad_cod_pais,
-)
 df_comexstat = utils.ajustes_comexstat_final(
-    df_exp_comexstat=df_exp_comexstat, df_imp_comexstat=df_imp_comexstat
+    utils.ajustes_comexstat(
+        df_base=df_comex_base,
+        lista_sh6=lista_sh6_revestimentos,
+        trad_cod_pais=trad_cod_pais,
+    )
 ).pipe(utils.update_comex_25)
 
 ## Arquivos Finais (TDM com Brasil e Comexstat)
@@ -115,23 +105,8 @@ df_tdm_sem_brasil_sanitarios = utils.ajuste_tdm_sem_brasil(
 )
 
 ## Comercio exterior do Brasil a partir do Comexstat
-df_exp_comexstat_sanitarios = utils.ajustes_exp_comexstat(
-    df_exp_raw,
-    utils.exp_updates_config,
-    lista_sh6_loucas_sanitarias,
-    trad_ncm,
-    trad_cod_pais,
-)
-df_imp_comexstat_sanitarios = utils.ajustes_imp_comexstat(
-    df_imp_raw,
-    utils.imp_updates_config,
-    lista_sh6_loucas_sanitarias,
-    trad_ncm,
-    trad_cod_pais,
-)
 df_comexstat_sanitarios = utils.ajustes_comexstat_final(
-    df_exp_comexstat=df_exp_comexstat_sanitarios,
-    df_imp_comexstat=df_imp_comexstat_sanitarios,
+    utils.ajustes_comexstat(df_comex_base, lista_sh6_loucas_sanitarias, trad_cod_pais)
 ).pipe(utils.update_comex_25)
 
 ## Arquivos Finais (TDM com Brasil e Comexstat)
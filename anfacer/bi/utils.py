@@ -798,55 +798,17 @@ def apply_comexstat_updates(df, updates_config_list):
     return df
 
 
-def ajustes_exp_comexstat(df, exp_updates_config, lista_sh6, trad_ncm, trad_cod_pais):
-    return (
-        df.assign(FLUXO="Exp")
-        .pipe(apply_comexstat_updates, exp_updates_config)
-        .merge(trad_ncm, on="CO_NCM", how="left")
-        .query(f"CO_SH6 in {lista_sh6}")
-        .groupby(
-            [
-                "CO_ANO",
-                "CO_MES",
-                "CO_SH6",
-                "CO_PAIS",
-                "SG_UF_NCM",
-                "FLUXO",
-                "CO_VIA",
-                "CO_URF",
-            ],
-            as_index=False,
-        )
-        .agg({"VL_FOB": "sum", "QT_ESTAT": "sum"})
-        .astype({"CO_SH6": "Int64"})
-        .assign(
-            CO_PAIS=lambda x: x["CO_PAIS"].astype(str).str.zfill(3),
-            CO_URF=lambda x: x["CO_URF"].astype(str).str.zfill(7),
-            CTY_RPT="BRA",
-        )
-        .astype(
-            {
-                "CO_ANO": "category",
-                "CO_MES": "category",
-                "CO_PAIS": "category",
-                "CO_SH6": "category",
-                "CO_VIA": "category",
-                "CO_URF": "category",
-                "FLUXO": "category",
-                "SG_UF_NCM": "category",
-            }
-        )
-        .merge(trad_cod_pais, on="CO_PAIS", how="left")
-        .drop(columns=["CO_PAIS"])
+def ajustes_comexstat_base(df, updates_config, trad_ncm):
+    # Base combinada de exportação e importação (coluna FLUXO "Exp"/"Imp"):
+    # as correções e o tradutor de NCM são aplicados uma vez para os dois fluxos
+    return df.pipe(apply_comexstat_updates, updates_config).merge(
+        trad_ncm, on="CO_NCM", how="left"
     )
 
 
-def ajustes_imp_comexstat(df, imp_updates_config, lista_sh6, trad_ncm, trad_cod_pais):
+def ajustes_comexstat(df_base, lista_sh6, trad_cod_pais):
     return (
-        df.assign(FLUXO="Imp")
-        .pipe(apply_comexstat_updates, imp_updates_config)
-        .merge(trad_ncm, on="CO_NCM", how="left")
-        .query(f"CO_SH6 in {lista_sh6}")
+        df_base.query(f"CO_SH6 in {lista_sh6}")
         .groupby(
             [
                 "CO_ANO",
@@ -859,8 +821,11 @@ def ajustes_imp_comexstat(df, imp_updates_config, lista_sh6, trad_ncm, trad_cod_
                 "CO_URF",
             ],
             as_index=False,
+            observed=True,
         )
         .agg({"VL_FOB": "sum", "QT_ESTAT": "sum"})
+        # Exportações antes das importações, como na concatenação dos fluxos
+        .sort_values("FLUXO", kind="stable", ignore_index=True)
         .astype({"CO_SH6": "Int64"})
         .assign(
             CO_PAIS=lambda x: x["CO_PAIS"].astype(str).str.zfill(3),
@@ -884,11 +849,11 @@ def ajustes_imp_comexstat(df, imp_updates_config, lista_sh6, trad_ncm, trad_cod_
     )
 
 
-def ajustes_comexstat_final(df_exp_comexstat, df_imp_comexstat):
+def ajustes_comexstat_final(df_comexstat):
     return (
-        pd.concat([df_exp_comexstat, df_imp_comexstat], ignore_index=True)
-        .assign(
+        df_comexstat.assign(
             FLUXO=lambda x: x["FLUXO"]
+            .astype(str)
             .replace("Exp", "Exportação")
             .replace("Imp", "Importação")
         )
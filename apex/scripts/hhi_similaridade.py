@@ -1,37 +1,49 @@
 # %%
 import pandas as pd
 import numpy as np
+import sys
+
+sys.path.append("../../cei")
+import comexstat  # noqa: E402
+import tradutores  # noqa: E402
 
 caminho_base = "D:/OneDrive - Associacao Antonio Vieira/UAPP_ProjetoCEI/APEX-BRASIL/2023_Estados/Estados/0_bases_gerais/"
 caminho_resultado = "D:/OneDrive - Associacao Antonio Vieira/UAPP_ProjetoCEI/APEX-BRASIL/PROGRAMACOES/HHI/"
-trad_pais = pd.read_excel(caminho_base + "trad_pais.xlsx")
-trad_ncm = pd.read_excel(caminho_base + "ncm_cnae.xlsx")
+trad_pais = tradutores.ler_excel(caminho_base + "trad_pais.xlsx")
+trad_ncm = tradutores.ler_excel(caminho_base + "ncm_cnae.xlsx")
 
-filtro_uf = "RS"
 anos = np.arange(2019, 2025, 1)
+# UFs fora do painel ("ND": UF não declarada); continuam no total do Brasil
+ufs_excluidas = ["ND"]
 
-
-arquivo_exp = "../../data/EXP_COMPLETA.csv"
-df_exp = pd.read_csv(
-    arquivo_exp, delimiter=";", encoding="ISO-8859-1", engine="pyarrow"
+# Exportações por ano x UF x NCM e ano x UF x país, de todas as UFs: o painel
+# nacional sai de uma única agregação de cada base
+df_ncm = comexstat.ler_cubo(
+    "EXP", ["CO_ANO", "SG_UF_NCM", "CO_NCM"], anos=anos, medidas=["VL_FOB"]
+)
+df_pais = comexstat.ler_cubo(
+    "EXP", ["CO_ANO", "SG_UF_NCM", "CO_PAIS"], anos=anos, medidas=["VL_FOB"]
 )
 
 
 # Funcao para calcular o HHI
 def calcular_hhi(
-    df: pd.DataFrame, year_col: str, category_col: str, value_col: str = "VL_FOB"
+    df: pd.DataFrame,
+    group_cols: list,
+    category_col: str,
+    value_col: str = "VL_FOB",
 ) -> pd.DataFrame:
     """
-    Preprocess the HHI data by filtering, grouping, and calculating the HHI.
+    Calculate the HHI of every group (ex: year x UF) in one grouped operation.
 
     Args:
         df (pd.DataFrame): The DataFrame containing the data.
-        year_col (str): The name of the column containing the year (ex: 'CO_ANO').
+        group_cols (list): Columns that identify each HHI (ex: ['CO_ANO', 'SG_UF_NCM']).
         category_col (str): The name of the column containing the category (ex: 'cnae_2dg' or 'CO_PAIS').
         value_col (str): The name of the column containing the values. Default is 'VL_FOB'.
 
     Returns:
-        pd.DataFrame: A DataFrame with the calculated HHI values.
+        pd.DataFrame: A DataFrame with group_cols and the calculated HHI values.
     """
     # IF para nomear a coluna hhi_setor ou hhi_pais
     if category_col == "cnae_2dg":
@@ -41,125 +53,89 @@ def calcular_hhi(
     else:
         raise ValueError("category_col must be either 'cnae_2dg' or 'CO_PAIS'")
 
-    df = (
-        df.groupby([year_col, category_col])
-        .agg({value_col: "sum"})
+    valores = df.groupby(group_cols + [category_col], observed=True)[value_col].sum()
+    participacao = valores / valores.groupby(group_cols, observed=True).transform("sum")
+    return (
+        ((participacao * 100) ** 2)
+        .groupby(group_cols, observed=True)
+        .sum()
+        .rename(hhi_col_name)
         .reset_index()
-        .assign(
-            valor_ano=lambda x: x.groupby(year_col)[value_col].transform("sum"),
-            hhi_desagregado=lambda x: ((x[value_col] / x["valor_ano"]) * 100) ** 2,
-            hhi=lambda x: x.groupby(year_col)["hhi_desagregado"].transform("sum"),
-        )[[year_col, "hhi"]]
-        .drop_duplicates()
-        .rename(columns={"hhi": hhi_col_name})
         .round(2)
     )
-    return df
 
 
-def ajustar_dados_setor(df_exp, trad_ncm, filtro_uf, anos):
-    return (
-        df_exp.query(f"SG_UF_NCM == '{filtro_uf}' and CO_ANO in @anos")
-        .groupby(["CO_ANO", "CO_NCM"])["VL_FOB"]
-        .sum()
-        .reset_index()
-        .merge(trad_ncm, left_on="CO_NCM", right_on="ncm", how="left")
-        .groupby(["CO_ANO", "cnae_2dg"])["VL_FOB"]
-        .sum()
-        .reset_index()
+def ajustar_dados_setor(df_ncm, trad_ncm):
+    """Acrescenta os setores CNAE (2 e 3 dígitos) de cada NCM"""
+    return df_ncm.merge(
+        trad_ncm[["ncm", "cnae_2dg", "cnae_3dg"]],
+        left_on="CO_NCM",
+        right_on="ncm",
+        how="left",
     )
 
 
-# Agrupando dados para calcular a similaridade entre as exportacoes brasileiras e as exportacoes do estado
-def calcular_agregacao_exp(df, anos, filtro_uf=None):
+# Similaridade entre as exportacoes brasileiras e as exportacoes de cada estado
+def calcular_similaridade(df_setor):
     """
-    Agrupa os dados de exportação por ano e NCM, somando o valor FOB.
-    Se um filtro de UF for fornecido, o agrupamento será feito apenas para essa UF.
-    O agrupamento é utilizado para calcular a Similaridade entre as exportacoes brasileiras e as exportacoes do estado.
+    Calcula a similaridade entre a pauta do Brasil e a de cada UF por ano:
+    a soma, nos setores CNAE 3 dígitos, do menor entre a participação do
+    setor no Brasil e na UF. Todas as UFs e anos são calculados juntos; o
+    Brasil é a soma das UFs.
     """
-    if filtro_uf:
-        df_filtrado = df.query("CO_ANO in @anos and SG_UF_NCM == @filtro_uf")
-        nome_coluna = "exp_uf"
-    else:
-        df_filtrado = df.query("CO_ANO in @anos")
-        nome_coluna = "exp_br"
-
-    df_agg = (
-        df_filtrado.groupby(["CO_ANO", "CO_NCM"])
-        .agg(**{nome_coluna: ("VL_FOB", "sum")})
-        .reset_index()
-    )
-
-    return df_agg
-
-
-def calcular_similaridade(df_br, df_uf, trad_ncm):
+    exp_uf = df_setor.groupby(["CO_ANO", "SG_UF_NCM", "cnae_3dg"], observed=True)[
+        "VL_FOB"
+    ].sum()
+    exp_br = exp_uf.groupby(["CO_ANO", "cnae_3dg"], observed=True).sum()
+    share_uf = exp_uf / exp_uf.groupby(
+        ["CO_ANO", "SG_UF_NCM"], observed=True
+    ).transform("sum")
+    share_br = (exp_br / exp_br.groupby("CO_ANO").transform("sum")).rename("share_br")
     return (
-        df_br.merge(df_uf, on=["CO_ANO", "CO_NCM"], how="left")
-        .fillna(0)
-        .merge(trad_ncm, left_on="CO_NCM", right_on="ncm", how="left")
-        .groupby(["CO_ANO", "cnae_3dg"])
-        .agg(
-            {
-                "exp_br": "sum",
-                "exp_uf": "sum",
-            }
-        )
+        share_uf.rename("share_uf")
         .reset_index()
-        .assign(
-            exp_br_total=lambda x: x.groupby("CO_ANO")["exp_br"].transform("sum"),
-            exp_uf_total=lambda x: x.groupby("CO_ANO")["exp_uf"].transform("sum"),
-            share_br_cnae=lambda x: x["exp_br"] / x["exp_br_total"],
-            share_uf_cnae=lambda x: x["exp_uf"] / x["exp_uf_total"],
-            min_share_br_uf=lambda x: np.where(
-                x[["share_br_cnae", "share_uf_cnae"]].isnull().any(axis=1),
-                np.nan,
-                x[["share_br_cnae", "share_uf_cnae"]].min(axis=1),
-            ),
-        )
-        .groupby("CO_ANO")
+        .merge(share_br.reset_index(), on=["CO_ANO", "cnae_3dg"], how="left")
+        .assign(min_share_br_uf=lambda x: np.minimum(x["share_br"], x["share_uf"]))
+        .groupby(["CO_ANO", "SG_UF_NCM"], observed=True)
         .agg(Similaridade=("min_share_br_uf", "sum"))
         .reset_index()
     )
 
 
 # HHI
-df_setor = ajustar_dados_setor(
-    df_exp=df_exp, trad_ncm=trad_ncm, filtro_uf=filtro_uf, anos=anos
-)
+df_setor = ajustar_dados_setor(df_ncm=df_ncm, trad_ncm=trad_ncm)
 hhi_setor = calcular_hhi(
-    df_setor, year_col="CO_ANO", category_col="cnae_2dg", value_col="VL_FOB"
-)
-
-df_pais = (
-    df_exp.query("SG_UF_NCM == @filtro_uf and CO_ANO in @anos")
-    .groupby(["CO_ANO", "CO_PAIS"])["VL_FOB"]
-    .sum()
-    .reset_index()
+    df_setor,
+    group_cols=["CO_ANO", "SG_UF_NCM"],
+    category_col="cnae_2dg",
+    value_col="VL_FOB",
 )
 
 hhi_pais = calcular_hhi(
-    df_pais, year_col="CO_ANO", category_col="CO_PAIS", value_col="VL_FOB"
+    df_pais,
+    group_cols=["CO_ANO", "SG_UF_NCM"],
+    category_col="CO_PAIS",
+    value_col="VL_FOB",
 )
 
 # Juntar os dois HHI
-hhi = hhi_setor.merge(hhi_pais, on="CO_ANO", how="left")
+hhi = hhi_setor.merge(hhi_pais, on=["CO_ANO", "SG_UF_NCM"], how="left")
 
 # Similaridade
-df_br = calcular_agregacao_exp(df_exp, anos)
-df_uf = calcular_agregacao_exp(df_exp, anos, filtro_uf=filtro_uf)
-df_similaridade = calcular_similaridade(df_br=df_br, df_uf=df_uf, trad_ncm=trad_ncm)
-# Juntar os dois dataframes
+df_similaridade = calcular_similaridade(df_setor=df_setor)
+# Juntar os dois dataframes: painel com todas as UFs e anos
 df = (
-    df_similaridade.merge(hhi, on="CO_ANO", how="left")
+    df_similaridade.merge(hhi, on=["CO_ANO", "SG_UF_NCM"], how="left")
     .assign(
         Similaridade=lambda x: x["Similaridade"].round(2),
         hhi_setor=lambda x: x["hhi_setor"].round(2),
         hhi_pais=lambda x: x["hhi_pais"].round(2),
     )
-    .rename(columns={"CO_ANO": "ano"})
+    .rename(columns={"CO_ANO": "ano", "SG_UF_NCM": "uf"})
+    .query("uf not in @ufs_excluidas")
+    .sort_values(["uf", "ano"])
     .to_excel(
-        f"D:/OneDrive - Associacao Antonio Vieira/UAPP_ProjetoCEI/APEX-BRASIL/2023_Estados/Estados/1_hhi_similaridade/{filtro_uf}_hhi_similaridade.xlsx",
+        "D:/OneDrive - Associacao Antonio Vieira/UAPP_ProjetoCEI/APEX-BRASIL/2023_Estados/Estados/1_hhi_similaridade/ufs_hhi_similaridade.xlsx",
         index=False,
     )
 )
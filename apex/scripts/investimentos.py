@@ -11,22 +11,28 @@ caminho_resultado = "D:/OneDrive - Associacao Antonio Vieira/UAPP_ProjetoCEI/APE
 
 uf_selecionada = "RS"
 regiao_selecionada = "Sul"
+# Formatos dos resultados: "xlsx" e/ou "parquet"/"csv" (uma tabela por aba,
+# para o Power BI)
+formatos_saida = ["xlsx"]
 
 tradutor_orbis_cnae = pd.read_excel(caminho + "tradutores/tradutor_orbis_cnae.xlsx")
 tradutor_div_grupo = pd.read_excel(caminho + "tradutores/tradutor_cnae_div_grupo.xlsx")
 tradutor_orbis = pd.read_excel(caminho + "tradutores/tradutor_setor_orbis.xlsx")
 tradutor_pais = pd.read_excel(caminho + "tradutores/tradutor_pais.xlsx")
 df_rais_raw = pd.read_excel(caminho + "rais_2023.xlsx")
-df_orbis_18_22_raw = pd.read_excel(caminho + "orbis_18_22.xlsx", sheet_name="Results")
-df_orbis_23_raw = pd.read_excel(caminho + "orbis_23.xlsx", sheet_name="Results")
-df_orbis_24_raw = pd.read_excel(caminho + "orbis_24.xlsx", sheet_name="Results")
-df_orbis_uf = pd.read_excel(caminho + "orbis_br.xlsx", sheet_name="Results")
 
 # DF orbis
-df_orbis_18_22 = utils.ajuste_orbis(df_orbis_18_22_raw)
-df_orbis_23 = utils.ajuste_orbis(df_orbis_23_raw)
-df_orbis_24 = utils.ajuste_orbis(df_orbis_24_raw)
-df_orbis = pd.concat([df_orbis_18_22, df_orbis_23, df_orbis_24])
+# Exportações do Orbis normalizadas uma única vez e guardadas em cache Parquet;
+# só são lidas novamente quando alguma planilha muda
+df_orbis = utils.carregar_orbis(
+    [
+        caminho + "orbis_18_22.xlsx",
+        caminho + "orbis_23.xlsx",
+        caminho + "orbis_24.xlsx",
+    ],
+    utils.ajuste_orbis,
+)
+df_orbis_uf = utils.carregar_orbis([caminho + "orbis_br.xlsx"], utils.ajuste_orbis_uf)
 
 anos_iniciais = (2018, 2019, 2021)
 anos_iniciais_coluna = "_".join([str(ano)[-2:] for ano in anos_iniciais])
@@ -62,13 +68,14 @@ df_investimento = utils.ajuste_investimento_final(
 filtro_setores_selecionados = df_investimento["setor"].to_list()
 
 # RAIS
-df_rais_divisao = utils.ajuste_rais_investimentos(
-    df_rais_raw, "divisao", tradutor_div_grupo
-)
-df_rais_grupo = utils.ajuste_rais_investimentos(
-    df_rais_raw, "grupo", tradutor_div_grupo
+# Divisões e grupos da CNAE em uma base só; participações e VCRs de todas as
+# UFs e setores calculados de uma vez, com a UF selecionada como recorte
+df_rais = utils.ajuste_rais_investimentos(df_rais_raw, tradutor_div_grupo)
+df_rais_setores = utils.ajuste_rais_setores(
+    df_rais=df_rais,
+    tradutor_orbis_cnae=tradutor_orbis_cnae,
+    tradutor_orbis=tradutor_orbis,
 )
-df_rais = pd.concat([df_rais_divisao, df_rais_grupo])
 
 df_rais_uf = utils.ajuste_rais_uf(
     df_rais=df_rais,
@@ -76,6 +83,7 @@ df_rais_uf = utils.ajuste_rais_uf(
     tradutor_orbis=tradutor_orbis,
     filtro_setores_selecionados=filtro_setores_selecionados,
     uf_selecionada=uf_selecionada,
+    df_rais_setores=df_rais_setores,
 )
 
 # Setores
@@ -179,8 +187,7 @@ df_empresas_nao_investem_uf = df_empresas_nao_investem_uf.query(
 
 # Tabela Geral UF
 orbis_uf = (
-    df_orbis_uf.pipe(utils.ajuste_orbis_uf)
-    .merge(tradutor_uf, on="uf", how="left")
+    df_orbis_uf.merge(tradutor_uf, on="uf", how="left")
     .query("sigla_uf == @uf_selecionada")
     .merge(tradutor_orbis, left_on="setor", right_on="setor_orbis", how="left")
     .merge(tradutor_pais, left_on="pais_origem", right_on="pais_eng", how="left")[
@@ -196,25 +203,18 @@ orbis_uf = (
 )
 
 # Salvando os resultados
-with pd.ExcelWriter(
+utils.salvar_planilhas(
     caminho_resultado + f"{uf_selecionada}_resultados_investimentos.xlsx",
-    mode="w",
-    engine="openpyxl",
-) as writer:
-    orbis_uf.to_excel(writer, sheet_name="Investimentos UF", index=False)
-    df_orbis_uf_br.to_excel(writer, sheet_name="Investimentos UF Brasil", index=False)
-    df_orbis_regiao.to_excel(writer, sheet_name="Investimentos Região", index=False)
-    df_orbis_uf_setor.to_excel(writer, sheet_name="Investimentos UF Setor", index=False)
-    df_orbis_uf_pais.to_excel(writer, sheet_name="Investimentos UF País", index=False)
-    df_orbis_uf_empresa.to_excel(
-        writer, sheet_name="Investimentos UF Empresa", index=False
-    )
-    df_tab_setores_uf.to_excel(
-        writer, sheet_name="Setores Maior Atracao Invest UF", index=False
-    )
-    df_empresas_nao_investem_brasil.to_excel(
-        writer, sheet_name="Empresas Não Investem Brasil", index=False
-    )
-    df_empresas_nao_investem_uf.to_excel(
-        writer, sheet_name="Empresas Não Investem UF", index=False
-    )
+    {
+        "Investimentos UF": orbis_uf,
+        "Investimentos UF Brasil": df_orbis_uf_br,
+        "Investimentos Região": df_orbis_regiao,
+        "Investimentos UF Setor": df_orbis_uf_setor,
+        "Investimentos UF País": df_orbis_uf_pais,
+        "Investimentos UF Empresa": df_orbis_uf_empresa,
+        "Setores Maior Atracao Invest UF": df_tab_setores_uf,
+        "Empresas Não Investem Brasil": df_empresas_nao_investem_brasil,
+        "Empresas Não Investem UF": df_empresas_nao_investem_uf,
+    },
+    formatos=formatos_saida,
+)
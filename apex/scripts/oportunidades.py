@@ -4,399 +4,535 @@ import numpy as np
 import utils
 import importlib
 import argparse
+import os
+import sys
+import time
+
+sys.path.append("../../cei")
+import comexstat  # noqa: E402
+import processos as processos_lote  # noqa: E402
+import tradutores  # noqa: E402
 
 importlib.reload(utils)
 
 # %% CONFIGURAÇÕES
-parser = argparse.ArgumentParser(
-    description="Processa dados de exportação para uma UF específica."
-)
-parser.add_argument(
-    "--uf",
-    type=str,
-    required=True,
-    help="Sigla da UF a ser processada (ex: BA, SP, MG)",
-)
-args = parser.parse_args()
-
-uf_selecionada = args.uf  # <-- UF definida pelo argumento
-
-print(f"--- Iniciando processamento para UF: {uf_selecionada} ---")
-anos = range(2018, 2024)
-
-df_exp_completa = pd.read_csv(
-    "../data/EXP_COMPLETA.CSV", sep=";", encoding="utf-8", engine="pyarrow"
-).query("CO_ANO in @anos")
-
-# %% MAPA APEX
-cols_mapa = [
-    "SH6",
-    "País",
-    "Exportações de BRA para o país em Ano4 (US$)",
-    "Importações totais do país em Ano4 (US$)",
-    "Classificação Mapa",
-]
-
-mapa_apex = (
-    pd.read_excel("../data/mapa_apex_25.xlsx", engine="calamine")[cols_mapa]
-    .set_axis(
-        ["CO_SH6", "NO_PAIS", "vl_fob", "imp_destino", "classificacao_mapa"], axis=1
+caminho_resultado = "../../../OneDrive - Associacao Antonio Vieira/UAPP_ProjetoCEI/APEX-BRASIL/2023_Estados/Estados/0_resultados_oportunidades/2025/arquivos_apex/"
+
+# Janelas de anos do VCR, (ano_inicial, ano_final). A primeira é a base de
+# comparação e a última é a janela atual (cortes, delta do VCR, crescimento e
+# principais destinos); janelas intermediárias só acrescentam colunas
+janelas = [(2018, 2020), (2021, 2023)]
+janela_inicial, janela_atual = janelas[0], janelas[-1]
+inicial = utils.rotulo_janela(*janela_inicial)
+atual = utils.rotulo_janela(*janela_atual)
+exp_destino = f"exp_destino_{utils.rotulo_anos(*janela_atual)}"
+
+# Formatos dos resultados: "xlsx" e/ou "parquet"/"csv" (uma tabela por aba,
+# para o Power BI)
+formatos_saida = ["xlsx"]
+
+
+# %% BASES COMPARTILHADAS
+def carregar_bases(ufs_selecionadas):
+    """
+    Carrega uma vez as bases usadas por todas as UFs (cubo de exportações,
+    mapa Apex, tradutores, RAIS) e calcula o VCR de todas as UFs.
+
+    Parâmetros:
+    ufs_selecionadas (list): UFs que serão processadas.
+
+    Retorna:
+    dict com as bases compartilhadas, a serem passadas para usar_bases.
+    """
+    anos = range(
+        min(inicio for inicio, _ in janelas), max(fim for _, fim in janelas) + 1
+    )
+
+    # Base NCM apenas das UFs e dos anos usados nos principais destinos; os totais
+    # por SH6 vêm do cubo ano x UF x SH6
+    df_exp_completa = comexstat.ler_comexstat(
+        "EXP",
+        anos=range(janela_atual[0], janela_atual[1] + 1),
+        ufs=ufs_selecionadas,
+        colunas=["CO_ANO", "CO_NCM", "SG_UF_NCM", "CO_PAIS", "VL_FOB"],
+        codigos_texto=["CO_NCM"],
     )
-    .assign(CO_SH6=lambda x: x["CO_SH6"].astype(str).str.zfill(6))
-    .drop_duplicates()
-)
-# %% TRADUTORES
-
-tradutor_ncm = pd.read_excel("../data/tradutores/NCM.xlsx", engine="calamine").pipe(
-    utils.ajuste_tradutores, colunas_tamanhos={"CO_NCM": 8, "CO_SH6": 6}
-)
-
-tradutor_paises = pd.read_csv(
-    "../data/tradutores/PAIS.csv",
-    sep=";",
-    encoding="ISO-8859-1",
-    on_bad_lines="skip",
-    engine="pyarrow",
-    usecols=["CO_PAIS", "NO_PAIS"],
-)
-
-tradutor_grupos = pd.read_excel(
-    "../data/tradutores/trad_cuci.xlsx", engine="calamine"
-).pipe(utils.ajuste_tradutores, colunas_tamanhos={"CO_SH6": 6})
-
-tradutor_sh6 = pd.read_csv(
-    "../data/tradutores/NCM_SH.csv",
-    sep=";",
-    encoding="ISO-8859-1",
-    on_bad_lines="skip",
-    engine="pyarrow",
-).pipe(utils.ajuste_tradutores, colunas_tamanhos={"CO_SH6": 6})
-
-tradutor_hs22_to_hs17 = pd.read_excel(
-    "../data/tradutores/AJUSTE_SH6.xlsx", engine="calamine"
-).pipe(utils.ajuste_tradutores, colunas_tamanhos={"HS17": 6, "HS22": 6})
-
-tradutor_sh6_novos = pd.read_excel(
-    "../data/tradutores/novos_sh_2022.xlsx", sheet_name="Novos 2022", engine="calamine"
-).pipe(utils.ajuste_tradutores, colunas_tamanhos={"sh22": 6})
-
-tradutor_cnae = (
-    pd.read_excel("../data/tradutores/CNAE_SH6.xlsx", engine="calamine")[
-        ["SH6", "cod_cnae"]
+
+    # MAPA APEX
+    cols_mapa = [
+        "SH6",
+        "País",
+        "Exportações de BRA para o país em Ano4 (US$)",
+        "Importações totais do país em Ano4 (US$)",
+        "Classificação Mapa",
     ]
-    .rename(columns={"SH6": "cod_sh6", "cod_cnae": "cod_grupo"})
-    .pipe(utils.ajuste_tradutores, colunas_tamanhos={"cod_sh6": 6})
-)
-
-# %% FILTROS
-
-filtro_mapa_apex = mapa_apex["CO_SH6"].unique()
-
-filtro_sh6_novos = tradutor_sh6_novos["sh22"].unique()
-# %% DF EXP
-df_exp = (
-    df_exp_completa.groupby(["CO_ANO", "CO_NCM", "SG_UF_NCM"], as_index=False)["VL_FOB"]
-    .sum()
-    .assign(CO_NCM=lambda x: x["CO_NCM"].astype(str).str.zfill(8))
-    .merge(tradutor_ncm, on="CO_NCM", how="left")
-    .groupby(["CO_ANO", "CO_SH6", "SG_UF_NCM"], as_index=False)["VL_FOB"]
-    .sum()
-    .astype({"CO_ANO": "uint16[pyarrow]"})
-)
-# %% SOMAS PARA CALCULO DE VCR
-soma_br_18_20 = utils.calcular_soma_br_por_sh6(
-    df=df_exp, ano_inicial=2018, ano_final=2020
-)
-soma_br_21_23 = utils.calcular_soma_br_por_sh6(
-    df=df_exp, ano_inicial=2021, ano_final=2023
-)
-soma_uf_18_20 = utils.calcular_soma_uf_por_sh6(
-    df=df_exp, ano_inicial=2018, ano_final=2020, uf_selecionada=uf_selecionada
-)
-soma_uf_21_23 = utils.calcular_soma_uf_por_sh6(
-    df=df_exp, ano_inicial=2021, ano_final=2023, uf_selecionada=uf_selecionada
-)
-soma_uf_total_18_20 = utils.calcular_soma_uf_total(
-    df=df_exp, ano_inicial=2018, ano_final=2020, uf_selecionada=uf_selecionada
-)
-soma_uf_total_21_23 = utils.calcular_soma_uf_total(
-    df=df_exp, ano_inicial=2021, ano_final=2023, uf_selecionada=uf_selecionada
-)
-df_br_total = pd.DataFrame(
-    {
-        "soma_br_total_18_20": [
-            utils.calcular_soma_br_total(df=df_exp, ano_inicial=2018, ano_final=2020)
-        ],
-        "soma_br_total_21_23": [
-            utils.calcular_soma_br_total(df=df_exp, ano_inicial=2021, ano_final=2023)
-        ],
+
+    mapa_apex = (
+        tradutores.ler_excel("../data/mapa_apex_25.xlsx", engine="calamine")[cols_mapa]
+        .set_axis(
+            ["CO_SH6", "NO_PAIS", "vl_fob", "imp_destino", "classificacao_mapa"], axis=1
+        )
+        .assign(CO_SH6=lambda x: x["CO_SH6"].astype(str).str.zfill(6))
+        .drop_duplicates()
+    )
+    # TRADUTORES
+
+    tradutor_paises = tradutores.ler_csv(
+        "../data/tradutores/PAIS.csv",
+        sep=";",
+        encoding="ISO-8859-1",
+        on_bad_lines="skip",
+        engine="pyarrow",
+        usecols=["CO_PAIS", "NO_PAIS"],
+    )
+
+    tradutor_grupos = tradutores.ler_excel(
+        "../data/tradutores/trad_cuci.xlsx", engine="calamine"
+    ).pipe(utils.ajuste_tradutores, colunas_tamanhos={"CO_SH6": 6})
+
+    tradutor_sh6 = tradutores.ler_csv(
+        "../data/tradutores/NCM_SH.csv",
+        sep=";",
+        encoding="ISO-8859-1",
+        on_bad_lines="skip",
+        engine="pyarrow",
+    ).pipe(utils.ajuste_tradutores, colunas_tamanhos={"CO_SH6": 6})
+
+    tradutor_hs22_to_hs17 = tradutores.ler_excel(
+        "../data/tradutores/AJUSTE_SH6.xlsx", engine="calamine"
+    ).pipe(utils.ajuste_tradutores, colunas_tamanhos={"HS17": 6, "HS22": 6})
+
+    tradutor_sh6_novos = tradutores.ler_excel(
+        "../data/tradutores/novos_sh_2022.xlsx",
+        sheet_name="Novos 2022",
+        engine="calamine",
+    ).pipe(utils.ajuste_tradutores, colunas_tamanhos={"sh22": 6})
+
+    # Dimensão NCM (NCM -> SH6 e grupo CUCI) guardada em cache; só é reconstruída
+    # quando alguma das planilhas muda
+    def construir_dimensao_ncm():
+        tradutor_ncm = tradutores.ler_excel(
+            "../data/tradutores/NCM.xlsx",
+            engine="calamine",
+            usecols=["CO_NCM", "CO_SH6"],
+        ).pipe(utils.ajuste_tradutores, colunas_tamanhos={"CO_NCM": 8, "CO_SH6": 6})
+        return utils.construir_dimensao_ncm(
+            tradutor_ncm, [tradutor_grupos], coluna_ncm="CO_NCM", coluna_sh6="CO_SH6"
+        )
+
+    dimensao_ncm = utils.carregar_dimensao_ncm(
+        ["../data/tradutores/NCM.xlsx", "../data/tradutores/trad_cuci.xlsx"],
+        construir_dimensao_ncm,
+    )
+
+    tradutor_cnae = (
+        tradutores.ler_excel("../data/tradutores/CNAE_SH6.xlsx", engine="calamine")[
+            ["SH6", "cod_cnae"]
+        ]
+        .rename(columns={"SH6": "cod_sh6", "cod_cnae": "cod_grupo"})
+        .pipe(utils.ajuste_tradutores, colunas_tamanhos={"cod_sh6": 6})
+    )
+
+    # FILTROS
+
+    filtro_mapa_apex = mapa_apex["CO_SH6"].unique()
+
+    filtro_sh6_novos = tradutor_sh6_novos["sh22"].unique()
+    # DF EXP
+    df_exp = comexstat.ler_cubo(
+        "EXP",
+        ["CO_ANO", "CO_SH6", "SG_UF_NCM"],
+        anos=anos,
+        medidas=["VL_FOB"],
+        codigos_texto=["CO_SH6"],
+    ).astype({"CO_ANO": "uint16[pyarrow]", "CO_SH6": str})
+    # FILTRO SH6 NOVOS
+    # A correspondência HS22 -> HS17 e o VCR de todas as UFs só dependem da
+    # versão dos dados, dos tradutores e do cálculo (utils.VERSAO_AGREGADOS,
+    # a incrementar quando correspondencia_novos ou calcular_vcr_ufs mudarem):
+    # são memorizados em disco e reaproveitados nas execuções seguintes
+    chave_nacional = [
+        comexstat.versao_dataset("EXP"),
+        [list(janela) for janela in janelas],
+        utils.hash_arquivos(
+            [
+                "../data/tradutores/AJUSTE_SH6.xlsx",
+                "../data/tradutores/novos_sh_2022.xlsx",
+            ]
+        )[:16],
+    ]
+
+    def correspondencia_novos():
+        novos_sh6_2 = (
+            df_exp[df_exp["CO_SH6"].isin(filtro_sh6_novos)]
+            .merge(tradutor_sh6_novos, left_on="CO_SH6", right_on="sh22", how="left")
+            .query("Correlação != 'n:n'")
+            .merge(tradutor_hs22_to_hs17, left_on="CO_SH6", right_on="HS22", how="left")
+        )
+        return pd.DataFrame({"HS17": novos_sh6_2["HS17"].unique()})
+
+    sh6_HS17_selecionados = utils.memorizar_agregado(
+        "sh6_hs17_novos", chave_nacional, correspondencia_novos
+    )["HS17"].to_numpy()
+
+    # CALCULANDO VCR DE TODAS AS UFS
+    # Os SH6 HS17 correspondentes aos novos são calculados à parte, por UF
+    filtro_sh6_novos_todos = np.concatenate([filtro_sh6_novos, sh6_HS17_selecionados])
+
+    df_vcr_ufs_sem_novos = utils.memorizar_agregado(
+        "vcr_ufs_sem_novos",
+        chave_nacional,
+        lambda: utils.calcular_vcr_ufs(
+            df=df_exp[~df_exp["CO_SH6"].isin(filtro_sh6_novos_todos)],
+            df_totais=df_exp,
+            janelas=janelas,
+        ),
+    )
+
+    # PRINCIPAIS DESTINOS DO MAPA
+    # Rankings de países por SH6/grupo; as listas em texto só são montadas na
+    # saída (top 5 e países em comum com a UF)
+    ranking_mapa = utils.ranquear_paises(df=mapa_apex, coluna="vl_fob", chave="CO_SH6")
+
+    ranking_mapa_grupo = (
+        mapa_apex.merge(tradutor_grupos, on="CO_SH6", how="left")
+        .groupby(["desc_grupo", "NO_PAIS"], as_index=False)["vl_fob"]
+        .sum()
+        .pipe(utils.ranquear_paises, coluna="vl_fob", chave="desc_grupo")
+    )
+    # Principais destinos de exportacao por sh6 no mapa de oportunidades
+    top_5_destinos_mapa_sh6 = utils.listar_paises(
+        ranking_mapa, chave="CO_SH6", n=5
+    ).rename(columns={"NO_PAIS": "top_5_destinos_mapa"})
+    # Principais destinos de exportacao por grupo no mapa de oportunidades
+    top_5_destinos_mapa_grupo = utils.listar_paises(
+        ranking_mapa_grupo, chave="desc_grupo", n=5
+    ).rename(columns={"NO_PAIS": "top_5_destinos_mapa"})
+
+    # RAIS
+    # VCR dos vínculos, estabelecimentos e salários de todas as UFs x CNAE
+    df_rais_raw = tradutores.ler_excel("../data/rais_2023.xlsx", engine="calamine")
+    df_rais_ufs = utils.vcr_rais(df=df_rais_raw)
+
+    return {
+        "df_exp_completa": df_exp_completa,
+        "mapa_apex": mapa_apex,
+        "tradutor_paises": tradutor_paises,
+        "tradutor_grupos": tradutor_grupos,
+        "tradutor_sh6": tradutor_sh6,
+        "dimensao_ncm": dimensao_ncm,
+        "tradutor_cnae": tradutor_cnae,
+        "filtro_mapa_apex": filtro_mapa_apex,
+        "df_exp": df_exp,
+        "sh6_HS17_selecionados": sh6_HS17_selecionados,
+        "df_vcr_ufs_sem_novos": df_vcr_ufs_sem_novos,
+        "ranking_mapa": ranking_mapa,
+        "ranking_mapa_grupo": ranking_mapa_grupo,
+        "top_5_destinos_mapa_sh6": top_5_destinos_mapa_sh6,
+        "top_5_destinos_mapa_grupo": top_5_destinos_mapa_grupo,
+        "df_rais_ufs": df_rais_ufs,
     }
-)
-# %% FILTRO SH6 NOVOS
-novos_sh6_1 = (
-    df_exp.query("CO_SH6 in @filtro_sh6_novos")
-    .merge(tradutor_sh6_novos, left_on="CO_SH6", right_on="sh22", how="left")
-    .query("Correlação != 'n:n'")
-)
-filtros_novos_sh6_1 = novos_sh6_1["CO_SH6"].unique()
-novos_sh6_2 = (
-    df_exp.query("CO_SH6 in @filtro_sh6_novos")
-    .merge(tradutor_sh6_novos, left_on="CO_SH6", right_on="sh22", how="left")
-    .query("Correlação != 'n:n'")
-    .merge(tradutor_hs22_to_hs17, left_on="CO_SH6", right_on="HS22", how="left")
-)
-sh6_HS17_selecionados = novos_sh6_2["HS17"].unique()
-novos_sh6_3 = df_exp.query(
-    "CO_SH6 in @sh6_HS17_selecionados & SG_UF_NCM == @uf_selecionada"
-).assign(correlacao="antigos", novos="antigos", HS17=lambda x: x["CO_SH6"])
-
-filtro_sh6_novos_2 = novos_sh6_3["CO_SH6"].unique()
-filtro_sh6_novos = np.concatenate([filtro_sh6_novos, filtro_sh6_novos_2])
-
-soma_br_18_20_novos = utils.calcular_soma_br_por_sh6(
-    df=novos_sh6_3, ano_inicial=2018, ano_final=2020
-)
-soma_br_21_23_novos = utils.calcular_soma_br_por_sh6(
-    df=novos_sh6_3, ano_inicial=2021, ano_final=2023
-)
-soma_uf_18_20_novos = utils.calcular_soma_uf_por_sh6(
-    novos_sh6_3, 2018, 2020, uf_selecionada
-)
-soma_uf_21_23_novos = utils.calcular_soma_uf_por_sh6(
-    novos_sh6_3, 2021, 2023, uf_selecionada
-)
-
-# %% CALCULANDO VCR
-df_exp_sem_novos = df_exp.query("CO_SH6 not in @filtro_sh6_novos")
-
-df_vcr_sem_novos = utils.calcular_vcr(
-    df=df_exp_sem_novos,
-    soma_uf_18_20=soma_uf_18_20,
-    soma_uf_21_23=soma_uf_21_23,
-    soma_br_18_20=soma_br_18_20,
-    soma_br_21_23=soma_br_21_23,
-    soma_uf_total_18_20=soma_uf_total_18_20,
-    soma_uf_total_21_23=soma_uf_total_21_23,
-    df_br_total=df_br_total,
-    uf_selecionada=uf_selecionada,
-)
-
-df_vcr_novos = utils.calcular_vcr(
-    df=novos_sh6_3,
-    soma_uf_18_20=soma_uf_18_20_novos,
-    soma_uf_21_23=soma_uf_21_23_novos,
-    soma_br_18_20=soma_br_18_20_novos,
-    soma_br_21_23=soma_br_21_23_novos,
-    soma_uf_total_18_20=soma_uf_total_18_20,
-    soma_uf_total_21_23=soma_uf_total_21_23,
-    df_br_total=df_br_total,
-    uf_selecionada=uf_selecionada,
-)
-
-df_vcr = (
-    pd.concat([df_vcr_sem_novos, df_vcr_novos], ignore_index=True)
-    .assign(delta_vcr=lambda x: x["vcr_21_23"] - x["vcr_18_20"])
-    .query("soma_uf_21_23 != 0")
-    .query("vcr_21_23 > 0.9 or delta_vcr > 0.6")  # valores de corte
-    .query("CO_SH6 in @filtro_mapa_apex")  # garantindo que só tenha sh6 do mapa apex
-    .reset_index(drop=True)
-)
-# %% IDENTIFICANDO OS PRINCIPAIS DESTINOS DAS OPORTUNIDADES
-
-filtro_q50 = df_vcr["soma_uf_21_23"].quantile(0.5, interpolation="linear")
-
-df_oportunidades = df_vcr.query("soma_uf_21_23 > @filtro_q50")
-
-filtro_oportunidades_selecionadas = df_oportunidades["CO_SH6"].unique()
-
-destinos_sh6_total = utils.identificar_principais_destinos(
-    df=df_exp_completa,
-    uf_selecionada=uf_selecionada,
-    tradutor_ncm=tradutor_ncm,
-    tradutor_paises=tradutor_paises,
-)
-destinos_grupo_total = utils.identificar_principais_destinos(
-    df=df_exp_completa,
-    uf_selecionada=uf_selecionada,
-    tradutor_ncm=tradutor_ncm,
-    tradutor_paises=tradutor_paises,
-    tradutor_grupos=tradutor_grupos,
-).pipe(utils.ordenando_pais_exp, coluna="exp_destino_21_22_23", chave="desc_grupo")
-
-destinos_uf = utils.ordenando_pais_exp(
-    df=destinos_sh6_total, coluna="exp_destino_21_22_23", chave="CO_SH6"
-)
-
-destinos_mapa = utils.ordenando_pais_exp(df=mapa_apex, coluna="vl_fob", chave="CO_SH6")
-
-destinos_mapa_grupo = (
-    mapa_apex.merge(tradutor_grupos, on="CO_SH6", how="left")
-    .groupby(["desc_grupo", "NO_PAIS"], as_index=False)["vl_fob"]
-    .sum()
-    .pipe(utils.ordenando_pais_exp, coluna="vl_fob", chave="desc_grupo")
-)
-# Principais destinos de exportacao por SH6 da UF selecionada
-principais_destinos_sh6 = (
-    destinos_mapa.merge(destinos_uf, on="CO_SH6", how="left", suffixes=("_uf", "_mapa"))
-    .fillna({"NO_PAIS_uf": "", "NO_PAIS_mapa": ""})
-    .assign(paises_comuns=lambda x: x.apply(utils.paises_em_comum, axis=1))
-    .query("CO_SH6 in @filtro_oportunidades_selecionadas")
-    .drop(columns=["NO_PAIS_uf", "NO_PAIS_mapa"])
-)
-# Principais destinos de exportacao por sh6 no mapa de oportunidades
-top_5_destinos_mapa_sh6 = destinos_mapa.assign(
-    NO_PAIS=lambda x: x["NO_PAIS"].str.split(", ").apply(lambda x: ", ".join(x[:5]))
-).rename(columns={"NO_PAIS": "top_5_destinos_mapa"})
-# Principais destinos de exportacao por grupo da UF selecionada
-principais_destinos_grupo = (
-    destinos_mapa_grupo.merge(
-        destinos_grupo_total, on="desc_grupo", how="left", suffixes=("_uf", "_mapa")
+
+
+def usar_bases(bases):
+    """
+    Disponibiliza as bases compartilhadas para processar_uf. Também é o
+    initializer dos processos do lote: cada processo recebe as bases uma vez
+    (herdadas sem cópia com fork; serializadas uma vez por processo com spawn).
+    """
+    globals().update(bases)
+
+
+# %% PROCESSAMENTO POR UF
+def processar_uf(uf_selecionada, em_segundo_plano=False):
+    """
+    Calcula e grava as oportunidades da UF. Com em_segundo_plano, os
+    resultados são gravados em uma thread (utils.salvar_planilhas) e a
+    função retorna o Future da gravação.
+    """
+    print(f"--- Iniciando processamento para UF: {uf_selecionada} ---")
+    soma_uf_total_inicial = utils.calcular_soma_uf_total(
+        df=df_exp,
+        ano_inicial=janela_inicial[0],
+        ano_final=janela_inicial[1],
+        uf_selecionada=uf_selecionada,
     )
-    .fillna({"NO_PAIS_uf": "", "NO_PAIS_mapa": ""})
-    .assign(paises_comuns=lambda x: x.apply(utils.paises_em_comum, axis=1))
-    .drop(columns=["NO_PAIS_uf", "NO_PAIS_mapa"])
-)
-# Principais destinos de exportacao por grupo no mapa de oportunidades
-top_5_destinos_mapa_grupo = destinos_mapa_grupo.assign(
-    NO_PAIS=lambda x: x["NO_PAIS"].str.split(", ").apply(lambda x: ", ".join(x[:5]))
-).rename(columns={"NO_PAIS": "top_5_destinos_mapa"})
-
-# %% OPORTUNIDADES TRADICIONAIS
-
-# Oportunidades identificadas para UF e Classificadas pelo Mapa
-df_oportunidades_classificadas = utils.gerar_oportunidades(
-    tipo="classificadas",
-    df=mapa_apex,
-    filtro_oportunidades_selecionadas=filtro_oportunidades_selecionadas,
-    tradutor_sh6=tradutor_sh6,
-    tradutor_grupos=tradutor_grupos,
-)
-
-# Oportunidades identificadas para UF por SH6
-df_oportunidades_sh6 = utils.gerar_oportunidades(
-    tipo="uf_sh6",
-    df=df_exp,
-    uf_selecionada=uf_selecionada,
-    filtro_oportunidades_selecionadas=filtro_oportunidades_selecionadas,
-    tradutor_sh6=tradutor_sh6,
-    tradutor_grupos=tradutor_grupos,
-    df_oportunidades=df_oportunidades,
-    principais_destinos_sh6=principais_destinos_sh6,
-    top_5_destinos_mapa_sh6=top_5_destinos_mapa_sh6,
-)
-
-# Oportunidades identificadas para UF por Grupo
-df_oportunidades_grupo = utils.gerar_oportunidades(
-    tipo="uf_grupo",
-    df=df_exp,
-    uf_selecionada=uf_selecionada,
-    filtro_oportunidades_selecionadas=filtro_oportunidades_selecionadas,
-    tradutor_sh6=tradutor_sh6,
-    tradutor_grupos=tradutor_grupos,
-    df_oportunidades=df_oportunidades,
-    principais_destinos_grupo=principais_destinos_grupo,
-    top_5_destinos_mapa_grupo=top_5_destinos_mapa_grupo,
-)
-
-# %% OPORTUNIDADES A EXPLORAR
-
-filtro_quartil_oportunidades_explorar = df_oportunidades_sh6["soma_uf_21_23"].quantile(
-    0.25, interpolation="linear"
-)
-
-filtro_tx_crescimento_oportunidades_explorar = (
-    soma_uf_total_21_23.merge(soma_uf_total_18_20, on=["SG_UF_NCM"], how="left")
-    .assign(
-        tx_crescimento=lambda x: (x["soma_uf_total_21_23"] / x["soma_uf_total_18_20"])
-        - 1
+    soma_uf_total_atual = utils.calcular_soma_uf_total(
+        df=df_exp,
+        ano_inicial=janela_atual[0],
+        ano_final=janela_atual[1],
+        uf_selecionada=uf_selecionada,
     )
-    .loc[0, "tx_crescimento"]
-)
-df_oportunidades_explorar = utils.gerar_oportunidades_explorar(
-    df=df_oportunidades_sh6,
-    filtro_quartil_oportunidades_explorar=filtro_quartil_oportunidades_explorar,
-    filtro_tx_crescimento_oportunidades_explorar=filtro_tx_crescimento_oportunidades_explorar,
-)
-
-filtro_oportunidades_explorar = df_oportunidades_explorar["cod_sh6"].unique()
-
-df_oportunidades_explorar_classificadas = df_oportunidades_classificadas.query(
-    "cod_sh6 in @filtro_oportunidades_explorar"
-)
-# %% OPORTUNIDADES POTENCIAIS
-df_rais_raw = pd.read_excel("../data/rais_2023.xlsx", engine="calamine")
-total_uf = utils.ajuste_rais(df=df_rais_raw, coluna="sigla_uf", tipo="uf")
-
-total_br = utils.ajuste_rais(
-    df=df_rais_raw,
-    coluna=None,
-    tipo="br",
-)
-total_cnae_br = utils.ajuste_rais(
-    df=df_rais_raw,
-    coluna="cod_grupo",
-    tipo="cnae_br",
-)
-
-df_rais_uf = utils.vcr_rais(
-    df=df_rais_raw,
-    uf_selecionada=uf_selecionada,
-    total_uf=total_uf,
-    total_br=total_br,
-    total_cnae_br=total_cnae_br,
-)
-
-# Identificando os 5 maiores SH6 nao tradicionais por CNAE
-
-maiores_sh6_nao_tradicionais = utils.identificar_maiores_sh6_nao_tradicionais(
-    df=df_vcr, tradutor_cnae=tradutor_cnae, filtro_quartil=filtro_q50
-)
-
-# Identificando o valor exportado dos SH6 tradicionais por CNAE
-
-exp_oportunidades_tradicionais_cnae = (
-    df_oportunidades_sh6[["cod_sh6", "soma_uf_21_23"]]
-    .merge(tradutor_cnae, on="cod_sh6", how="left")
-    .groupby(["cod_grupo"], as_index=False)
-    .agg(exp_oport_trad=("soma_uf_21_23", "sum"))
-)
-
-# Oportunidades Potenciais
-
-df_oportunidades_potenciais = utils.gerar_oportunidades_potenciais(
-    df=df_vcr,
-    filtro_quartil=filtro_q50,
-    tradutor_cnae=tradutor_cnae,
-    df_rais_uf=df_rais_uf,
-    maiores_sh6_nao_tradicionais=maiores_sh6_nao_tradicionais,
-    exp_oportunidades_tradicionais_cnae=exp_oportunidades_tradicionais_cnae,
-)
-
-# %% EXPORTANDO OS DADOS
 
-caminho_resultado = "../../../OneDrive - Associacao Antonio Vieira/UAPP_ProjetoCEI/APEX-BRASIL/2023_Estados/Estados/0_resultados_oportunidades/2025/arquivos_apex/"
-arquivo_oportunidades = f"{uf_selecionada}_oportunidades.xlsx"
-print(f"Salvando resultados em: {caminho_resultado}{arquivo_oportunidades}")
-
-with pd.ExcelWriter(
-    caminho_resultado + arquivo_oportunidades, engine="xlsxwriter", mode="w"
-) as writer:
-    df_oportunidades_sh6.to_excel(
-        writer, sheet_name="Oportunidades UF SH6", index=False
+    # SH6 HS17 correspondentes aos novos exportados pela UF: as somas "Brasil"
+    # desses códigos são as da própria UF
+    novos_sh6_3 = df_exp.query(
+        "CO_SH6 in @sh6_HS17_selecionados & SG_UF_NCM == @uf_selecionada"
+    ).assign(correlacao="antigos", novos="antigos", HS17=lambda x: x["CO_SH6"])
+
+    df_vcr_sem_novos = df_vcr_ufs_sem_novos[
+        df_vcr_ufs_sem_novos["SG_UF_NCM"] == uf_selecionada
+    ]
+    df_vcr_novos = utils.calcular_vcr_ufs(
+        df=novos_sh6_3, df_totais=df_exp, janelas=janelas
     )
-    df_oportunidades_classificadas.to_excel(
-        writer, sheet_name="Oportunidades Classificadas", index=False
+
+    df_vcr = (
+        pd.concat([df_vcr_sem_novos, df_vcr_novos], ignore_index=True)
+        .assign(delta_vcr=lambda x: x[f"vcr_{atual}"] - x[f"vcr_{inicial}"])
+        .query(f"soma_uf_{atual} != 0")
+        .query(f"vcr_{atual} > 0.9 or delta_vcr > 0.6")  # valores de corte
+        .query("CO_SH6 in @filtro_mapa_apex")  # só sh6 do mapa apex
+        .reset_index(drop=True)
     )
-    df_oportunidades_grupo.to_excel(
-        writer, sheet_name="Oportunidades UF Grupo", index=False
+
+    # IDENTIFICANDO OS PRINCIPAIS DESTINOS DAS OPORTUNIDADES
+
+    filtro_q50 = df_vcr[f"soma_uf_{atual}"].quantile(0.5, interpolation="linear")
+
+    df_oportunidades = df_vcr[df_vcr[f"soma_uf_{atual}"] > filtro_q50]
+
+    filtro_oportunidades_selecionadas = df_oportunidades["CO_SH6"].unique()
+
+    destinos_sh6_total = utils.identificar_principais_destinos(
+        df=df_exp_completa,
+        uf_selecionada=uf_selecionada,
+        dimensao_ncm=dimensao_ncm,
+        tradutor_paises=tradutor_paises,
+        janela=janela_atual,
     )
-    df_oportunidades_explorar.to_excel(
-        writer, sheet_name="Oportunidades a Explorar", index=False
+    ranking_grupo_uf = utils.identificar_principais_destinos(
+        df=df_exp_completa,
+        uf_selecionada=uf_selecionada,
+        dimensao_ncm=dimensao_ncm,
+        tradutor_paises=tradutor_paises,
+        por_grupo=True,
+        janela=janela_atual,
+    ).pipe(utils.ranquear_paises, coluna=exp_destino, chave="desc_grupo")
+
+    ranking_uf = utils.ranquear_paises(
+        df=destinos_sh6_total, coluna=exp_destino, chave="CO_SH6"
     )
-    df_oportunidades_explorar_classificadas.to_excel(
-        writer, sheet_name="Oport a Explorar Classif", index=False
+
+    # Principais destinos de exportacao por SH6 da UF selecionada (países do
+    # mapa, na ordem do mapa, que também são destinos da UF)
+    principais_destinos_sh6 = utils.paises_em_comum_ranking(
+        ranking_mapa, ranking_uf, chave="CO_SH6"
+    ).query("CO_SH6 in @filtro_oportunidades_selecionadas")
+    # Principais destinos de exportacao por grupo da UF selecionada
+    principais_destinos_grupo = utils.paises_em_comum_ranking(
+        ranking_mapa_grupo, ranking_grupo_uf, chave="desc_grupo"
     )
-    df_oportunidades_potenciais.to_excel(
-        writer, sheet_name="Oportunidades Potenciais", index=False
+
+    # OPORTUNIDADES TRADICIONAIS
+
+    # Oportunidades identificadas para UF e Classificadas pelo Mapa
+    df_oportunidades_classificadas = utils.gerar_oportunidades(
+        tipo="classificadas",
+        df=mapa_apex,
+        filtro_oportunidades_selecionadas=filtro_oportunidades_selecionadas,
+        tradutor_sh6=tradutor_sh6,
+        tradutor_grupos=tradutor_grupos,
+    )
+
+    # Oportunidades identificadas para UF por SH6
+    df_oportunidades_sh6 = utils.gerar_oportunidades(
+        tipo="uf_sh6",
+        df=df_exp,
+        uf_selecionada=uf_selecionada,
+        filtro_oportunidades_selecionadas=filtro_oportunidades_selecionadas,
+        tradutor_sh6=tradutor_sh6,
+        tradutor_grupos=tradutor_grupos,
+        df_oportunidades=df_oportunidades,
+        principais_destinos_sh6=principais_destinos_sh6,
+        top_5_destinos_mapa_sh6=top_5_destinos_mapa_sh6,
+        janelas=janelas,
+    )
+
+    # Oportunidades identificadas para UF por Grupo
+    df_oportunidades_grupo = utils.gerar_oportunidades(
+        tipo="uf_grupo",
+        df=df_exp,
+        uf_selecionada=uf_selecionada,
+        filtro_oportunidades_selecionadas=filtro_oportunidades_selecionadas,
+        tradutor_sh6=tradutor_sh6,
+        tradutor_grupos=tradutor_grupos,
+        df_oportunidades=df_oportunidades,
+        principais_destinos_grupo=principais_destinos_grupo,
+        top_5_destinos_mapa_grupo=top_5_destinos_mapa_grupo,
+        janelas=janelas,
+    )
+
+    # OPORTUNIDADES A EXPLORAR
+
+    filtro_quartil_oportunidades_explorar = df_oportunidades_sh6[
+        f"soma_uf_{atual}"
+    ].quantile(0.25, interpolation="linear")
+
+    filtro_tx_crescimento_oportunidades_explorar = (
+        soma_uf_total_atual.merge(soma_uf_total_inicial, on=["SG_UF_NCM"], how="left")
+        .assign(
+            tx_crescimento=lambda x: (
+                x[f"soma_uf_total_{atual}"] / x[f"soma_uf_total_{inicial}"]
+            )
+            - 1
+        )
+        .loc[0, "tx_crescimento"]
+    )
+    df_oportunidades_explorar = utils.gerar_oportunidades_explorar(
+        df=df_oportunidades_sh6,
+        filtro_quartil_oportunidades_explorar=filtro_quartil_oportunidades_explorar,
+        filtro_tx_crescimento_oportunidades_explorar=filtro_tx_crescimento_oportunidades_explorar,
+        janelas=janelas,
+    )
+
+    filtro_oportunidades_explorar = df_oportunidades_explorar["cod_sh6"].unique()
+
+    df_oportunidades_explorar_classificadas = df_oportunidades_classificadas.query(
+        "cod_sh6 in @filtro_oportunidades_explorar"
+    )
+    # OPORTUNIDADES POTENCIAIS
+
+    df_rais_uf = df_rais_ufs[df_rais_ufs["sigla_uf"] == uf_selecionada]
+
+    # Identificando os 5 maiores SH6 nao tradicionais por CNAE
+
+    maiores_sh6_nao_tradicionais = utils.identificar_maiores_sh6_nao_tradicionais(
+        df=df_vcr,
+        tradutor_cnae=tradutor_cnae,
+        filtro_quartil=filtro_q50,
+        janela=janela_atual,
+    )
+
+    # Identificando o valor exportado dos SH6 tradicionais por CNAE
+
+    exp_oportunidades_tradicionais_cnae = (
+        df_oportunidades_sh6[["cod_sh6", f"soma_uf_{atual}"]]
+        .merge(tradutor_cnae, on="cod_sh6", how="left")
+        .groupby(["cod_grupo"], as_index=False)
+        .agg(exp_oport_trad=(f"soma_uf_{atual}", "sum"))
+    )
+
+    # Oportunidades Potenciais
+
+    df_oportunidades_potenciais = utils.gerar_oportunidades_potenciais(
+        df=df_vcr,
+        filtro_quartil=filtro_q50,
+        tradutor_cnae=tradutor_cnae,
+        df_rais_uf=df_rais_uf,
+        maiores_sh6_nao_tradicionais=maiores_sh6_nao_tradicionais,
+        exp_oportunidades_tradicionais_cnae=exp_oportunidades_tradicionais_cnae,
+        janela=janela_atual,
+    )
+
+    # EXPORTANDO OS DADOS
+
+    arquivo_oportunidades = f"{uf_selecionada}_oportunidades.xlsx"
+    print(f"Salvando resultados em: {caminho_resultado}{arquivo_oportunidades}")
+
+    escrita = utils.salvar_planilhas(
+        caminho_resultado + arquivo_oportunidades,
+        {
+            "Oportunidades UF SH6": df_oportunidades_sh6,
+            "Oportunidades Classificadas": df_oportunidades_classificadas,
+            "Oportunidades UF Grupo": df_oportunidades_grupo,
+            "Oportunidades a Explorar": df_oportunidades_explorar,
+            "Oport a Explorar Classif": df_oportunidades_explorar_classificadas,
+            "Oportunidades Potenciais": df_oportunidades_potenciais,
+        },
+        formatos=formatos_saida,
+        em_segundo_plano=em_segundo_plano,
+    )
+    print(f"--- Processamento para UF: {uf_selecionada} concluído ---")
+    return escrita
+
+
+def _resultado_lote(uf_selecionada, inicio, erro):
+    return {
+        "uf": uf_selecionada,
+        "sucesso": erro is None,
+        "segundos": round(time.time() - inicio, 2),
+        "erro": erro,
+    }
+
+
+def _processar_uf_lote(uf_selecionada):
+    """Processa uma UF no lote, devolvendo o tempo e o erro (se houver)."""
+    inicio = time.time()
+    try:
+        processar_uf(uf_selecionada)
+        erro = None
+    except Exception as e:
+        erro = f"{type(e).__name__}: {e}"
+    return _resultado_lote(uf_selecionada, inicio, erro)
+
+
+def processar_lote(ufs, processos=None):
+    """
+    Processa várias UFs carregando as bases compartilhadas uma única vez e
+    distribuindo as UFs entre processos.
+
+    Parâmetros:
+    ufs (list): UFs a processar (repetições são descartadas).
+    processos (int, opcional): Número de processos. Padrão: um por núcleo
+        disponível (limitado ao número de UFs). Com 1, processa em série.
+
+    Retorna:
+    DataFrame com uma linha por UF (uf, sucesso, segundos, erro).
+    """
+    ufs = list(dict.fromkeys(ufs))
+    bases = carregar_bases(ufs)
+    processos = min(processos or os.cpu_count() or 1, len(ufs))
+
+    if processos <= 1:
+        # Em série, cada UF é gravada em segundo plano enquanto a seguinte é
+        # calculada; os erros de gravação são atribuídos à UF correspondente
+        usar_bases(bases)
+        resultados, escritas = [], []
+        for uf in ufs:
+            inicio = time.time()
+            try:
+                escritas.append(processar_uf(uf, em_segundo_plano=True))
+                erro = None
+            except Exception as e:
+                escritas.append(None)
+                erro = f"{type(e).__name__}: {e}"
+            resultados.append(_resultado_lote(uf, inicio, erro))
+        for resultado, escrita in zip(resultados, escritas):
+            if escrita is None:
+                continue
+            try:
+                utils.aguardar_planilhas([escrita])
+            except Exception as e:
+                resultado.update(sucesso=False, erro=f"{type(e).__name__}: {e}")
+    else:
+        with processos_lote.executor_processos(
+            processos, usar_bases, (bases,)
+        ) as executor:
+            resultados = list(executor.map(_processar_uf_lote, ufs))
+    return pd.DataFrame(resultados)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Processa dados de exportação para uma ou mais UFs."
+    )
+    parser.add_argument(
+        "--uf",
+        type=str,
+        nargs="+",
+        required=True,
+        help="Siglas das UFs a serem processadas (ex: BA SP MG)",
     )
-print(f"--- Processamento para UF: {uf_selecionada} concluído ---")
+    parser.add_argument(
+        "--processos",
+        type=int,
+        default=None,
+        help="Número de processos (padrão: um por núcleo)",
+    )
+    args = parser.parse_args()
+
+    resultados = processar_lote(args.uf, processos=args.processos)
+    print(resultados.to_string(index=False))
+    if not resultados["sucesso"].all():
+        sys.exit(1)
@@ -1,9 +1,13 @@
 # %%
-import pandas as pd
 import utils
 import importlib
+import sys
 from google.cloud import bigquery
 
+sys.path.append("../../cei")
+import comexstat  # noqa: E402
+import tradutores  # noqa: E402
+
 importlib.reload(utils)
 billing_project_id = "gold-braid-417822"
 client = bigquery.Client(project=billing_project_id)
@@ -13,40 +17,65 @@ caminho_resultado = "D:/OneDrive - Associacao Antonio Vieira/UAPP_ProjetoCEI/APE
 print("Iniciando a execução do script de tabelas")
 
 uf_selecionada = "RN"
+# "pandas" agrega a base em memória; "duckdb" agrega por SQL direto no Parquet
+# (cubo das tabelas de exportação e balança)
+motor = "pandas"
+# Formatos dos resultados: "xlsx" e/ou "parquet"/"csv" (uma tabela por aba,
+# para o Power BI)
+formatos_saida = ["xlsx"]
 
-# Tradutores
-tradutor_grupo = pd.read_excel(caminho + "trad_cuci.xlsx", engine="calamine").pipe(
-    utils.ajuste_tradutores, colunas_tamanhos={"id_sh6": 6}
-)
-tradutor_uf_regiao = pd.read_excel(caminho + "trad_uf.xlsx", engine="calamine")
-tradutor_isic = pd.read_excel(caminho + "trad_isic.xlsx", engine="calamine").pipe(
-    utils.ajuste_tradutores, colunas_tamanhos={"id_sh6": 6}
-)
-tradutor_ncm = (
-    pd.read_excel(caminho + "trad_sh6.xlsx", engine="calamine")[["id_sh6", "id_ncm"]]
-    .drop_duplicates()
-    .pipe(utils.ajuste_tradutores, colunas_tamanhos={"id_sh6": 6, "id_ncm": 8})
+
+# Dimensão NCM (NCM -> SH6, grupo CUCI, ISIC e descrição do SH6), montada a partir
+# das planilhas e guardada em cache; só é reconstruída quando alguma planilha muda
+def construir_dimensao_ncm():
+    tradutor_grupo = tradutores.ler_excel(
+        caminho + "trad_cuci.xlsx", engine="calamine"
+    ).pipe(utils.ajuste_tradutores, colunas_tamanhos={"id_sh6": 6})
+    tradutor_isic = tradutores.ler_excel(
+        caminho + "trad_isic.xlsx", engine="calamine"
+    ).pipe(utils.ajuste_tradutores, colunas_tamanhos={"id_sh6": 6})
+    trad_sh6 = tradutores.ler_excel(caminho + "trad_sh6.xlsx", engine="calamine")
+    tradutor_ncm = (
+        trad_sh6[["id_sh6", "id_ncm"]]
+        .drop_duplicates()
+        .pipe(utils.ajuste_tradutores, colunas_tamanhos={"id_sh6": 6, "id_ncm": 8})
+    )
+    tradutor_sh6 = (
+        trad_sh6[["id_sh6", "desc_sh6"]]
+        .drop_duplicates()
+        .pipe(utils.ajuste_tradutores, colunas_tamanhos={"id_sh6": 6})
+    )
+    return utils.construir_dimensao_ncm(
+        tradutor_ncm,
+        [tradutor_grupo, tradutor_isic, tradutor_sh6],
+        coluna_ncm="id_ncm",
+        coluna_sh6="id_sh6",
+    )
+
+
+dimensao_ncm = utils.carregar_dimensao_ncm(
+    [
+        caminho + arquivo
+        for arquivo in ["trad_cuci.xlsx", "trad_isic.xlsx", "trad_sh6.xlsx"]
+    ],
+    construir_dimensao_ncm,
+    nome="dimensao_ncm_tabelas",
 )
+
+# Tradutores
+tradutor_uf_regiao = tradutores.ler_excel(caminho + "trad_uf.xlsx", engine="calamine")
 tradutor_via = (
-    pd.read_excel(caminho + "trad_via.xlsx", engine="calamine")
+    tradutores.ler_excel(caminho + "trad_via.xlsx", engine="calamine")
     .rename(columns={"chave": "id_via", "valor": "via"})
     .drop_duplicates()
     .assign(id_via=lambda x: x["id_via"].astype(str))[["id_via", "via"]]
 )
-tradutor_sh4 = pd.read_excel(caminho + "trad_sh4.xlsx", engine="calamine").pipe(
+tradutor_sh4 = tradutores.ler_excel(caminho + "trad_sh4.xlsx", engine="calamine").pipe(
     utils.ajuste_tradutores,
     colunas_tamanhos={"id_sh4": 4},
 )
-tradutor_sh6 = (
-    pd.read_excel(caminho + "trad_sh6.xlsx", engine="calamine")[["id_sh6", "desc_sh6"]]
-    .drop_duplicates()
-    .pipe(
-        utils.ajuste_tradutores,
-        colunas_tamanhos={"id_sh6": 6},
-    )
-)
-tradutor_mun = pd.read_excel(caminho + "trad_mun.xlsx", engine="calamine")
-tradutor_pais = pd.read_excel(caminho + "trad_pais.xlsx", engine="calamine")
+tradutor_mun = tradutores.ler_excel(caminho + "trad_mun.xlsx", engine="calamine")
+tradutor_pais = tradutores.ler_excel(caminho + "trad_pais.xlsx", engine="calamine")
 
 query_mesorregiao_mun = """
 SELECT
@@ -64,65 +93,68 @@ tradutor_mesorregiao = (
 anos = list(range(2013, 2025))
 ano_maximo = 2024
 ano_minimo = 2019
-df_exp_completa = (
-    pd.read_csv(
-        "../../data/EXP_COMPLETA.csv", sep=";", encoding="latin1", engine="pyarrow"
+# As bases da UF só são carregadas com motor="pandas"; com "duckdb" os
+# agregados são calculados direto no dataset Parquet. Os totais de todas as UFs
+# vêm do cubo ano x UF (ver utils.gerar_cubo_tabelas), sem ler a EXP nacional
+if motor == "pandas":
+    df_exp_uf = comexstat.ler_comexstat(
+        "EXP",
+        anos=anos,
+        ufs=uf_selecionada,
+        colunas=["CO_ANO", "SG_UF_NCM", "CO_NCM", "CO_PAIS", "CO_VIA", "VL_FOB"],
     )
-    .query("CO_ANO in @anos")
-    .reset_index(drop=True)
-)
-
-df_imp_completa = (
-    pd.read_csv(
-        "../../data/IMP_COMPLETA.csv", sep=";", encoding="latin1", engine="pyarrow"
+    # Exportação e importação da UF em uma base só (coluna FLUXO), para a balança
+    df_comex_uf = comexstat.ler_comexstat_fluxos(
+        anos=anos, ufs=uf_selecionada, colunas=["CO_ANO", "SG_UF_NCM", "VL_FOB"]
     )
-    .query("CO_ANO in @anos")
-    .reset_index(drop=True)
-)
+else:
+    df_exp_uf = None
+    df_comex_uf = None
 
-df_exp_mun = (
-    pd.read_csv(
-        "../../data/EXP_COMPLETA_MUN.csv", sep=";", encoding="latin1", engine="pyarrow"
-    )
-    .query("CO_ANO in @anos")
-    .reset_index(drop=True)
+# Base municipal: lê apenas a partição da UF selecionada
+df_exp_mun = comexstat.ler_comexstat("MUN", anos=anos, ufs=uf_selecionada)
+
+# Agregados de exportação calculados uma única vez (totais ano x UF de todas
+# as UFs e ano x SH6 x país x via da UF); todos os gráficos e tabelas de
+# exportação abaixo são derivados deles
+cubo = utils.gerar_cubo_tabelas(
+    df_exp_uf=df_exp_uf,
+    uf_selecionada=uf_selecionada,
+    dimensao_ncm=dimensao_ncm,
+    motor=motor,
+    anos=anos,
 )
+
 # Gráfico 1 - EXP e PIB
 df_exp_regiao = utils.gerar_exp_regiao(
-    df_exp_completa=df_exp_completa,
+    cubo=cubo,
     tradutor_uf_regiao=tradutor_uf_regiao,
 )
 df_part_exp_uf_regiao = utils.gerar_part_exp_uf_regiao(
-    df_exp_completa=df_exp_completa,
+    cubo=cubo,
     tradutor_uf_regiao=tradutor_uf_regiao,
     df_exp_regiao=df_exp_regiao,
     uf_selecionada=uf_selecionada,
 )
 # Gráfico 2 - EXP UF e REGIAO
 df_exp_uf_regiao = utils.gerar_exp_uf_regiao(
-    df_exp_completa=df_exp_completa,
+    cubo=cubo,
     tradutor_uf_regiao=tradutor_uf_regiao,
     ano_minimo=ano_minimo,
     ano_maximo=ano_maximo,
 )
 
-df_exp_uf_historico = utils.gerar_exp_uf_historico(
-    df_exp_completa=df_exp_completa,
-    uf_selecionada=uf_selecionada,
-)
+df_exp_uf_historico = utils.gerar_exp_uf_historico(cubo=cubo)
 
 # Gráfico 4 - EXP VIA
-df_exp_via = utils.gerar_exp_via(
-    df_exp_completa=df_exp_completa,
-    uf_selecionada=uf_selecionada,
-    tradutor_via=tradutor_via,
-)
+df_exp_via = utils.gerar_exp_via(cubo=cubo, tradutor_via=tradutor_via)
 
 # Gráfico 5 - BALANCA COMERCIAL
 df_balanca = utils.gerar_balanca_comercial(
-    df_exp_completa=df_exp_completa,
-    df_imp_completa=df_imp_completa,
+    df_comex_completa=df_comex_uf,
     uf_selecionada=uf_selecionada,
+    motor=motor,
+    anos=anos,
 )
 
 # Tabela 1 - EXPORTACOES MUNICIPIOS
@@ -157,28 +189,23 @@ df_exp_mesorregioes = utils.gerar_exp_mesorregioes(
 
 # Figura 2 - MACROSSETORES
 df_exp_macrossetores = utils.gerar_exp_macrossetores(
-    df_exp_completa=df_exp_completa,
-    uf_selecionada=uf_selecionada,
+    cubo=cubo,
     ano_minimo=ano_minimo,
     ano_maximo=ano_maximo,
-    tradutor_ncm=tradutor_ncm,
-    tradutor_isic=tradutor_isic,
+    dimensao_ncm=dimensao_ncm,
 )
 
 # Tabela 3 - GRUPO CUCI
 df_exp_grupo = utils.gerar_exp_grupo(
-    df_exp_completa=df_exp_completa,
-    uf_selecionada=uf_selecionada,
+    cubo=cubo,
     ano_minimo=ano_minimo,
     ano_maximo=ano_maximo,
-    tradutor_ncm=tradutor_ncm,
-    tradutor_grupo=tradutor_grupo,
+    dimensao_ncm=dimensao_ncm,
 )
 
 # Tabela 4 - EXPORTACAO DESTINOS
 df_exp_destinos = utils.gerar_exp_destinos(
-    df_exp_completa=df_exp_completa,
-    uf_selecionada=uf_selecionada,
+    cubo=cubo,
     ano_minimo=ano_minimo,
     ano_maximo=ano_maximo,
     tradutor_pais=tradutor_pais,
@@ -186,26 +213,19 @@ df_exp_destinos = utils.gerar_exp_destinos(
 
 # Tabelas Auxiliares
 df_tabela_auxiliar = utils.gerar_tabela_auxiliar(
-    df_exp_completa=df_exp_completa,
+    cubo=cubo,
     ano_minimo=ano_minimo,
     ano_maximo=ano_maximo,
-    uf_selecionada=uf_selecionada,
-    tradutor_ncm=tradutor_ncm,
-    tradutor_isic=tradutor_isic,
+    dimensao_ncm=dimensao_ncm,
     tradutor_pais=tradutor_pais,
     tradutor_via=tradutor_via,
-    tradutor_grupo=tradutor_grupo,
-    tradutor_sh6=tradutor_sh6,
 )
 
 df_tabela_auxiliar_sh6_pais = utils.gerar_tabela_auxiliar_sh6_pais(
-    df_exp_completa=df_exp_completa,
+    cubo=cubo,
     anos=anos,
-    uf_selecionada=uf_selecionada,
-    tradutor_ncm=tradutor_ncm,
+    dimensao_ncm=dimensao_ncm,
     tradutor_pais=tradutor_pais,
-    tradutor_grupo=tradutor_grupo,
-    tradutor_sh6=tradutor_sh6,
 )
 
 df_tabela_auxiliar_uf = utils.gerar_tabela_auxiliar_uf(
@@ -219,44 +239,40 @@ df_tabela_auxiliar_uf = utils.gerar_tabela_auxiliar_uf(
     tradutor_mesorregiao=tradutor_mesorregiao,
 )
 # Salvando os arquivos
-
+# As duas planilhas são gravadas em paralelo, em segundo plano
 base_tabelas_graficos = f"{uf_selecionada}_base_tabelas_graficos.xlsx"
-
-with pd.ExcelWriter(
-    caminho_resultado + base_tabelas_graficos, engine="openpyxl"
-) as writer:
-    df_part_exp_uf_regiao.to_excel(
-        writer, sheet_name="Participação da UF na Região", index=False
-    )
-    df_exp_uf_regiao.to_excel(
-        writer, sheet_name="Exportação por UF e Região", index=False
-    )
-    df_exp_uf_historico.to_excel(
-        writer, sheet_name="Histório da Exportação da UF", index=False
-    )
-    df_exp_via.to_excel(writer, sheet_name="Exportação por VIA", index=False)
-    df_balanca.to_excel(writer, sheet_name="Balança Comercial", index=False)
-    df_exp_part_mun.to_excel(writer, sheet_name="Part dos Mun em 2024", index=False)
-    df_exp_mun_sh4.to_excel(writer, sheet_name="Part SH4 por Mun", index=False)
-    df_exp_mesorregioes.to_excel(
-        writer, sheet_name="Exportação por Mesorregião", index=False
-    )
-    df_exp_macrossetores.to_excel(
-        writer, sheet_name="Exportação por Macrosetor", index=False
-    )
-    df_exp_grupo.to_excel(writer, sheet_name="Exportação por Grupo", index=False)
-    df_exp_destinos.to_excel(writer, sheet_name="Exportação por Destinos", index=False)
+utils.salvar_planilhas(
+    caminho_resultado + base_tabelas_graficos,
+    {
+        "Participação da UF na Região": df_part_exp_uf_regiao,
+        "Exportação por UF e Região": df_exp_uf_regiao,
+        "Histório da Exportação da UF": df_exp_uf_historico,
+        "Exportação por VIA": df_exp_via,
+        "Balança Comercial": df_balanca,
+        "Part dos Mun em 2024": df_exp_part_mun,
+        "Part SH4 por Mun": df_exp_mun_sh4,
+        "Exportação por Mesorregião": df_exp_mesorregioes,
+        "Exportação por Macrosetor": df_exp_macrossetores,
+        "Exportação por Grupo": df_exp_grupo,
+        "Exportação por Destinos": df_exp_destinos,
+    },
+    formatos=formatos_saida,
+    em_segundo_plano=True,
+)
 
 base_tabelas_auxiliares = f"{uf_selecionada}_base_tabelas_auxiliares.xlsx"
-with pd.ExcelWriter(
-    caminho_resultado + base_tabelas_auxiliares, engine="openpyxl"
-) as writer:
-    df_tabela_auxiliar.to_excel(writer, sheet_name="Base Exp", index=False)
-    df_tabela_auxiliar_sh6_pais.to_excel(
-        writer, sheet_name="Exp SH6 e País", index=False
-    )
-    df_tabela_auxiliar_uf.to_excel(writer, sheet_name="Base Exp UF", index=False)
-    df_exp_mun_uf.to_excel(writer, sheet_name="Base Exp Municipios", index=False)
+utils.salvar_planilhas(
+    caminho_resultado + base_tabelas_auxiliares,
+    {
+        "Base Exp": df_tabela_auxiliar,
+        "Exp SH6 e País": df_tabela_auxiliar_sh6_pais,
+        "Base Exp UF": df_tabela_auxiliar_uf,
+        "Base Exp Municipios": df_exp_mun_uf,
+    },
+    formatos=formatos_saida,
+    em_segundo_plano=True,
+)
+utils.aguardar_planilhas()
 
 print("Execução do script de tabelas finalizada")
 print("Arquivos salvos em: ", caminho_resultado)
@@ -1,6 +1,16 @@
+import hashlib
+import json
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 import pandas as pd
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../cei"))
+import comexstat  # noqa: E402
+
 
 def ajuste_tradutores(tradutor, colunas_tamanhos):
     """
@@ -22,28 +32,380 @@ def ajuste_tradutores(tradutor, colunas_tamanhos):
     )
 
 
-def calcular_soma_br_por_sh6(df, ano_inicial, ano_final):
-    """Calcula o total exportado do Brasil por SH6 para um intervalo de anos"""
-    anos = f"{str(ano_inicial)[-2:]}_{str(ano_final)[-2:]}"
-    filtro_anos = df["CO_ANO"].between(ano_inicial, ano_final)
-    return (
-        df[filtro_anos]
-        .groupby("CO_SH6")["VL_FOB"]
-        .sum()
-        .reset_index()
-        .rename(columns={"VL_FOB": f"soma_br_{anos}"})
+def construir_dimensao_ncm(tradutor_ncm, tradutores_sh6, coluna_ncm, coluna_sh6):
+    """
+    Monta a dimensão NCM com todas as classificações por SH6 já resolvidas
+    (uma linha por NCM, indexada pelo código NCM).
+
+    Parâmetros:
+    tradutor_ncm (DataFrame): Tradutor NCM -> SH6.
+    tradutores_sh6 (list): Tradutores indexados por SH6 (grupo, ISIC, descrição...).
+    coluna_ncm (str): Nome da coluna NCM no tradutor_ncm.
+    coluna_sh6 (str): Nome da coluna SH6 comum aos tradutores.
+
+    Retorna:
+    DataFrame indexado por NCM.
+    """
+    dimensao = tradutor_ncm.drop_duplicates()
+    for tradutor in tradutores_sh6:
+        dimensao = dimensao.merge(
+            tradutor, on=coluna_sh6, how="left", validate="many_to_one"
+        )
+    dimensao = dimensao.set_index(coluna_ncm)
+    if not dimensao.index.is_unique:
+        raise ValueError(f"O tradutor possui códigos '{coluna_ncm}' duplicados")
+    return dimensao
+
+
+def hash_arquivos(arquivos):
+    """
+    Calcula um hash único para uma lista de arquivos, combinando o caminho e
+    o hash do conteúdo (comexstat.hash_arquivo) de cada um.
+    """
+    h = hashlib.sha256()
+    for arquivo in arquivos:
+        h.update(f"{arquivo}\0{comexstat.hash_arquivo(arquivo)}\n".encode())
+    return h.hexdigest()
+
+
+def _gravar_parquet(df, arquivo_cache):
+    """
+    Grava o cache em arquivo temporário e renomeia, para que uma gravação
+    interrompida (ou simultânea, no lote de UFs) não deixe um arquivo truncado
+    """
+    os.makedirs(os.path.dirname(arquivo_cache) or ".", exist_ok=True)
+    temporario = f"{arquivo_cache}.{os.getpid()}.tmp"
+    df.to_parquet(temporario)
+    os.replace(temporario, arquivo_cache)
+
+
+def _remover_versoes_antigas(arquivo_cache, prefixo):
+    """
+    Remove as versões antigas de um cache (<prefixo>_<versão>.parquet no
+    mesmo diretório), mantendo arquivo_cache. A versão tem de ser exatamente
+    16 dígitos hexadecimais, para não apagar caches de outro prefixo que
+    comece igual (ex: orbis_ajuste_orbis e orbis_ajuste_orbis_uf).
+    """
+    caminho_cache = os.path.dirname(arquivo_cache) or "."
+    padrao = re.compile(re.escape(prefixo) + r"_[0-9a-f]{16}\.parquet")
+    for nome in os.listdir(caminho_cache):
+        antigo = os.path.join(caminho_cache, nome)
+        if padrao.fullmatch(nome) and antigo != arquivo_cache:
+            os.remove(antigo)
+
+
+# Versão da construção da dimensão NCM: incrementar quando
+# construir_dimensao_ncm ou as funções construir dos scripts (tabelas.py,
+# oportunidades.py) mudarem, invalidando o cache
+VERSAO_DIMENSAO_NCM = 1
+
+
+def carregar_dimensao_ncm(
+    arquivos, construir, caminho_cache="../data/cache/", nome="dimensao_ncm"
+):
+    """
+    Carrega a dimensão NCM do cache em disco, construindo-a apenas quando as
+    planilhas de origem mudam (a versão é o hash dos arquivos e de
+    VERSAO_DIMENSAO_NCM).
+
+    Parâmetros:
+    arquivos (list): Caminhos das planilhas usadas para construir a dimensão.
+    construir (callable): Função sem argumentos que monta a dimensão.
+    caminho_cache (str): Diretório do cache.
+    nome (str): Prefixo do arquivo de cache.
+
+    Retorna:
+    DataFrame indexado por NCM.
+    """
+    versao = hashlib.sha256(
+        f"{VERSAO_DIMENSAO_NCM}|{hash_arquivos(arquivos)}".encode()
+    ).hexdigest()[:16]
+    arquivo_cache = os.path.join(caminho_cache, f"{nome}_{versao}.parquet")
+    if os.path.exists(arquivo_cache):
+        return pd.read_parquet(arquivo_cache)
+
+    dimensao = construir()
+    _gravar_parquet(dimensao, arquivo_cache)
+    return dimensao
+
+
+def mapear_dimensao(df, dimensao, coluna, colunas, chave=None):
+    """
+    Acrescenta ao df as colunas da dimensão correspondentes aos códigos de
+    `coluna`, sem merge: os códigos distintos são localizados uma única vez
+    na dimensão e os valores são distribuídos às linhas com um take vetorizado.
+    Códigos em texto com zeros à esquerda e inteiros são tratados igualmente.
+
+    Parâmetros:
+    df (DataFrame): Base com a coluna de código.
+    dimensao (DataFrame): Dimensão indexada pelo código.
+    coluna (str): Coluna de código no df.
+    colunas (list): Colunas da dimensão a serem acrescentadas.
+    chave (str, opcional): Coluna da dimensão a ser usada como código no lugar
+        do índice (ex: SH6 na dimensão NCM).
+
+    Retorna:
+    DataFrame com as colunas acrescentadas (NaN para códigos sem correspondência).
+    """
+    tabela = (
+        dimensao if chave is None else dimensao.drop_duplicates(chave).set_index(chave)
     )
+    tabela = tabela.set_axis(pd.to_numeric(tabela.index), axis=0)
+    if tabela.empty:
+        # Dimensão vazia: nenhum código tem correspondência
+        return df.assign(**{c: np.nan for c in colunas})
 
+    codigos, unicos = pd.factorize(df[coluna])
+    posicoes = tabela.index.get_indexer(pd.to_numeric(pd.Index(np.asarray(unicos))))
+    linhas = np.where(codigos >= 0, posicoes[codigos], -1)
+    sem_correspondencia = linhas < 0
 
-def calcular_soma_br_total(df, ano_inicial, ano_final):
-    """Calcula o total exportado do Brasil para um intervalo de anos"""
-    filtro_anos = df["CO_ANO"].between(ano_inicial, ano_final)
-    return df[filtro_anos]["VL_FOB"].sum()
+    resultado = {}
+    for c in colunas:
+        valores = tabela[c].to_numpy().take(linhas)
+        if sem_correspondencia.any():
+            valores = np.where(sem_correspondencia, np.nan, valores)
+        resultado[c] = valores
+    return df.assign(**resultado)
+
+
+# Agregados já calculados nesta sessão, por arquivo de cache
+_agregados_memorizados = {}
+
+# Versão do cálculo dos agregados memorizados, parte de todas as chaves:
+# incrementar quando um cálculo memorizado mudar (ex: calcular_vcr_ufs,
+# calcular_soma_br_*, correspondencia_novos em oportunidades.py), invalidando
+# os agregados gravados em disco
+VERSAO_AGREGADOS = 1
+
+
+def memorizar_agregado(nome, chave, calcular, caminho_cache="../data/cache/agregados/"):
+    """
+    Memoriza um agregado que só depende da versão dos dados e dos parâmetros
+    (ex: somas do Brasil por SH6 em uma janela de anos): na sessão, em memória,
+    e entre execuções, em um arquivo Parquet cujo nome é o hash da chave (e
+    de VERSAO_AGREGADOS).
+
+    Parâmetros:
+    nome (str): Nome do agregado (prefixo do arquivo de cache).
+    chave (list): Valores que identificam o resultado (ex: versão da base
+        de comexstat.versao_dataset, anos, filtro de SH6).
+    calcular (callable): Função sem argumentos que calcula o agregado.
+    caminho_cache (str): Diretório do cache.
+
+    Retorna:
+    DataFrame com o agregado.
+    """
+    versao = hashlib.sha256(
+        json.dumps(
+            [nome, VERSAO_AGREGADOS, chave], sort_keys=True, default=str
+        ).encode()
+    ).hexdigest()[:16]
+    arquivo_cache = os.path.join(caminho_cache, f"{nome}_{versao}.parquet")
+    if arquivo_cache not in _agregados_memorizados:
+        if os.path.exists(arquivo_cache):
+            agregado = pd.read_parquet(arquivo_cache)
+        else:
+            agregado = calcular()
+            _gravar_parquet(agregado, arquivo_cache)
+        _agregados_memorizados[arquivo_cache] = agregado
+    return _agregados_memorizados[arquivo_cache].copy()
+
+
+# Gravação das planilhas em segundo plano (ver salvar_planilhas)
+_executor_planilhas = None
+_planilhas_pendentes = []
+
+
+def _escrever_xlsx(arquivo, planilhas):
+    """
+    Grava as abas com o xlsxwriter em modo constant_memory (cada linha vai
+    para o disco assim que é escrita). Os formatos do cabeçalho e das datas
+    são criados uma vez por arquivo e o layout é o do DataFrame.to_excel com
+    index=False.
+    """
+    import xlsxwriter
+
+    temporario = f"{arquivo}.{os.getpid()}.tmp"
+    try:
+        with xlsxwriter.Workbook(temporario, {"constant_memory": True}) as workbook:
+            formato_cabecalho = workbook.add_format(
+                {"bold": True, "border": 1, "align": "center", "valign": "top"}
+            )
+            formato_data = workbook.add_format({"num_format": "yyyy-mm-dd hh:mm:ss"})
+            for nome, df in planilhas.items():
+                worksheet = workbook.add_worksheet(nome)
+                worksheet.write_row(0, 0, df.columns.tolist(), formato_cabecalho)
+
+                # Colunas como listas de valores Python, com None nos nulos
+                # (células em branco) e ±inf como texto "inf"/"-inf" (o
+                # inf_rep do to_excel), escritas linha a linha
+                colunas = []
+                for _, serie in df.items():
+                    valores = serie.tolist()
+                    for i in np.flatnonzero(serie.isna().to_numpy()):
+                        valores[i] = None
+                    if pd.api.types.is_float_dtype(serie.dtype):
+                        for i in np.flatnonzero(np.isinf(serie.to_numpy())):
+                            valores[i] = "inf" if valores[i] > 0 else "-inf"
+                    colunas.append(valores)
+                datas = [
+                    j
+                    for j, tipo in enumerate(df.dtypes)
+                    if pd.api.types.is_datetime64_any_dtype(tipo)
+                ]
+                for i, linha in enumerate(zip(*colunas), start=1):
+                    worksheet.write_row(i, 0, linha)
+                    for j in datas:
+                        if linha[j] is not None:
+                            worksheet.write_datetime(i, j, linha[j], formato_data)
+        os.replace(temporario, arquivo)
+    finally:
+        # Em caso de erro, não deixa o arquivo temporário para trás
+        if os.path.exists(temporario):
+            os.remove(temporario)
+
+
+def _escrever_planilhas(arquivo, planilhas, formatos):
+    """Grava as abas em cada um dos formatos pedidos"""
+    raiz = os.path.splitext(arquivo)[0]
+    for formato in formatos:
+        if formato == "xlsx":
+            _escrever_xlsx(arquivo, planilhas)
+            continue
+        # Parquet/CSV: um arquivo por aba, no diretório com o nome da planilha
+        os.makedirs(raiz, exist_ok=True)
+        for nome, df in planilhas.items():
+            destino = os.path.join(raiz, f"{nome}.{formato}")
+            if formato == "parquet":
+                df.rename(columns=str).to_parquet(destino, index=False)
+            else:
+                df.to_csv(destino, sep=";", index=False, encoding="utf-8-sig")
+
+
+def salvar_planilhas(arquivo, planilhas, formatos=("xlsx",), em_segundo_plano=False):
+    """
+    Grava um conjunto de abas (dict nome -> DataFrame) em uma planilha xlsx
+    escrita em modo constant_memory e/ou em arquivos Parquet/CSV por aba
+    (para o Power BI).
+
+    Parâmetros:
+    arquivo (str): Caminho da planilha (.xlsx). Os arquivos Parquet/CSV vão
+        para um diretório com o mesmo nome, sem a extensão.
+    planilhas (dict): Abas na ordem em que devem aparecer.
+    formatos (list): Qualquer combinação de "xlsx", "parquet" e "csv".
+    em_segundo_plano (bool): Grava em uma thread, deixando o cálculo seguir;
+        ver aguardar_planilhas.
+
+    Retorna:
+    Future da gravação quando em_segundo_plano, senão None.
+    """
+    global _executor_planilhas
+    desconhecidos = set(formatos) - {"xlsx", "parquet", "csv"}
+    if desconhecidos:
+        raise ValueError(f"Formatos desconhecidos: {sorted(desconhecidos)}")
+
+    planilhas = dict(planilhas)
+    if not em_segundo_plano:
+        _escrever_planilhas(arquivo, planilhas, formatos)
+        return None
+
+    if _executor_planilhas is None:
+        _executor_planilhas = ThreadPoolExecutor(
+            max_workers=min(4, os.cpu_count() or 1),
+            thread_name_prefix="planilhas",
+        )
+    futuro = _executor_planilhas.submit(
+        _escrever_planilhas, arquivo, planilhas, formatos
+    )
+    _planilhas_pendentes.append(futuro)
+    return futuro
+
+
+def aguardar_planilhas(futuros=None):
+    """
+    Aguarda gravações em segundo plano de salvar_planilhas e repassa o
+    primeiro erro encontrado.
+
+    Parâmetros:
+    futuros (list, opcional): Gravações a aguardar. Padrão: todas as pendentes.
+    """
+    futuros = list(_planilhas_pendentes if futuros is None else futuros)
+    for futuro in futuros:
+        if futuro in _planilhas_pendentes:
+            _planilhas_pendentes.remove(futuro)
+    erros = [futuro.exception() for futuro in futuros]
+    for erro in erros:
+        if erro is not None:
+            raise erro
+
+
+def rotulo_janela(ano_inicial, ano_final):
+    """Rótulo de uma janela de anos usado nos nomes das colunas (ex: 18_20)"""
+    return f"{str(ano_inicial)[-2:]}_{str(ano_final)[-2:]}"
+
+
+def rotulo_anos(ano_inicial, ano_final):
+    """Rótulo com todos os anos da janela (ex: 21_22_23)"""
+    return "_".join(str(ano)[-2:] for ano in range(ano_inicial, ano_final + 1))
+
+
+def colunas_janelas(janelas):
+    """Colunas soma_uf_<janela> e vcr_<janela> de calcular_vcr_ufs, em ordem"""
+    rotulos = [rotulo_janela(inicio, fim) for inicio, fim in janelas]
+    return [f"soma_uf_{rotulo}" for rotulo in rotulos] + [
+        f"vcr_{rotulo}" for rotulo in rotulos
+    ]
+
+
+def calcular_soma_br_por_sh6(df, ano_inicial, ano_final, versao=None, filtro_sh6=None):
+    """
+    Calcula o total exportado do Brasil por SH6 para um intervalo de anos.
+    Com `versao` (comexstat.versao_dataset da base de df), o resultado é
+    memorizado por versão, janela de anos e filtro de SH6 (memorizar_agregado).
+    """
+    anos = rotulo_janela(ano_inicial, ano_final)
+
+    def calcular():
+        filtro = df["CO_ANO"].between(ano_inicial, ano_final)
+        if filtro_sh6 is not None:
+            filtro &= df["CO_SH6"].isin(filtro_sh6)
+        return (
+            df[filtro]
+            .groupby("CO_SH6")["VL_FOB"]
+            .sum()
+            .reset_index()
+            .rename(columns={"VL_FOB": f"soma_br_{anos}"})
+        )
+
+    if versao is None:
+        return calcular()
+    filtro = None if filtro_sh6 is None else sorted(map(str, filtro_sh6))
+    return memorizar_agregado(
+        "soma_br_por_sh6", [versao, ano_inicial, ano_final, filtro], calcular
+    )
+
+
+def calcular_soma_br_total(df, ano_inicial, ano_final, versao=None):
+    """
+    Calcula o total exportado do Brasil para um intervalo de anos (memorizado
+    por versão e janela de anos quando `versao` é informada).
+    """
+
+    def calcular():
+        filtro_anos = df["CO_ANO"].between(ano_inicial, ano_final)
+        return pd.DataFrame({"VL_FOB": [df[filtro_anos]["VL_FOB"].sum()]})
+
+    if versao is None:
+        return calcular().loc[0, "VL_FOB"]
+    return memorizar_agregado(
+        "soma_br_total", [versao, ano_inicial, ano_final], calcular
+    ).loc[0, "VL_FOB"]
 
 
 def calcular_soma_uf_por_sh6(df, ano_inicial, ano_final, uf_selecionada):
     """Calcula o total exportado do Brasil por SH6 para um intervalo de anos"""
-    anos = f"{str(ano_inicial)[-2:]}_{str(ano_final)[-2:]}"
+    anos = rotulo_janela(ano_inicial, ano_final)
     filtro_anos = df["CO_ANO"].between(ano_inicial, ano_final)
     filtro_uf = df["SG_UF_NCM"] == uf_selecionada
     return (
@@ -57,7 +419,7 @@ def calcular_soma_uf_por_sh6(df, ano_inicial, ano_final, uf_selecionada):
 
 def calcular_soma_uf_total(df, ano_inicial, ano_final, uf_selecionada):
     """Calcula o total exportado da UF para um intervalo de anos"""
-    anos = f"{str(ano_inicial)[-2:]}_{str(ano_final)[-2:]}"
+    anos = rotulo_janela(ano_inicial, ano_final)
     filtro_anos = df["CO_ANO"].between(ano_inicial, ano_final)
     filtro_uf = df["SG_UF_NCM"] == uf_selecionada
     return (
@@ -69,89 +431,227 @@ def calcular_soma_uf_total(df, ano_inicial, ano_final, uf_selecionada):
     )
 
 
-def calcular_vcr(
-    df,
-    soma_uf_18_20,
-    soma_uf_21_23,
-    soma_br_18_20,
-    soma_br_21_23,
-    soma_uf_total_18_20,
-    soma_uf_total_21_23,
-    df_br_total,
-    uf_selecionada,
-):
-    """Calcula o VCR"""
-    filtro_uf = df["SG_UF_NCM"] == uf_selecionada
+def calcular_vcr_janelas(df, janelas, df_totais=None):
+    """
+    Calcula o VCR de todas as UFs para qualquer lista de janelas de anos. Cada
+    ano recebe o rótulo do seu período (um ano pode estar em mais de uma
+    janela) e as somas de todas as janelas saem de um único agrupamento por
+    período x UF x SH6.
+
+    Parâmetros:
+    df (DataFrame): Base CO_ANO x SG_UF_NCM x CO_SH6 com VL_FOB. Os pares
+        UF x SH6 presentes recebem VCR e as somas do Brasil por SH6 vêm dela.
+    janelas (list): Pares (ano_inicial, ano_final).
+    df_totais (DataFrame, opcional): Base de onde saem os totais da UF e do
+        Brasil. Padrão: df.
+
+    Retorna:
+    DataFrame longo com as colunas SG_UF_NCM, CO_SH6, periodo (rotulo_janela),
+    soma_uf e vcr: uma linha por par UF x SH6 e janela, com 0 quando o par não
+    exporta na janela.
+    """
+    df_totais = df if df_totais is None else df_totais
+    rotulos = [rotulo_janela(inicio, fim) for inicio, fim in janelas]
+    periodos = pd.DataFrame(
+        [
+            (ano, rotulo)
+            for rotulo, (inicio, fim) in zip(rotulos, janelas)
+            for ano in range(inicio, fim + 1)
+        ],
+        columns=["CO_ANO", "periodo"],
+    )
+
+    def com_periodo(base, colunas):
+        anos = periodos.astype({"CO_ANO": base["CO_ANO"].dtype})
+        return base[["CO_ANO", *colunas]].merge(anos, on="CO_ANO")
+
+    soma_uf = (
+        com_periodo(df, ["SG_UF_NCM", "CO_SH6", "VL_FOB"])
+        .groupby(["periodo", "SG_UF_NCM", "CO_SH6"], observed=True)["VL_FOB"]
+        .sum()
+        .rename("soma_uf")
+    )
+    soma_br = soma_uf.groupby(["periodo", "CO_SH6"], observed=True).sum()
+    totais = com_periodo(df_totais, ["SG_UF_NCM", "VL_FOB"])
+    total_uf = totais.groupby(["periodo", "SG_UF_NCM"], observed=True)["VL_FOB"].sum()
+    total_br = totais.groupby("periodo")["VL_FOB"].sum()
+
+    pares = df[["SG_UF_NCM", "CO_SH6"]].drop_duplicates()
     return (
-        df[["CO_SH6", "SG_UF_NCM"]][filtro_uf]
-        .drop_duplicates()
-        .merge(soma_uf_18_20, on=["CO_SH6", "SG_UF_NCM"], how="left")
-        .merge(soma_uf_21_23, on=["CO_SH6", "SG_UF_NCM"], how="left")
-        .merge(soma_br_18_20, on="CO_SH6", how="left")
-        .merge(soma_br_21_23, on="CO_SH6", how="left")
-        .merge(soma_uf_total_18_20, on="SG_UF_NCM", how="left")
-        .merge(soma_uf_total_21_23, on="SG_UF_NCM", how="left")
-        .merge(df_br_total, how="cross")
-        .assign(
-            vcr_18_20=lambda x: (x["soma_uf_18_20"] / x["soma_uf_total_18_20"])
-            / (x["soma_br_18_20"] / x["soma_br_total_18_20"]),
-            vcr_21_23=lambda x: (x["soma_uf_21_23"] / x["soma_uf_total_21_23"])
-            / (x["soma_br_21_23"] / x["soma_br_total_21_23"]),
+        pares.merge(pd.DataFrame({"periodo": rotulos}), how="cross")
+        .merge(soma_uf.reset_index(), on=["periodo", "SG_UF_NCM", "CO_SH6"], how="left")
+        .merge(
+            soma_br.rename("soma_br").reset_index(),
+            on=["periodo", "CO_SH6"],
+            how="left",
         )
-        .fillna(0)[
-            [
-                "SG_UF_NCM",
-                "CO_SH6",
-                "soma_uf_18_20",
-                "soma_uf_21_23",
-                "vcr_18_20",
-                "vcr_21_23",
-            ]
-        ]
-        .round(2)
+        .merge(
+            total_uf.rename("total_uf").reset_index(),
+            on=["periodo", "SG_UF_NCM"],
+            how="left",
+        )
+        .merge(total_br.rename("total_br").reset_index(), on="periodo", how="left")
+        .assign(
+            vcr=lambda x: (x["soma_uf"] / x["total_uf"])
+            / (x["soma_br"] / x["total_br"])
+        )[["SG_UF_NCM", "CO_SH6", "periodo", "soma_uf", "vcr"]]
+        .fillna({"soma_uf": 0, "vcr": 0})
     )
 
 
-def ordenando_pais_exp(df, coluna, chave):
-    """Ordena os países por valor exportado"""
+def calcular_vcr_ufs(df, df_totais=None, janelas=((2018, 2020), (2021, 2023))):
+    """
+    Calcula o VCR de todas as UFs de uma vez, com o mesmo resultado de
+    calcular_vcr aplicado a cada UF (o layout largo de calcular_vcr_janelas).
+
+    Parâmetros:
+    df (DataFrame): Base CO_ANO x SG_UF_NCM x CO_SH6 com VL_FOB.
+    df_totais (DataFrame, opcional): Base de onde saem os totais da UF e do
+        Brasil. Padrão: df.
+    janelas (list): Pares (ano_inicial, ano_final).
+
+    Retorna:
+    DataFrame com as colunas SG_UF_NCM, CO_SH6, soma_uf_<janela> e
+    vcr_<janela> de cada janela, com as linhas de todas as UFs.
+    """
+    rotulos = [rotulo_janela(inicio, fim) for inicio, fim in janelas]
+    medidas = ["soma_uf", "vcr"]
+    pares = pd.MultiIndex.from_frame(
+        df[["SG_UF_NCM", "CO_SH6"]].drop_duplicates().reset_index(drop=True)
+    )
+    largo = (
+        calcular_vcr_janelas(df, janelas, df_totais)
+        .pivot(index=["SG_UF_NCM", "CO_SH6"], columns="periodo", values=medidas)
+        .reindex(index=pares, columns=pd.MultiIndex.from_product([medidas, rotulos]))
+    )
+    largo.columns = colunas_janelas(janelas)
+    return largo.reset_index().fillna(0).round(2)
+
+
+def ranquear_paises(df, coluna, chave):
+    """
+    Ordena os países de cada chave (SH6, grupo) pelo valor exportado, do
+    maior para o menor, e numera a posição de cada país, sem montar texto.
+
+    Parâmetros:
+    df (DataFrame): Base com as colunas chave, NO_PAIS e coluna.
+    coluna (str): Coluna de valor usada na ordenação.
+    chave (str): Coluna de agrupamento.
+
+    Retorna:
+    DataFrame com as colunas chave, NO_PAIS e posicao (1 = maior destino).
+    """
     return (
-        df.sort_values(by=coluna, ascending=False)
-        .groupby([chave], as_index=False)
-        .agg({"NO_PAIS": lambda x: ", ".join(x)})
+        df.sort_values(by=coluna, ascending=False, kind="stable")[[chave, "NO_PAIS"]]
+        .assign(posicao=lambda x: x.groupby(chave, sort=False).cumcount() + 1)
+        .reset_index(drop=True)
     )
 
 
-def paises_em_comum(row):
-    """Verifica se o país está na lista de países do mapa"""
-    paises_uf = row["NO_PAIS_uf"].split(", ")
-    paises_mapa = row["NO_PAIS_mapa"].split(", ")
-    comuns = [pais for pais in paises_uf if pais in paises_mapa]
-    return ", ".join(comuns[:5])
+def listar_paises(ranking, chave, n=None):
+    """
+    Monta, para cada chave, a lista de países em texto ("A, B, C") na ordem
+    do ranking. É a única etapa em que os países viram texto.
+
+    Parâmetros:
+    ranking (DataFrame): Saída de ranquear_paises (ou um subconjunto dela).
+    chave (str): Coluna de agrupamento.
+    n (int, opcional): Limita a lista aos n primeiros países.
+
+    Retorna:
+    DataFrame com as colunas chave e NO_PAIS, ordenado pela chave.
+    """
+    if n is not None:
+        ranking = ranking[ranking["posicao"] <= n]
+    return (
+        ranking.sort_values([chave, "posicao"])
+        .groupby(chave, as_index=False)
+        .agg({"NO_PAIS": ", ".join})
+    )
+
+
+def paises_em_comum_ranking(ranking, ranking_referencia, chave, n=5):
+    """
+    Para cada chave de `ranking`, os países que também estão em
+    `ranking_referencia`, na ordem de `ranking` e
+    limitados aos n primeiros. A interseção é um merge sobre códigos inteiros
+    dos países, e não uma comparação de listas linha a linha.
+
+    Parâmetros:
+    ranking (DataFrame): Ranking que define a ordem (ranquear_paises).
+    ranking_referencia (DataFrame): Ranking com os países a serem mantidos.
+    chave (str): Coluna de agrupamento.
+    n (int): Número máximo de países por chave.
+
+    Retorna:
+    DataFrame com as colunas chave e paises_comuns (texto vazio quando não
+    há países em comum), com todas as chaves de `ranking`.
+    """
+    codigos, _ = pd.factorize(
+        pd.concat(
+            [ranking["NO_PAIS"], ranking_referencia["NO_PAIS"]], ignore_index=True
+        ).astype(object)
+    )
+    esquerda = ranking.assign(id_pais=codigos[: len(ranking)])
+    direita = (
+        ranking_referencia[[chave]]
+        .assign(id_pais=codigos[len(ranking) :])
+        .drop_duplicates()
+    )
+    comuns = esquerda.merge(direita, on=[chave, "id_pais"], how="inner").sort_values(
+        [chave, "posicao"]
+    )
+    comuns = comuns[comuns.groupby(chave).cumcount() < n]
+    return (
+        ranking[[chave]]
+        .drop_duplicates()
+        .sort_values(chave)
+        .merge(
+            listar_paises(comuns, chave).rename(columns={"NO_PAIS": "paises_comuns"}),
+            on=chave,
+            how="left",
+        )
+        .fillna({"paises_comuns": ""})
+    )
 
 
 def identificar_principais_destinos(
-    df, uf_selecionada, tradutor_ncm, tradutor_paises, tradutor_grupos=None
+    df,
+    uf_selecionada,
+    dimensao_ncm,
+    tradutor_paises,
+    por_grupo=False,
+    janela=(2021, 2023),
 ):
-    """Identifica os principais destinos de exportação da UF selecionada"""
+    """
+    Identifica os principais destinos de exportação da UF selecionada na
+    janela de anos (coluna exp_destino_<rotulo_anos>, ex: exp_destino_21_22_23)
+    """
 
     filtro_uf = df["SG_UF_NCM"] == uf_selecionada
-    filtro_anos = df["CO_ANO"].between(2021, 2023)
+    filtro_anos = df["CO_ANO"].between(*janela)
+    coluna = f"exp_destino_{rotulo_anos(*janela)}"
 
     df_filtrado = (
         df[filtro_uf & filtro_anos]
-        .assign(CO_NCM=lambda x: x["CO_NCM"].astype(str).str.zfill(8))
-        .merge(tradutor_ncm, on="CO_NCM", how="left")
+        .pipe(mapear_dimensao, dimensao_ncm, coluna="CO_NCM", colunas=["CO_SH6"])
         .groupby(["CO_SH6", "SG_UF_NCM", "CO_PAIS"], as_index=False)["VL_FOB"]
         .sum()
-        .rename(columns={"VL_FOB": "exp_destino_21_22_23"})
+        .rename(columns={"VL_FOB": coluna})
         .merge(tradutor_paises, on="CO_PAIS", how="left")
     )
 
-    # Se o tradutor_grupos for fornecido, faz o agrupamento adicional
-    if tradutor_grupos is not None:
+    # Agrupamento adicional por grupo CUCI
+    if por_grupo:
         df_filtrado = (
-            df_filtrado.merge(tradutor_grupos, on="CO_SH6", how="left")
-            .groupby(["desc_grupo", "NO_PAIS"], as_index=False)["exp_destino_21_22_23"]
+            df_filtrado.pipe(
+                mapear_dimensao,
+                dimensao_ncm,
+                coluna="CO_SH6",
+                colunas=["desc_grupo"],
+                chave="CO_SH6",
+            )
+            .groupby(["desc_grupo", "NO_PAIS"], as_index=False)[coluna]
             .sum()
         )
 
@@ -170,8 +670,16 @@ def gerar_oportunidades(
     principais_destinos_grupo=None,
     top_5_destinos_mapa_sh6=None,
     top_5_destinos_mapa_grupo=None,
+    janelas=((2018, 2020), (2021, 2023)),
 ):
-    """Gera os dataframes com as oportunidades tradicionais"""
+    """
+    Gera os dataframes com as oportunidades tradicionais. Nas oportunidades da
+    UF, a exportação é a do último ano da última janela (ex: exp_uf_23) e as
+    somas e VCRs são os de todas as janelas.
+    """
+    ano_final = janelas[-1][1]
+    exp_uf = f"exp_uf_{str(ano_final)[-2:]}"
+    filtro_ano = df["CO_ANO"].astype(str) == str(ano_final)
 
     if tipo == "classificadas":
         filtro_sh6 = df["CO_SH6"].isin(filtro_oportunidades_selecionadas)
@@ -207,8 +715,7 @@ def gerar_oportunidades(
         filtro_sh6 = df["CO_SH6"].isin(filtro_oportunidades_selecionadas)
         filtro_uf = df["SG_UF_NCM"] == uf_selecionada
         return (
-            df[filtro_uf & filtro_sh6]
-            .query("CO_ANO == '2023'")
+            df[filtro_uf & filtro_sh6 & filtro_ano]
             .drop(columns=["CO_ANO", "SG_UF_NCM"])
             .merge(tradutor_sh6, on="CO_SH6", how="left")
             .merge(tradutor_grupos, on="CO_SH6", how="left")
@@ -219,24 +726,13 @@ def gerar_oportunidades(
                 columns={
                     "CO_SH6": "cod_sh6",
                     "SG_UF_NCM": "uf",
-                    "VL_FOB": "exp_uf_23",
+                    "VL_FOB": exp_uf,
                     "NO_SH6_POR": "desc_sh6",
                 }
             )[
-                [
-                    "uf",
-                    "cod_sh6",
-                    "desc_sh6",
-                    "desc_grupo",
-                    "exp_uf_23",
-                    "soma_uf_18_20",
-                    "soma_uf_21_23",
-                    "vcr_18_20",
-                    "vcr_21_23",
-                    "delta_vcr",
-                    "paises_comuns",
-                    "top_5_destinos_mapa",
-                ]
+                ["uf", "cod_sh6", "desc_sh6", "desc_grupo", exp_uf]
+                + colunas_janelas(janelas)
+                + ["delta_vcr", "paises_comuns", "top_5_destinos_mapa"]
             ]
         )
 
@@ -244,8 +740,7 @@ def gerar_oportunidades(
         filtro_sh6 = df["CO_SH6"].isin(filtro_oportunidades_selecionadas)
         filtro_uf = df["SG_UF_NCM"] == uf_selecionada
         return (
-            df[filtro_uf & filtro_sh6]
-            .query("CO_ANO == '2023'")
+            df[filtro_uf & filtro_sh6 & filtro_ano]
             .drop(columns=["CO_ANO", "SG_UF_NCM"])
             .merge(tradutor_grupos, on="CO_SH6", how="left")
             .merge(df_oportunidades, on="CO_SH6", how="left")
@@ -253,11 +748,11 @@ def gerar_oportunidades(
             .sum()
             .merge(principais_destinos_grupo, on="desc_grupo", how="left")
             .merge(top_5_destinos_mapa_grupo, on="desc_grupo", how="left")
-            .rename(columns={"SG_UF_NCM": "uf", "VL_FOB": "exp_uf_23"})[
+            .rename(columns={"SG_UF_NCM": "uf", "VL_FOB": exp_uf})[
                 [
                     "uf",
                     "desc_grupo",
-                    "exp_uf_23",
+                    exp_uf,
                     "paises_comuns",
                     "top_5_destinos_mapa",
                 ]
@@ -274,112 +769,157 @@ def gerar_oportunidades_explorar(
     df,
     filtro_quartil_oportunidades_explorar,
     filtro_tx_crescimento_oportunidades_explorar,
+    janelas=((2018, 2020), (2021, 2023)),
 ):
-    """Gera o dataframe com as oportunidades a explorar"""
+    """
+    Gera o dataframe com as oportunidades a explorar. O crescimento compara a
+    última janela com a primeira.
+    """
+    soma_inicial = f"soma_uf_{rotulo_janela(*janelas[0])}"
+    soma_final = f"soma_uf_{rotulo_janela(*janelas[-1])}"
+    exp_uf = f"exp_uf_{str(janelas[-1][1])[-2:]}"
 
-    df = df.assign(
-        taxa_cresc_exp=lambda x: (x["soma_uf_21_23"] / x["soma_uf_18_20"] - 1) * 100
-    )
+    df = df.assign(taxa_cresc_exp=lambda x: (x[soma_final] / x[soma_inicial] - 1) * 100)
 
-    filtro_oport_explorar = df["soma_uf_21_23"] <= filtro_quartil_oportunidades_explorar
+    filtro_oport_explorar = df[soma_final] <= filtro_quartil_oportunidades_explorar
     filtro_tx_crescimento = (
         df["taxa_cresc_exp"] >= filtro_tx_crescimento_oportunidades_explorar
     )
     filtro_delta_vcr = df["delta_vcr"] >= 0
-    cols_finais = [
-        "uf",
-        "cod_sh6",
-        "desc_sh6",
-        "desc_grupo",
-        "exp_uf_23",
-        "soma_uf_18_20",
-        "soma_uf_21_23",
-        "vcr_18_20",
-        "vcr_21_23",
-        "delta_vcr",
-        "taxa_cresc_exp",
-        "paises_comuns",
-        "top_5_destinos_mapa",
-    ]
-    return (
-        df[filtro_oport_explorar & filtro_tx_crescimento & filtro_delta_vcr]
-        .query("exp_uf_23 > 1000")
-        .sort_values(by="exp_uf_23", ascending=False)[cols_finais]
+    filtro_exp = df[exp_uf] > 1000
+    cols_finais = (
+        ["uf", "cod_sh6", "desc_sh6", "desc_grupo", exp_uf]
+        + colunas_janelas(janelas)
+        + ["delta_vcr", "taxa_cresc_exp", "paises_comuns", "top_5_destinos_mapa"]
     )
+    return df[
+        filtro_oport_explorar & filtro_tx_crescimento & filtro_delta_vcr & filtro_exp
+    ].sort_values(by=exp_uf, ascending=False)[cols_finais]
 
 
-def ajuste_rais(df, coluna, tipo):
-    """Ajusta o df da RAIS para calculo do VCR dos vinculos, estabelecimentos e salarios do CNAE da UF"""
+def quociente_locacional(
+    df, regiao, setor, medidas, grupos=None, df_totais=None, totais_setor=None
+):
+    """
+    Calcula o quociente locacional (VCR) de todas as células região x setor e
+    de várias medidas de uma vez: os totais da região, do setor e geral são
+    matrizes (células x medidas) e as participações e VCRs saem de operações
+    vetorizadas sobre elas.
 
-    group_cols = ["ano"] if not coluna else ["ano", coluna]
+    Parâmetros:
+    df (DataFrame): Base com as colunas de região, setor, grupos e medidas.
+    regiao (str): Coluna da região (ex: sigla_uf).
+    setor (str ou list): Coluna(s) do setor (ex: cod_grupo e sua descrição).
+    medidas (list): Colunas de valor (ex: vínculos, estabelecimentos).
+    grupos (list, opcional): Colunas que separam cálculos independentes (ex:
+        ano, nível da CNAE); os totais são calculados dentro de cada grupo.
+    df_totais (DataFrame, opcional): Base de onde saem os totais da região e
+        o total geral. Padrão: df.
+    totais_setor (list, opcional): Colunas de df (uma por medida, na mesma
+        ordem) com o total nacional já atribuído a cada linha; somadas na
+        célula, substituem o total do setor (soma das regiões) no VCR.
 
-    return df.groupby(group_cols, as_index=False).agg(
-        **{
-            f"total_vinculos_{tipo}": ("qtd_vinculos", "sum"),
-            f"total_estab_{tipo}": ("qtd_estabelecimentos", "sum"),
-            f"total_salarios_{tipo}": ("soma_remuneracao", "sum"),
-        }
-    )
+    Retorna:
+    DataFrame com grupos, regiao, setor, as medidas somadas e, para cada
+    medida, participacao_<medida> (participação na região) e vcr_<medida>.
+    Células com região ou setor nulos entram nos totais, mas não no resultado.
+    """
+    grupos = list(grupos or [])
+    setor = [setor] if isinstance(setor, str) else list(setor)
+    df_totais = df if df_totais is None else df_totais
+
+    celulas = df.groupby(
+        grupos + [regiao] + setor, as_index=False, dropna=False, observed=True
+    )[medidas + list(totais_setor or [])].sum()
+
+    def total(base, chaves):
+        # Matriz com o total da chave de cada célula, alinhada às células
+        if not chaves:
+            return base[medidas].sum().to_numpy(dtype=float)[np.newaxis, :]
+        somas = base.groupby(chaves, as_index=False, dropna=False, observed=True)[
+            medidas
+        ].sum()
+        return (
+            celulas[chaves]
+            .merge(somas, on=chaves, how="left")[medidas]
+            .to_numpy(dtype=float)
+        )
 
+    valores = celulas[medidas].to_numpy(dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        participacao = valores / total(df_totais, grupos + [regiao])
+        if totais_setor:
+            total_setor = celulas[totais_setor].to_numpy(dtype=float)
+        else:
+            total_setor = total(celulas, grupos + setor)
+        vcr = participacao / (total_setor / total(df_totais, grupos))
 
-def vcr_rais(
-    df,
-    uf_selecionada,
-    total_uf,
-    total_br,
-    total_cnae_br,
-):
-    """Calcula o VCR dos vínculos, estabelecimentos e salários do CNAE da UF"""
-    filtro_uf = df["sigla_uf"] == uf_selecionada
     return (
-        df[filtro_uf]
-        .groupby(["ano", "sigla_uf", "cod_grupo", "grupo_desc"], as_index=False)
-        .agg(
-            vinculos_cnae_uf=("qtd_vinculos", "sum"),
-            estab_cnae_uf=("qtd_estabelecimentos", "sum"),
-            salarios_cnae_uf=("soma_remuneracao", "sum"),
-        )
-        .merge(total_uf, on=["ano", "sigla_uf"], how="left")
-        .merge(total_br, on="ano", how="left")
-        .merge(total_cnae_br, on=["ano", "cod_grupo"], how="left")
+        celulas.drop(columns=list(totais_setor or []))
         .assign(
-            VCR_estabelecimentos=lambda x: (x["estab_cnae_uf"] / x["total_estab_uf"])
-            / (x["total_estab_cnae_br"] / x["total_estab_br"]),
-            VCR_vinculos=lambda x: (x["vinculos_cnae_uf"] / x["total_vinculos_uf"])
-            / (x["total_vinculos_cnae_br"] / x["total_vinculos_br"]),
-            VCR_salarios=lambda x: (x["salarios_cnae_uf"] / x["total_salarios_uf"])
-            / (x["total_salarios_cnae_br"] / x["total_salarios_br"]),
-        )
-        .drop(
-            columns=[
-                "ano",
-                "total_vinculos_uf",
-                "total_estab_uf",
-                "total_salarios_uf",
-                "total_vinculos_br",
-                "total_estab_br",
-                "total_salarios_br",
-                "total_vinculos_cnae_br",
-                "total_estab_cnae_br",
-                "total_salarios_cnae_br",
-            ]
+            **{f"participacao_{m}": participacao[:, j] for j, m in enumerate(medidas)},
+            **{f"vcr_{m}": vcr[:, j] for j, m in enumerate(medidas)},
         )
+        .dropna(subset=[regiao] + setor)
+        .reset_index(drop=True)
+    )
+
+
+def vcr_rais(df, uf_selecionada=None):
+    """
+    Calcula o VCR dos vínculos, estabelecimentos e salários de cada CNAE
+    (grupo) em todas as UFs de uma vez (quociente_locacional); com
+    uf_selecionada, retorna apenas as linhas da UF.
+    """
+    vcr = quociente_locacional(
+        df,
+        regiao="sigla_uf",
+        setor=["cod_grupo", "grupo_desc"],
+        medidas=["qtd_vinculos", "qtd_estabelecimentos", "soma_remuneracao"],
+        grupos=["ano"],
+    )
+    if uf_selecionada is not None:
+        vcr = vcr[vcr["sigla_uf"] == uf_selecionada]
+    return vcr.rename(
+        columns={
+            "qtd_vinculos": "vinculos_cnae_uf",
+            "qtd_estabelecimentos": "estab_cnae_uf",
+            "soma_remuneracao": "salarios_cnae_uf",
+            "vcr_qtd_estabelecimentos": "VCR_estabelecimentos",
+            "vcr_qtd_vinculos": "VCR_vinculos",
+            "vcr_soma_remuneracao": "VCR_salarios",
+        }
+    )[
+        [
+            "sigla_uf",
+            "cod_grupo",
+            "grupo_desc",
+            "vinculos_cnae_uf",
+            "estab_cnae_uf",
+            "salarios_cnae_uf",
+            "VCR_estabelecimentos",
+            "VCR_vinculos",
+            "VCR_salarios",
+        ]
+    ].reset_index(
+        drop=True
     )
 
 
-def identificar_maiores_sh6_nao_tradicionais(df, tradutor_cnae, filtro_quartil):
-    """Identifica os maiores SH6 não tradicionais"""
+def identificar_maiores_sh6_nao_tradicionais(
+    df, tradutor_cnae, filtro_quartil, janela=(2021, 2023)
+):
+    """Identifica os maiores SH6 não tradicionais (pela soma da UF na janela)"""
 
-    filtro_quartil = df["soma_uf_21_23"] < filtro_quartil
+    soma = f"soma_uf_{rotulo_janela(*janela)}"
+    filtro_quartil = df[soma] < filtro_quartil
 
     return (
         df[filtro_quartil]
         .rename(columns={"CO_SH6": "cod_sh6", "SG_UF_NCM": "sigla_uf"})
         .merge(tradutor_cnae, on="cod_sh6", how="left")
         .groupby("cod_grupo")
-        .apply(
-            lambda x: x.nlargest(5, "soma_uf_21_23", keep="all"), include_groups=False
-        )
+        .apply(lambda x: x.nlargest(5, soma, keep="all"), include_groups=False)
         .reset_index()
         .groupby("cod_grupo")
         .agg(cinco_maiores_sh6_nao_trad=("cod_sh6", lambda x: ", ".join(x.astype(str))))
@@ -394,10 +934,12 @@ def gerar_oportunidades_potenciais(
     df_rais_uf,
     maiores_sh6_nao_tradicionais,
     exp_oportunidades_tradicionais_cnae,
+    janela=(2021, 2023),
 ):
     """Gera o dataframde de oportunidades potenciais"""
 
-    filtro_quartil = df["soma_uf_21_23"] < filtro_quartil
+    soma = f"soma_uf_{rotulo_janela(*janela)}"
+    filtro_quartil = df[soma] < filtro_quartil
     cols_finais = [
         "grupo_desc",
         "sigla_uf",
@@ -417,7 +959,7 @@ def gerar_oportunidades_potenciais(
         .rename(columns={"CO_SH6": "cod_sh6", "SG_UF_NCM": "sigla_uf"})
         .merge(tradutor_cnae, on="cod_sh6", how="left")
         .groupby(["cod_grupo", "sigla_uf"], as_index=False)
-        .agg(exp_oport_nao_trad=("soma_uf_21_23", "sum"))
+        .agg(exp_oport_nao_trad=(soma, "sum"))
         .merge(df_rais_uf, on=["sigla_uf", "cod_grupo"], how="left")
         .query("VCR_estabelecimentos >= 1")
         .query("VCR_vinculos >= 0.7 or VCR_salarios >=0.7")
@@ -430,40 +972,151 @@ def gerar_oportunidades_potenciais(
     )
 
 
-def gerar_exp_regiao(df_exp_completa, tradutor_uf_regiao):
-    return (
-        df_exp_completa.merge(
-            tradutor_uf_regiao, left_on="SG_UF_NCM", right_on="uf", how="left"
+def agregar_comexstat(
+    df,
+    fluxo,
+    dimensoes,
+    motor="pandas",
+    anos=None,
+    ufs=None,
+    ano_minimo=None,
+    ano_maximo=None,
+    ufs_excluidas=None,
+):
+    """
+    Soma o VL_FOB por dimensões com filtros de ano/UF, no pandas (sobre o df
+    em memória) ou no DuckDB (SQL direto no dataset Parquet do fluxo, sem
+    precisar do df). As duas opções retornam as mesmas colunas.
+
+    Com uma lista de fluxos (ex: ["EXP", "IMP"]), df deve ser a base
+    combinada de comexstat.ler_comexstat_fluxos e FLUXO entra como primeira
+    dimensão: os dois fluxos são agregados em uma passada só.
+
+    Parâmetros:
+    df (DataFrame): Base EXP/IMP em memória (ignorada com motor="duckdb").
+    fluxo (str ou list): "EXP", "IMP" ou uma lista de fluxos.
+    dimensoes (list): Colunas de agrupamento.
+    motor (str): "pandas" ou "duckdb".
+    anos (list, opcional): Anos a considerar.
+    ufs (str ou list, opcional): UFs a considerar.
+    ano_minimo, ano_maximo (int, opcional): Intervalo de anos (inclusive).
+    ufs_excluidas (str ou list, opcional): UFs a desconsiderar.
+
+    Retorna:
+    DataFrame com as colunas dimensoes + ["VL_FOB"] (precedidas de FLUXO
+    quando fluxo é uma lista).
+    """
+    filtros = dict(
+        anos=anos,
+        ufs=ufs,
+        ano_minimo=ano_minimo,
+        ano_maximo=ano_maximo,
+        ufs_excluidas=ufs_excluidas,
+    )
+    if motor == "duckdb":
+        return comexstat.agregar_duckdb(fluxo, dimensoes, **filtros)
+    if motor != "pandas":
+        raise ValueError(f"Motor desconhecido: {motor}")
+
+    filtro = pd.Series(True, index=df.index)
+    if anos is not None:
+        filtro &= df["CO_ANO"].isin(comexstat._lista(anos))
+    if ano_minimo is not None:
+        filtro &= df["CO_ANO"] >= ano_minimo
+    if ano_maximo is not None:
+        filtro &= df["CO_ANO"] <= ano_maximo
+    if ufs is not None:
+        filtro &= df["SG_UF_NCM"].isin(comexstat._lista(ufs))
+    if ufs_excluidas is not None:
+        filtro &= ~df["SG_UF_NCM"].isin(comexstat._lista(ufs_excluidas))
+    if not isinstance(fluxo, str):
+        filtro &= df["FLUXO"].isin(fluxo)
+        dimensoes = ["FLUXO"] + dimensoes
+    return df[filtro].groupby(dimensoes, as_index=False, observed=True)["VL_FOB"].sum()
+
+
+def gerar_cubo_tabelas(
+    df_exp_uf, uf_selecionada, dimensao_ncm, motor="pandas", anos=None
+):
+    """
+    Calcula de uma vez os agregados de que as tabelas de exportação da UF
+    precisam; as funções gerar_exp_* e gerar_tabela_auxiliar* derivam suas
+    tabelas do cubo, sem voltar à base completa. Os totais ano x UF de todas
+    as UFs vêm do cubo pré-agregado (comexstat.ler_cubo); só a base da UF
+    selecionada é lida no detalhe.
+
+    Parâmetros:
+    df_exp_uf (DataFrame): Base EXP da UF com CO_ANO, SG_UF_NCM, CO_NCM,
+        CO_PAIS, CO_VIA e VL_FOB (ignorada com motor="duckdb").
+    uf_selecionada (str): UF das tabelas.
+    dimensao_ncm (DataFrame): Dimensão NCM com a coluna id_sh6.
+    motor (str): "pandas" ou "duckdb" (ver agregar_comexstat).
+    anos (list, opcional): Anos a considerar.
+
+    Retorna:
+    dict com "uf_ano" (CO_ANO x SG_UF_NCM de todas as UFs, para as tabelas de
+    UF e região) e "uf" (CO_ANO x SG_UF_NCM x id_sh6 x CO_PAIS x CO_VIA da UF
+    selecionada, o nível mais detalhado usado nas tabelas).
+    """
+    uf_ano = comexstat.ler_cubo(
+        "EXP", ["CO_ANO", "SG_UF_NCM"], anos=anos, medidas=["VL_FOB"]
+    )
+    # O SH6 (e, por ele, grupo e ISIC) é resolvido a partir do NCM na
+    # agregação da UF; NCMs sem correspondência ficam com id_sh6 nulo
+    uf = (
+        agregar_comexstat(
+            df_exp_uf,
+            "EXP",
+            ["CO_ANO", "SG_UF_NCM", "CO_NCM", "CO_PAIS", "CO_VIA"],
+            motor,
+            anos=anos,
+            ufs=uf_selecionada,
         )
+        .pipe(mapear_dimensao, dimensao_ncm, coluna="CO_NCM", colunas=["id_sh6"])
+        .groupby(
+            ["CO_ANO", "SG_UF_NCM", "id_sh6", "CO_PAIS", "CO_VIA"],
+            as_index=False,
+            dropna=False,
+        )["VL_FOB"]
+        .sum()
+    )
+    return {"uf_ano": uf_ano, "uf": uf}
+
+
+def gerar_exp_regiao(cubo, tradutor_uf_regiao):
+    return (
+        cubo["uf_ano"]
+        .merge(tradutor_uf_regiao, left_on="SG_UF_NCM", right_on="uf", how="left")
         .groupby(["CO_ANO", "regiao"], as_index=False)
         .agg(EXP_REGIAO=("VL_FOB", "sum"))
     )
 
 
-def gerar_part_exp_uf_regiao(
-    df_exp_completa, tradutor_uf_regiao, df_exp_regiao, uf_selecionada
-):
+def gerar_part_exp_uf_regiao(cubo, tradutor_uf_regiao, df_exp_regiao, uf_selecionada):
     return (
-        df_exp_completa.merge(
-            tradutor_uf_regiao, left_on="SG_UF_NCM", right_on="uf", how="left"
-        )
+        cubo["uf_ano"]
+        .merge(tradutor_uf_regiao, left_on="SG_UF_NCM", right_on="uf", how="left")
         .groupby(["CO_ANO", "regiao", "SG_UF_NCM"], as_index=False)
         .agg(EXP_UF=("VL_FOB", "sum"))
         .merge(df_exp_regiao, on=["CO_ANO", "regiao"], how="left")
         .assign(PART_EXP_REGIAO=lambda x: x["EXP_UF"] / x["EXP_REGIAO"])
-        .query(f"SG_UF_NCM == '{uf_selecionada}'")
+        .loc[lambda x: x["SG_UF_NCM"] == uf_selecionada]
         .reset_index(drop=True)[
             ["CO_ANO", "SG_UF_NCM", "regiao", "EXP_UF", "EXP_REGIAO", "PART_EXP_REGIAO"]
         ]
     )
 
 
-def gerar_exp_uf_regiao(df_exp_completa, tradutor_uf_regiao, ano_minimo, ano_maximo):
+def gerar_exp_uf_regiao(cubo, tradutor_uf_regiao, ano_minimo, ano_maximo):
     return (
-        df_exp_completa.merge(
-            tradutor_uf_regiao, left_on="SG_UF_NCM", right_on="uf", how="left"
+        agregar_comexstat(
+            cubo["uf_ano"],
+            "EXP",
+            ["CO_ANO", "SG_UF_NCM"],
+            anos=[ano_minimo, ano_maximo],
+            ufs_excluidas="ND",
         )
-        .query(f"CO_ANO in ({ano_minimo}, {ano_maximo}) & SG_UF_NCM != 'ND'")
+        .merge(tradutor_uf_regiao, left_on="SG_UF_NCM", right_on="uf", how="left")
         .groupby(["CO_ANO", "SG_UF_NCM", "nome_uf", "regiao"], as_index=False)["VL_FOB"]
         .sum()
         .pivot_table(
@@ -477,40 +1130,37 @@ def gerar_exp_uf_regiao(df_exp_completa, tradutor_uf_regiao, ano_minimo, ano_max
     )
 
 
-def gerar_exp_uf_historico(df_exp_completa, uf_selecionada):
-    return (
-        df_exp_completa.query(f"SG_UF_NCM == '{uf_selecionada}'")
-        .groupby(["CO_ANO"], as_index=False)["VL_FOB"]
-        .sum()
-    )
+def gerar_exp_uf_historico(cubo):
+    return agregar_comexstat(cubo["uf"], "EXP", ["CO_ANO"])
 
 
-def gerar_exp_via(df_exp_completa, uf_selecionada, tradutor_via):
+def gerar_exp_via(cubo, tradutor_via):
     return (
-        df_exp_completa.query(f"SG_UF_NCM == '{uf_selecionada}'")
-        .groupby(["CO_ANO", "SG_UF_NCM", "CO_VIA"], as_index=False)["VL_FOB"]
-        .sum()
+        agregar_comexstat(cubo["uf"], "EXP", ["CO_ANO", "SG_UF_NCM", "CO_VIA"])
         .assign(CO_VIA=lambda x: x["CO_VIA"].astype(str))
         .merge(tradutor_via, left_on="CO_VIA", right_on="id_via", how="left")
         .drop(columns=["CO_VIA"])
     )
 
 
-def gerar_balanca_comercial(df_exp_completa, df_imp_completa, uf_selecionada):
+def gerar_balanca_comercial(
+    df_comex_completa, uf_selecionada, motor="pandas", anos=None
+):
     return (
-        pd.concat(
-            [
-                df_exp_completa.query(f"SG_UF_NCM == '{uf_selecionada}'")
-                .groupby(["CO_ANO", "SG_UF_NCM"], as_index=False)["VL_FOB"]
-                .sum()
-                .assign(FLUXO="EXP"),
-                df_imp_completa.query(f"SG_UF_NCM == '{uf_selecionada}'")
-                .groupby(["CO_ANO", "SG_UF_NCM"], as_index=False)["VL_FOB"]
-                .sum()
-                .assign(FLUXO="IMP"),
-            ]
+        agregar_comexstat(
+            df_comex_completa,
+            ["EXP", "IMP"],
+            ["CO_ANO", "SG_UF_NCM"],
+            motor,
+            anos=anos,
+            ufs=uf_selecionada,
+        )
+        .pivot_table(
+            index=["CO_ANO", "SG_UF_NCM"],
+            columns="FLUXO",
+            values="VL_FOB",
+            observed=True,
         )
-        .pivot_table(index=["CO_ANO", "SG_UF_NCM"], columns="FLUXO", values="VL_FOB")
         .reset_index()
         .assign(SALDO=lambda x: x["EXP"] - x["IMP"])
     )
@@ -523,11 +1173,6 @@ def gerar_exp_mun_uf(
         df_exp_mun.query(f"SG_UF_MUN == '{uf_selecionada}' & CO_ANO >= {ano_minimo}")
         .groupby(["CO_ANO", "SH4", "SG_UF_MUN", "CO_MUN"], as_index=False)["VL_FOB"]
         .sum()
-        .assign(
-            SH4=lambda x: x["SH4"]
-            .astype(str)
-            .str.pad(width=4, side="left", fillchar="0")
-        )
         .merge(tradutor_sh4, left_on="SH4", right_on="id_sh4", how="left")
         .merge(tradutor_mun, left_on="CO_MUN", right_on="id_mun", how="left")
     )
@@ -598,18 +1243,22 @@ def gerar_exp_mesorregioes(
     )
 
 
-def gerar_exp_macrossetores(
-    df_exp_completa, uf_selecionada, ano_minimo, ano_maximo, tradutor_ncm, tradutor_isic
-):
+def gerar_exp_macrossetores(cubo, ano_minimo, ano_maximo, dimensao_ncm):
     return (
-        df_exp_completa.query(
-            f"CO_ANO >= {ano_minimo} & CO_ANO <= {ano_maximo} & SG_UF_NCM == '{uf_selecionada}'"
+        agregar_comexstat(
+            cubo["uf"],
+            "EXP",
+            ["CO_ANO", "SG_UF_NCM", "id_sh6"],
+            ano_minimo=ano_minimo,
+            ano_maximo=ano_maximo,
         )
-        .assign(
-            CO_NCM=lambda x: x["CO_NCM"].astype(str).str.zfill(8),
+        .pipe(
+            mapear_dimensao,
+            dimensao_ncm,
+            coluna="id_sh6",
+            colunas=["desc_isic"],
+            chave="id_sh6",
         )
-        .merge(tradutor_ncm, left_on="CO_NCM", right_on="id_ncm", how="left")
-        .merge(tradutor_isic, on="id_sh6", how="left")
         .groupby(["CO_ANO", "SG_UF_NCM", "desc_isic"], as_index=False)["VL_FOB"]
         .sum()
         .pivot_table(index="desc_isic", columns="CO_ANO", values="VL_FOB")
@@ -617,23 +1266,22 @@ def gerar_exp_macrossetores(
     )
 
 
-def gerar_exp_grupo(
-    df_exp_completa,
-    uf_selecionada,
-    ano_minimo,
-    ano_maximo,
-    tradutor_ncm,
-    tradutor_grupo,
-):
+def gerar_exp_grupo(cubo, ano_minimo, ano_maximo, dimensao_ncm):
     return (
-        df_exp_completa.query(
-            f"CO_ANO >= {ano_minimo} & CO_ANO <= {ano_maximo} & SG_UF_NCM == '{uf_selecionada}'"
+        agregar_comexstat(
+            cubo["uf"],
+            "EXP",
+            ["CO_ANO", "SG_UF_NCM", "id_sh6"],
+            ano_minimo=ano_minimo,
+            ano_maximo=ano_maximo,
         )
-        .assign(
-            CO_NCM=lambda x: x["CO_NCM"].astype(str).str.zfill(8),
+        .pipe(
+            mapear_dimensao,
+            dimensao_ncm,
+            coluna="id_sh6",
+            colunas=["desc_grupo"],
+            chave="id_sh6",
         )
-        .merge(tradutor_ncm, left_on="CO_NCM", right_on="id_ncm", how="left")
-        .merge(tradutor_grupo, on="id_sh6", how="left")
         .groupby(["CO_ANO", "SG_UF_NCM", "desc_grupo"], as_index=False)["VL_FOB"]
         .sum()
         .pivot_table(index="desc_grupo", columns="CO_ANO", values="VL_FOB")
@@ -643,12 +1291,14 @@ def gerar_exp_grupo(
     )
 
 
-def gerar_exp_destinos(
-    df_exp_completa, ano_minimo, ano_maximo, uf_selecionada, tradutor_pais
-):
+def gerar_exp_destinos(cubo, ano_minimo, ano_maximo, tradutor_pais):
     return (
-        df_exp_completa.query(
-            f"CO_ANO >= {ano_minimo} & CO_ANO <= {ano_maximo} & SG_UF_NCM == '{uf_selecionada}'"
+        agregar_comexstat(
+            cubo["uf"],
+            "EXP",
+            ["CO_ANO", "SG_UF_NCM", "CO_PAIS"],
+            ano_minimo=ano_minimo,
+            ano_maximo=ano_maximo,
         )
         .merge(tradutor_pais, left_on="CO_PAIS", right_on="id_pais", how="left")
         .groupby(["CO_ANO", "SG_UF_NCM", "pais"], as_index=False)["VL_FOB"]
@@ -661,36 +1311,26 @@ def gerar_exp_destinos(
 
 
 def gerar_tabela_auxiliar(
-    df_exp_completa,
-    ano_minimo,
-    ano_maximo,
-    uf_selecionada,
-    tradutor_ncm,
-    tradutor_isic,
-    tradutor_pais,
-    tradutor_via,
-    tradutor_grupo,
-    tradutor_sh6,
+    cubo, ano_minimo, ano_maximo, dimensao_ncm, tradutor_pais, tradutor_via
 ):
     return (
-        df_exp_completa.query(
-            f"CO_ANO >= {ano_minimo} & CO_ANO <= {ano_maximo} & SG_UF_NCM == '{uf_selecionada}'"
-        )
-        .assign(
-            CO_NCM=lambda x: x["CO_NCM"].astype(str).str.zfill(8),
-            CO_VIA=lambda x: x["CO_VIA"].astype(str),
+        agregar_comexstat(
+            cubo["uf"].assign(CO_VIA=lambda x: x["CO_VIA"].astype(str)),
+            "EXP",
+            ["CO_ANO", "SG_UF_NCM", "id_sh6", "CO_PAIS", "CO_VIA"],
+            ano_minimo=ano_minimo,
+            ano_maximo=ano_maximo,
         )
-        .merge(tradutor_ncm, left_on="CO_NCM", right_on="id_ncm", how="left")
-        .merge(tradutor_isic, on="id_sh6", how="left")
-        .groupby(
-            ["CO_ANO", "SG_UF_NCM", "id_sh6", "CO_PAIS", "CO_VIA", "desc_isic"],
-            as_index=False,
+        .pipe(
+            mapear_dimensao,
+            dimensao_ncm,
+            coluna="id_sh6",
+            colunas=["desc_isic", "desc_grupo", "desc_sh6"],
+            chave="id_sh6",
         )
-        .agg({"VL_FOB": "sum"})
+        .dropna(subset=["desc_isic"])
         .merge(tradutor_pais, left_on="CO_PAIS", right_on="id_pais", how="left")
-        .merge(tradutor_via, left_on="CO_VIA", right_on="id_via", how="left")
-        .merge(tradutor_grupo, on="id_sh6", how="left")
-        .merge(tradutor_sh6, on="id_sh6", how="left")[
+        .merge(tradutor_via, left_on="CO_VIA", right_on="id_via", how="left")[
             [
                 "CO_ANO",
                 "SG_UF_NCM",
@@ -706,26 +1346,22 @@ def gerar_tabela_auxiliar(
     )
 
 
-def gerar_tabela_auxiliar_sh6_pais(
-    df_exp_completa,
-    anos,
-    uf_selecionada,
-    tradutor_ncm,
-    tradutor_pais,
-    tradutor_grupo,
-    tradutor_sh6,
-):
+def gerar_tabela_auxiliar_sh6_pais(cubo, anos, dimensao_ncm, tradutor_pais):
     return (
-        df_exp_completa.query(f"CO_ANO in {anos} & SG_UF_NCM == '{uf_selecionada}'")
-        .assign(
-            CO_NCM=lambda x: x["CO_NCM"].astype(str).str.zfill(8),
+        agregar_comexstat(
+            cubo["uf"],
+            "EXP",
+            ["CO_ANO", "SG_UF_NCM", "id_sh6", "CO_PAIS", "CO_VIA"],
+            anos=anos,
         )
-        .merge(tradutor_ncm, left_on="CO_NCM", right_on="id_ncm", how="left")
-        .groupby(["CO_ANO", "SG_UF_NCM", "id_sh6", "CO_PAIS", "CO_VIA"], as_index=False)
-        .agg({"VL_FOB": "sum"})
         .merge(tradutor_pais, left_on="CO_PAIS", right_on="id_pais", how="left")
-        .merge(tradutor_grupo, on="id_sh6", how="left")
-        .merge(tradutor_sh6, on="id_sh6", how="left")[
+        .pipe(
+            mapear_dimensao,
+            dimensao_ncm,
+            coluna="id_sh6",
+            colunas=["desc_grupo", "desc_sh6"],
+            chave="id_sh6",
+        )[
             [
                 "CO_ANO",
                 "SG_UF_NCM",
@@ -757,11 +1393,6 @@ def gerar_tabela_auxiliar_uf(
             "VL_FOB"
         ]
         .sum()
-        .assign(
-            SH4=lambda x: x["SH4"]
-            .astype(str)
-            .str.pad(width=4, side="left", fillchar="0")
-        )
         .merge(tradutor_sh4, left_on="SH4", right_on="id_sh4", how="left")
         .merge(tradutor_mun, left_on="CO_MUN", right_on="id_mun", how="left")
         .merge(tradutor_pais, left_on="CO_PAIS", right_on="id_pais", how="left")
@@ -880,6 +1511,47 @@ def ajuste_orbis(df):
     )
 
 
+# Versão da normalização do Orbis: incrementar quando ajuste_orbis ou
+# ajuste_orbis_uf mudarem (ex: filtros de ano ou de status), invalidando o cache
+VERSAO_ORBIS = 1
+
+
+def carregar_orbis(arquivos, ajuste, caminho_cache="../data/cache/", nome="orbis"):
+    """
+    Carrega as exportações do Orbis já normalizadas (datas convertidas, setor
+    extraído e investimento numérico, ver ajuste_orbis e ajuste_orbis_uf) de
+    um cache Parquet. As planilhas só são lidas e normalizadas novamente
+    quando alguma delas muda ou quando VERSAO_ORBIS muda (a versão é o hash
+    dos arquivos e de VERSAO_ORBIS). As versões anteriores do mesmo cache são
+    removidas ao gravar uma nova.
+
+    Parâmetros:
+    arquivos (list): Planilhas do Orbis (aba "Results").
+    ajuste (callable): Normalização aplicada a cada planilha (ajuste_orbis ou
+        ajuste_orbis_uf).
+    caminho_cache (str): Diretório do cache.
+    nome (str): Prefixo do arquivo de cache.
+
+    Retorna:
+    DataFrame com as planilhas normalizadas, concatenadas na ordem de arquivos.
+    """
+    versao = hashlib.sha256(
+        f"{VERSAO_ORBIS}|{hash_arquivos(arquivos)}".encode()
+    ).hexdigest()[:16]
+    prefixo = f"{nome}_{ajuste.__name__}"
+    arquivo_cache = os.path.join(caminho_cache, f"{prefixo}_{versao}.parquet")
+    if os.path.exists(arquivo_cache):
+        return pd.read_parquet(arquivo_cache)
+
+    df = pd.concat(
+        [ajuste(pd.read_excel(arquivo, sheet_name="Results")) for arquivo in arquivos],
+        ignore_index=True,
+    )
+    _gravar_parquet(df, arquivo_cache)
+    _remover_versoes_antigas(arquivo_cache, prefixo)
+    return df
+
+
 def ajuste_investimento_br(
     df_orbis, anos_iniciais, anos_iniciais_coluna, anos_finais, anos_finais_coluna
 ):
@@ -1077,47 +1749,76 @@ def ajuste_orbis_uf(df):
     )
 
 
-def ajuste_rais_investimentos(df, categoria, tradutor):
+def ajuste_rais_investimentos(df, tradutor, categorias=("divisao", "grupo")):
+    """
+    Soma a RAIS por UF em cada nível da CNAE (ex: divisão e grupo), com o
+    tradutor aplicado uma única vez; os níveis ficam empilhados, identificados
+    pela coluna categoria.
+    """
+    base = df.merge(tradutor, left_on="cod_grupo", right_on="grupo", how="left")
+    return pd.concat(
+        [
+            base.groupby(
+                [categoria, f"descricao_{categoria}", "sigla_uf"], as_index=False
+            )
+            .agg(
+                soma_remuneracao_uf=("soma_remuneracao", "sum"),
+                qtd_vinculos_uf=("qtd_vinculos", "sum"),
+                qtd_estabelecimentos_uf=("qtd_estabelecimentos", "sum"),
+            )
+            .rename(
+                columns={
+                    categoria: "cnae",
+                    f"descricao_{categoria}": "cnae_descricao",
+                }
+            )
+            .assign(categoria=categoria)
+            for categoria in categorias
+        ],
+        ignore_index=True,
+    )
+
+
+def ajuste_rais_setores(df_rais, tradutor_orbis_cnae, tradutor_orbis):
+    """
+    Calcula as participações e os VCRs da massa salarial, dos vínculos e dos
+    estabelecimentos de cada setor do Orbis em todas as UFs e níveis da CNAE
+    de uma vez (quociente_locacional). Os totais da UF e do Brasil incluem
+    todas as CNAEs do nível, mesmo as sem setor do Orbis. O total do setor no
+    Brasil é, para cada UF, a soma dos totais nacionais das CNAEs do setor
+    presentes na UF.
+    """
+    medidas = ["soma_remuneracao_uf", "qtd_vinculos_uf", "qtd_estabelecimentos_uf"]
+    totais_setor = [f"{m}_brasil" for m in medidas]
+    nacional_cnae = df_rais.groupby(["categoria", "cnae"])[medidas].transform("sum")
     return (
-        df.merge(tradutor, left_on="cod_grupo", right_on="grupo", how="left")
-        .groupby([f"{categoria}", f"descricao_{categoria}", "sigla_uf"], as_index=False)
-        .agg(
-            soma_remuneracao_uf=("soma_remuneracao", "sum"),
-            qtd_vinculos_uf=("qtd_vinculos", "sum"),
-            qtd_estabelecimentos_uf=("qtd_estabelecimentos", "sum"),
-        )
-        .assign(
-            soma_remuneracao_total_uf=lambda x: x.groupby("sigla_uf")[
-                "soma_remuneracao_uf"
-            ].transform("sum"),
-            soma_vinculos_total_uf=lambda x: x.groupby("sigla_uf")[
-                "qtd_vinculos_uf"
-            ].transform("sum"),
-            soma_estabelecimentos_total_uf=lambda x: x.groupby("sigla_uf")[
-                "qtd_estabelecimentos_uf"
-            ].transform("sum"),
-            soma_remuneracao_brasil=lambda x: x.groupby(f"{categoria}")[
-                "soma_remuneracao_uf"
-            ].transform("sum"),
-            soma_vinculos_brasil=lambda x: x.groupby(f"{categoria}")[
-                "qtd_vinculos_uf"
-            ].transform("sum"),
-            soma_estabelecimentos_brasil=lambda x: x.groupby(f"{categoria}")[
-                "qtd_estabelecimentos_uf"
-            ].transform("sum"),
-            soma_remuneracao_total_brasil=lambda x: x["soma_remuneracao_uf"].sum(),
-            soma_vinculos_total_brasil=lambda x: x["qtd_vinculos_uf"].sum(),
-            soma_estabelecimentos_total_brasil=lambda x: x[
-                "qtd_estabelecimentos_uf"
-            ].sum(),
-            # vcr_remuneracao = lambda x: ((x['soma_remuneracao_uf'] / x['soma_remuneracao_total_uf'])/(x['soma_remuneracao_brasil'] / x['soma_remuneracao_total_brasil'])),
-            # vcr_vinculos = lambda x: ((x['qtd_vinculos_uf'] / x['soma_vinculos_total_uf'])/(x['soma_vinculos_brasil'] / x['soma_vinculos_total_brasil'])),
-            # vcr_estabelecimentos = lambda x: ((x['qtd_estabelecimentos_uf'] / x['soma_estabelecimentos_total_uf'])/(x['soma_estabelecimentos_brasil'] / x['soma_estabelecimentos_total_brasil'])),
-            categoria=f"{categoria}",
+        quociente_locacional(
+            df_rais.assign(
+                **{t: nacional_cnae[m] for m, t in zip(medidas, totais_setor)}
+            ).merge(tradutor_orbis_cnae, on=["cnae", "categoria"], how="left"),
+            regiao="sigla_uf",
+            setor="setor_orbis",
+            medidas=medidas,
+            grupos=["categoria"],
+            df_totais=df_rais,
+            totais_setor=totais_setor,
         )
+        .merge(tradutor_orbis, on="setor_orbis", how="left")
         .rename(
-            columns={f"{categoria}": "cnae", f"descricao_{categoria}": "cnae_descricao"}
+            columns={
+                "setor_orbis_trad": "setor",
+                "qtd_vinculos_uf": "vinculos",
+                "qtd_estabelecimentos_uf": "estabelecimentos",
+                "soma_remuneracao_uf": "massa_salarial",
+                "participacao_qtd_vinculos_uf": "participacao_vinculos",
+                "participacao_qtd_estabelecimentos_uf": "participacao_estabelecimentos",
+                "participacao_soma_remuneracao_uf": "participacao_massa_salarial",
+                "vcr_qtd_vinculos_uf": "vcr_vinculos",
+                "vcr_qtd_estabelecimentos_uf": "vcr_estabelecimentos",
+                "vcr_soma_remuneracao_uf": "vcr_massa_salarial",
+            }
         )
+        .sort_values(["setor_orbis", "categoria", "sigla_uf"])
         .reset_index(drop=True)
     )
 
@@ -1128,84 +1829,33 @@ def ajuste_rais_uf(
     tradutor_orbis,
     filtro_setores_selecionados,
     uf_selecionada,
+    df_rais_setores=None,
 ):
-    return (
-        df_rais.merge(tradutor_orbis_cnae, on=["cnae", "categoria"], how="left")
-        .dropna(subset=["setor_orbis"])
-        .drop(columns=["cnae", "desc_cnae", "cnae_descricao"])
-        .groupby(["setor_orbis", "categoria", "sigla_uf"], as_index=False)
-        .agg(
-            {
-                "soma_remuneracao_uf": "sum",
-                "qtd_vinculos_uf": "sum",
-                "qtd_estabelecimentos_uf": "sum",
-                "soma_remuneracao_total_uf": "first",
-                "soma_vinculos_total_uf": "first",
-                "soma_estabelecimentos_total_uf": "first",
-                "soma_remuneracao_brasil": "sum",
-                "soma_vinculos_brasil": "sum",
-                "soma_estabelecimentos_brasil": "sum",
-                "soma_remuneracao_total_brasil": "first",
-                "soma_vinculos_total_brasil": "first",
-                "soma_estabelecimentos_total_brasil": "first",
-            }
-        )
-        .assign(
-            participacao_remuneracao=lambda x: (
-                x["soma_remuneracao_uf"] / x["soma_remuneracao_total_uf"]
-            ),
-            participacao_vinculos=lambda x: (
-                x["qtd_vinculos_uf"] / x["soma_vinculos_total_uf"]
-            ),
-            participacao_estabelecimentos=lambda x: (
-                x["qtd_estabelecimentos_uf"] / x["soma_estabelecimentos_total_uf"]
-            ),
-            vcr_remuneracao=lambda x: (
-                (x["soma_remuneracao_uf"] / x["soma_remuneracao_total_uf"])
-                / (x["soma_remuneracao_brasil"] / x["soma_remuneracao_total_brasil"])
-            ),
-            vcr_vinculos=lambda x: (
-                (x["qtd_vinculos_uf"] / x["soma_vinculos_total_uf"])
-                / (x["soma_vinculos_brasil"] / x["soma_vinculos_total_brasil"])
-            ),
-            vcr_estabelecimentos=lambda x: (
-                (x["qtd_estabelecimentos_uf"] / x["soma_estabelecimentos_total_uf"])
-                / (
-                    x["soma_estabelecimentos_brasil"]
-                    / x["soma_estabelecimentos_total_brasil"]
-                )
-            ),
-        )
-        .merge(tradutor_orbis, on="setor_orbis", how="left")
-        .query(
-            "vcr_remuneracao > 0.7 & vcr_vinculos > 0.7 & vcr_estabelecimentos > 0.7 & setor_orbis_trad in @filtro_setores_selecionados & sigla_uf == @uf_selecionada"
+    """
+    Seleciona os setores da UF com VCR acima de 0,7 nas três medidas. Com
+    df_rais_setores (ajuste_rais_setores já calculado), é apenas um recorte.
+    """
+    if df_rais_setores is None:
+        df_rais_setores = ajuste_rais_setores(
+            df_rais, tradutor_orbis_cnae, tradutor_orbis
         )
-        .reset_index(drop=True)
-        .rename(
-            columns={
-                "setor_orbis_trad": "setor",
-                "qtd_vinculos_uf": "vinculos",
-                "qtd_estabelecimentos_uf": "estabelecimentos",
-                "soma_remuneracao_uf": "massa_salarial",
-                "participacao_remuneracao": "participacao_massa_salarial",
-                "vcr_remuneracao": "vcr_massa_salarial",
-            }
-        )[
-            [
-                "setor",
-                "sigla_uf",
-                "vinculos",
-                "estabelecimentos",
-                "massa_salarial",
-                "participacao_vinculos",
-                "participacao_estabelecimentos",
-                "participacao_massa_salarial",
-                "vcr_vinculos",
-                "vcr_estabelecimentos",
-                "vcr_massa_salarial",
-            ]
+    return df_rais_setores.query(
+        "vcr_massa_salarial > 0.7 & vcr_vinculos > 0.7 & vcr_estabelecimentos > 0.7 & setor in @filtro_setores_selecionados & sigla_uf == @uf_selecionada"
+    ).reset_index(drop=True)[
+        [
+            "setor",
+            "sigla_uf",
+            "vinculos",
+            "estabelecimentos",
+            "massa_salarial",
+            "participacao_vinculos",
+            "participacao_estabelecimentos",
+            "participacao_massa_salarial",
+            "vcr_vinculos",
+            "vcr_estabelecimentos",
+            "vcr_massa_salarial",
         ]
-    )
+    ]
 
 
 def paises_setor(df, igualdade, destino, tradutor_pais):
@@ -1243,8 +1893,7 @@ def ajuste_orbis_regiao(
         query_string += f" & regiao == '{regiao_selecionada}'"
 
     return (
-        df_orbis_uf.pipe(ajuste_orbis_uf)
-        .merge(tradutor_uf, on="uf", how="left")
+        df_orbis_uf.merge(tradutor_uf, on="uf", how="left")
         .merge(tradutor_regiao, on="sigla_uf", how="left")
         .query(query_string)
         .groupby(["sigla_uf", "uf_ajustada"], as_index=False)["total_investimento"]
@@ -1262,8 +1911,7 @@ def ajuste_orbis_uf_setor(
     uf_selecionada: str,
 ):
     return (
-        df_orbis_uf.pipe(ajuste_orbis_uf)
-        .merge(tradutor_uf, on="uf", how="left")
+        df_orbis_uf.merge(tradutor_uf, on="uf", how="left")
         .query(f"sigla_uf == '{uf_selecionada}' & ano in @anos_orbis")
         .groupby(["sigla_uf", "setor"], as_index=False)["total_investimento"]
         .sum()
@@ -1284,8 +1932,7 @@ def ajuste_orbis_uf_pais(
     uf_selecionada: str,
 ):
     return (
-        df_orbis_uf.pipe(ajuste_orbis_uf)
-        .merge(tradutor_uf, on="uf", how="left")
+        df_orbis_uf.merge(tradutor_uf, on="uf", how="left")
         .query(f"sigla_uf == '{uf_selecionada}' & ano in @anos_orbis")
         .merge(tradutor_pais, left_on="pais_origem", right_on="pais_eng", how="left")
         .groupby(["sigla_uf", "pais"], as_index=False)["total_investimento"]
@@ -1303,8 +1950,7 @@ def ajuste_orbis_uf_empresa(
     anos_orbis: list,
 ):
     return (
-        df_orbis_uf.pipe(ajuste_orbis_uf)
-        .merge(tradutor_uf, on="uf", how="left")
+        df_orbis_uf.merge(tradutor_uf, on="uf", how="left")
         .query(f"sigla_uf == '{uf_selecionada}' & ano in @anos_orbis")
         .groupby(["sigla_uf", "empresa"], as_index=False)["total_investimento"]
         .sum()
@@ -1376,8 +2022,7 @@ def ajuste_empresas_investem_uf(
     df_orbis_uf, tradutor_orbis, anos_iniciais, uf_selecionada
 ):
     return (
-        df_orbis_uf.pipe(ajuste_orbis_uf)
-        .merge(tradutor_uf, on="uf", how="left")
+        df_orbis_uf.merge(tradutor_uf, on="uf", how="left")
         .query(f"sigla_uf == '{uf_selecionada}' & ano in @anos_iniciais")
         .merge(tradutor_orbis, left_on="setor", right_on="setor_orbis", how="left")
         .groupby(["setor_orbis_trad", "empresa"], as_index=False)["total_investimento"]
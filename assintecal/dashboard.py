@@ -4,6 +4,10 @@ import sidrapy as sidra
 from sqlalchemy import create_engine
 from bcb import Expectativas
 import time
+import sys
+
+sys.path.append("../cei")
+import comexstat  # noqa: E402
 
 print("Iniciando o processamento...")
 start_time = time.time()
@@ -53,7 +57,7 @@ def funcao_tradutores(
     return df
 
 
-def leitor_csv(arquivo):
+def leitor_comexstat(anos):
     columns = [
         "CO_ANO",
         "CO_MES",
@@ -64,20 +68,15 @@ def leitor_csv(arquivo):
         "VL_FOB",
     ]
 
-    df = pd.read_csv(
-        f"../data/{arquivo}.csv",
-        sep=";",
-        encoding="ISO-8859-1",
-        engine="pyarrow",
-        usecols=columns,
-    )
+    # Exportação e importação em uma base só, identificadas pela coluna FLUXO
+    df = comexstat.ler_comexstat_fluxos(anos=anos, colunas=columns)
     return df
 
 
 def ajuste_sh6(df, ano):
     df = (
         df.query("CO_ANO in @anos")
-        .groupby(by=["CO_ANO", "CO_MES", "CO_NCM"])
+        .groupby(by=["FLUXO", "CO_ANO", "CO_MES", "CO_NCM"], observed=True)
         .agg({"QT_ESTAT": "sum", "VL_FOB": "sum"})
         .reset_index()
         .assign(
@@ -90,14 +89,13 @@ def ajuste_sh6(df, ano):
     return df
 
 
-def ajuste_comex_tipo(df, tipo, fluxo):
+def ajuste_comex_tipo(df, tipo):
     df = (
         df.dropna(subset=[f"tipo_{tipo}"])
-        .groupby(by=[f"tipo_{tipo}", "CO_ANO", "CO_MES"])
+        .groupby(by=["FLUXO", f"tipo_{tipo}", "CO_ANO", "CO_MES"], observed=True)
         .agg({"QT_ESTAT": "sum", "VL_FOB": "sum"})
         .reset_index()
         .assign(
-            FLUXO=fluxo,
             SEGMENTO=str(tipo).upper(),
         )
         # .drop(columns=[f"tipo_{tipo}"])
@@ -105,7 +103,7 @@ def ajuste_comex_tipo(df, tipo, fluxo):
     return df
 
 
-def ajuste_comex_setor(df, fluxo, tipo, tradutor):
+def ajuste_comex_setor(df, tipo, tradutor):
     df = (
         df.query("CO_ANO in @anos")
         .assign(
@@ -113,15 +111,12 @@ def ajuste_comex_setor(df, fluxo, tipo, tradutor):
             CO_PAIS=lambda x: x["CO_PAIS"].astype(str),
         )
         .merge(tradutor_sh6, how="left", on="CO_NCM")
-        .groupby(by=["CO_ANO", "CO_MES", "CO_SH6", "CO_PAIS"])
+        .groupby(by=["FLUXO", "CO_ANO", "CO_MES", "CO_SH6", "CO_PAIS"], observed=True)
         .agg({"VL_FOB": "sum"})
         .reset_index()
         .merge(tradutor, how="left", left_on="CO_SH6", right_on="id_sh6")
         .merge(tradutor_pais, how="left", left_on="CO_PAIS", right_on="id_pais")
         .merge(tradutor_sh6_desc, how="left", on="CO_SH6")
-        .assign(
-            FLUXO=fluxo,
-        )
         .dropna(subset=[f"{tipo}"])
         .drop(columns=["id_sh6", "CO_PAIS"])
     )
@@ -285,26 +280,16 @@ tradutor_componente = funcao_tradutores(
 tradutor_pais = funcao_tradutores(arquivo="tradutor_pais", col_to_str=["id_pais"])
 
 # BASES COMPLETAS
-df_exp_completa = leitor_csv("EXP_COMPLETA")
-df_imp_completa = leitor_csv("IMP_COMPLETA")
+anos = range(2019, 2026)
+df_comex_completa = leitor_comexstat(anos)
 
 # BASES AJUSTADAS
-anos = range(2019, 2026)
-df_exp_ajustada = ajuste_sh6(df_exp_completa, anos)
-df_imp_ajustada = ajuste_sh6(df_imp_completa, anos)
+# Os dois fluxos são agregados e traduzidos juntos, agrupando por FLUXO
+df_comex_ajustada = ajuste_sh6(df_comex_completa, anos)
 
 tipo = ["calcado", "couro"]
-fluxo = ["EXP", "IMP"]
 
-lista_df = [
-    ajuste_comex_tipo(
-        df=df_exp_ajustada if f == "EXP" else df_imp_ajustada,
-        tipo=t,
-        fluxo=f,
-    )
-    for t in tipo
-    for f in fluxo
-]
+lista_df = [ajuste_comex_tipo(df=df_comex_ajustada, tipo=t) for t in tipo]
 
 df_comex = pd.concat(lista_df, ignore_index=True).assign(
     mes_ano=lambda x: pd.to_datetime(
@@ -312,29 +297,12 @@ df_comex = pd.concat(lista_df, ignore_index=True).assign(
         format="%m/%Y",
     ).dt.strftime("%Y-%m"),
 )
-fluxo = ["EXP", "IMP"]
-
-df_comex_vertical = pd.concat(
-    [
-        ajuste_comex_setor(
-            df=df_exp_completa if f == "EXP" else df_imp_completa,
-            fluxo=f,
-            tipo="vertical",
-            tradutor=tradutor_vertical,
-        )
-        for f in fluxo
-    ]
+
+df_comex_vertical = ajuste_comex_setor(
+    df=df_comex_completa, tipo="vertical", tradutor=tradutor_vertical
 )
-df_comex_componente = pd.concat(
-    [
-        ajuste_comex_setor(
-            df=df_exp_completa if f == "EXP" else df_imp_completa,
-            fluxo=f,
-            tipo="componente",
-            tradutor=tradutor_componente,
-        )
-        for f in fluxo
-    ]
+df_comex_componente = ajuste_comex_setor(
+    df=df_comex_completa, tipo="componente", tradutor=tradutor_componente
 )
 
 # BASES SIDRA
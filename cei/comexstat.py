@@ -0,0 +1,994 @@
+import hashlib
+import json
+import numbers
+import os
+import shutil
+from typing import Iterable, List, Optional, Union
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.dataset as ds
+
+# Diretório "data" na raiz do repositório, onde ficam EXP_COMPLETA/IMP_COMPLETA
+CAMINHO_DADOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data")
+CAMINHO_PARQUET = os.path.join(CAMINHO_DADOS, "comexstat_parquet")
+ARQUIVO_MANIFESTO = "manifesto.json"
+
+# Codificação única de todos os CSVs do ComexStat (origem MDIC e consolidados)
+ENCODING = "utf-8"
+
+# Esquema das bases EXP_/IMP_ (tipos ao ler pelo Parquet ou pelo CSV):
+#   CO_ANO      int16            ano
+#   CO_MES      int8             mês
+#   CO_NCM      int32            NCM (texto com 8 dígitos via codigos_texto)
+#   CO_UNID     int16            unidade estatística
+#   CO_PAIS     int16            país (texto com 3 dígitos via codigos_texto)
+#   SG_UF_NCM   string[pyarrow]  sigla da UF de origem/destino do produto
+#   CO_VIA      int8             via de transporte (texto via codigos_texto)
+#   CO_URF      int32            URF (texto com 7 dígitos via codigos_texto)
+#   QT_ESTAT    int64            quantidade estatística
+#   KG_LIQUIDO  int64            peso líquido
+#   VL_FOB      int64            valor FOB em US$
+#   VL_FRETE    int64            frete em US$ (apenas IMP)
+#   VL_SEGURO   int64            seguro em US$ (apenas IMP)
+SCHEMA_EXP = pa.schema(
+    [
+        ("CO_ANO", pa.int16()),
+        ("CO_MES", pa.int8()),
+        ("CO_NCM", pa.int32()),
+        ("CO_UNID", pa.int16()),
+        ("CO_PAIS", pa.int16()),
+        ("SG_UF_NCM", pa.string()),
+        ("CO_VIA", pa.int8()),
+        ("CO_URF", pa.int32()),
+        ("QT_ESTAT", pa.int64()),
+        ("KG_LIQUIDO", pa.int64()),
+        ("VL_FOB", pa.int64()),
+    ]
+)
+
+SCHEMA_IMP = SCHEMA_EXP.append(pa.field("VL_FRETE", pa.int64())).append(
+    pa.field("VL_SEGURO", pa.int64())
+)
+
+# Esquema da base municipal EXP_COMPLETA_MUN (CSV em latin1):
+#   CO_ANO      int16            ano
+#   CO_MES      int8             mês
+#   SH4         string[pyarrow]  SH4 com 4 dígitos (zeros à esquerda)
+#   CO_PAIS     int16            país
+#   SG_UF_MUN   string[pyarrow]  sigla da UF do município
+#   CO_MUN      int32            código do município
+#   KG_LIQUIDO  int64            peso líquido
+#   VL_FOB      int64            valor FOB em US$
+SCHEMA_MUN = pa.schema(
+    [
+        ("CO_ANO", pa.int16()),
+        ("CO_MES", pa.int8()),
+        ("SH4", pa.string()),
+        ("CO_PAIS", pa.int16()),
+        ("SG_UF_MUN", pa.string()),
+        ("CO_MUN", pa.int32()),
+        ("KG_LIQUIDO", pa.int64()),
+        ("VL_FOB", pa.int64()),
+    ]
+)
+
+SCHEMAS = {"EXP": SCHEMA_EXP, "IMP": SCHEMA_IMP, "MUN": SCHEMA_MUN}
+ENCODINGS = {"EXP": ENCODING, "IMP": ENCODING, "MUN": "latin1"}
+COLUNA_UF = {"EXP": "SG_UF_NCM", "IMP": "SG_UF_NCM", "MUN": "SG_UF_MUN"}
+
+# Arquivos consolidados em CAMINHO_DADOS (lidos enquanto não há Parquet)
+ARQUIVOS_COMPLETOS = {
+    "EXP": "EXP_COMPLETA.csv",
+    "IMP": "IMP_COMPLETA.csv",
+    "MUN": "EXP_COMPLETA_MUN.csv",
+}
+
+
+# Tamanho dos blocos na leitura em streaming dos CSVs (bytes)
+TAMANHO_BLOCO_CSV = 64 << 20
+
+# Largura dos códigos quando retornados como texto (zeros à esquerda)
+LARGURA_CODIGOS = {
+    "CO_NCM": 8,
+    "CO_SH6": 6,
+    "SH4": 4,
+    "CO_PAIS": 3,
+    "CO_URF": 7,
+    "CO_VIA": 0,
+}
+
+
+def _lista(valores) -> Optional[List]:
+    """Aceita um valor único ou um iterável e devolve sempre uma lista."""
+    if valores is None:
+        return None
+    # numbers.Integral cobre também os inteiros do numpy (ex: np.arange)
+    if isinstance(valores, (str, numbers.Integral)):
+        return [valores]
+    return list(valores)
+
+
+def _para_pandas(
+    tabela: pa.Table, codigos_texto: Optional[List[str]] = None
+) -> pd.DataFrame:
+    """
+    Converte uma tabela Arrow para pandas no esquema padrão do módulo.
+
+    As colunas em `codigos_texto` viram categorias com os códigos já em texto
+    com zeros à esquerda; a formatação é feita uma vez por código distinto
+    (no dicionário), e não linha a linha. As demais colunas de texto usam
+    string[pyarrow], evitando um objeto Python por linha.
+    """
+    for coluna in codigos_texto or []:
+        codificada = pc.dictionary_encode(tabela[coluna].combine_chunks())
+        texto = pc.utf8_lpad(
+            pc.cast(codificada.dictionary, pa.string()),
+            LARGURA_CODIGOS.get(coluna, 0),
+            "0",
+        )
+        tabela = tabela.set_column(
+            tabela.schema.get_field_index(coluna),
+            coluna,
+            pa.DictionaryArray.from_arrays(codificada.indices, texto),
+        )
+    return tabela.to_pandas(types_mapper={pa.string(): pd.StringDtype("pyarrow")}.get)
+
+
+def _ler_tabela_csv(
+    caminho_arquivo: str, schema: pa.Schema, colunas: Optional[List[str]] = None
+) -> pa.Table:
+    """Lê um CSV do ComexStat como tabela Arrow, já com os tipos do esquema."""
+    return pacsv.read_csv(
+        caminho_arquivo,
+        read_options=pacsv.ReadOptions(encoding=ENCODING),
+        parse_options=pacsv.ParseOptions(delimiter=";"),
+        convert_options=pacsv.ConvertOptions(
+            column_types=schema, include_columns=colunas
+        ),
+    )
+
+
+def ler_csv_comexstat(
+    caminho_arquivo: str,
+    fluxo: str = "EXP",
+    colunas: Optional[List[str]] = None,
+    codigos_texto: Optional[List[str]] = None,
+    anos: Optional[Union[int, Iterable[int]]] = None,
+    ufs: Optional[Union[str, Iterable[str]]] = None,
+    ano_minimo: Optional[int] = None,
+    ano_maximo: Optional[int] = None,
+    tamanho_bloco: int = TAMANHO_BLOCO_CSV,
+) -> pd.DataFrame:
+    """
+    Lê um CSV do ComexStat (anual ou consolidado) com a codificação e os
+    tipos padrão do módulo.
+
+    O arquivo é lido em blocos: cada bloco é convertido, filtrado pela janela
+    de anos/UFs e reduzido às colunas pedidas antes do bloco seguinte, de modo
+    que só as linhas da janela ficam em memória (e não o histórico inteiro).
+
+    Args:
+        caminho_arquivo (str): Caminho do arquivo CSV (separador ";").
+        fluxo (str): "EXP", "IMP" ou "MUN", define o esquema.
+        colunas (list[str], opcional): Colunas a serem lidas. Padrão: todas.
+        codigos_texto (list[str], opcional): Colunas de código a serem
+            retornadas como texto com zeros à esquerda (ver LARGURA_CODIGOS).
+        anos (int | Iterable[int], opcional): Anos a serem mantidos.
+        ufs (str | Iterable[str], opcional): Siglas de UF (SG_UF_NCM ou
+            SG_UF_MUN, conforme o fluxo).
+        ano_minimo (int, opcional): Primeiro ano (inclusive).
+        ano_maximo (int, opcional): Último ano (inclusive).
+        tamanho_bloco (int): Tamanho em bytes de cada bloco lido.
+
+    Returns:
+        pd.DataFrame: Base tipada e filtrada.
+    """
+    dataset = _abrir_csv(caminho_arquivo, fluxo, tamanho_bloco)
+    filtro = filtro_comexstat(
+        anos=anos,
+        ufs=ufs,
+        ano_minimo=ano_minimo,
+        ano_maximo=ano_maximo,
+        coluna_uf=COLUNA_UF[fluxo],
+    )
+    colunas = colunas if colunas is not None else dataset.schema.names
+    tabela = dataset.to_table(columns=_projecao(fluxo, colunas), filter=filtro)
+    return _para_pandas(tabela, codigos_texto)
+
+
+def _abrir_csv(
+    caminho_arquivo: str, fluxo: str, tamanho_bloco: int = TAMANHO_BLOCO_CSV
+) -> ds.Dataset:
+    """Abre um CSV do ComexStat como dataset Arrow lido em blocos."""
+    schema = SCHEMAS[fluxo]
+    formato = ds.CsvFileFormat(
+        read_options=pacsv.ReadOptions(
+            encoding=ENCODINGS[fluxo], block_size=tamanho_bloco
+        ),
+        parse_options=pacsv.ParseOptions(delimiter=";"),
+        convert_options=pacsv.ConvertOptions(column_types=schema),
+    )
+    return ds.dataset(caminho_arquivo, format=formato, schema=schema)
+
+
+def _projecao(fluxo: str, colunas: List[str]) -> dict:
+    """
+    Projeção das colunas lidas de um CSV. Na base municipal o SH4 vem sem os
+    zeros à esquerda e é completado para 4 dígitos durante a leitura.
+    """
+    return {
+        c: (
+            pc.utf8_lpad(pc.field(c), width=LARGURA_CODIGOS[c], padding="0")
+            if fluxo == "MUN" and c == "SH4"
+            else pc.field(c)
+        )
+        for c in colunas
+    }
+
+
+def escrever_parquet(
+    df: Union[pd.DataFrame, pa.Table],
+    fluxo: str,
+    caminho: str = CAMINHO_PARQUET,
+    particionar_uf: bool = True,
+) -> None:
+    """
+    Grava a base do ComexStat em um dataset Parquet particionado por CO_ANO
+    (e opcionalmente por SG_UF_NCM), com as colunas tipadas conforme SCHEMAS.
+
+    Apenas as partições presentes em `df` são substituídas; os demais anos já
+    gravados no dataset permanecem intactos.
+
+    Args:
+        df (pd.DataFrame | pa.Table): Base no layout dos arquivos EXP_/IMP_.
+        fluxo (str): "EXP" ou "IMP".
+        caminho (str): Diretório raiz dos datasets Parquet.
+        particionar_uf (bool): Se True, cria subpartições por SG_UF_NCM.
+    """
+    schema = SCHEMAS[fluxo]
+    if isinstance(df, pd.DataFrame):
+        tabela = pa.Table.from_pandas(
+            df[schema.names], schema=schema, preserve_index=False
+        )
+    else:
+        tabela = df.select(schema.names).cast(schema)
+    tabela = tabela.sort_by([("SG_UF_NCM", "ascending"), ("CO_NCM", "ascending")])
+
+    colunas_particao = ["CO_ANO", "SG_UF_NCM"] if particionar_uf else ["CO_ANO"]
+    particionamento = ds.partitioning(
+        pa.schema([schema.field(c) for c in colunas_particao]), flavor="hive"
+    )
+
+    # Remove o ano inteiro antes de regravar, para não sobrarem UFs antigas
+    for ano in pc.unique(tabela["CO_ANO"]).to_pylist():
+        shutil.rmtree(os.path.join(caminho, fluxo, f"CO_ANO={ano}"), ignore_errors=True)
+
+    ds.write_dataset(
+        tabela,
+        os.path.join(caminho, fluxo),
+        format="parquet",
+        partitioning=particionamento,
+        existing_data_behavior="overwrite_or_ignore",
+        basename_template="part-{i}.parquet",
+        file_options=ds.ParquetFileFormat().make_write_options(compression="zstd"),
+    )
+
+
+def abrir_dataset(fluxo: str, caminho: str = CAMINHO_PARQUET) -> ds.Dataset:
+    """Abre o dataset Parquet de um fluxo ("EXP", "IMP", "MUN") sem ler os dados."""
+    return ds.dataset(
+        os.path.join(caminho, fluxo),
+        format="parquet",
+        schema=SCHEMAS[fluxo],
+        partitioning="hive",
+    )
+
+
+def filtro_comexstat(
+    anos: Optional[Union[int, Iterable[int]]] = None,
+    ufs: Optional[Union[str, Iterable[str]]] = None,
+    ano_minimo: Optional[int] = None,
+    ano_maximo: Optional[int] = None,
+    coluna_uf: str = "SG_UF_NCM",
+) -> Optional[pc.Expression]:
+    """Monta a expressão de filtro por ano/UF usada na leitura dos datasets."""
+    condicoes = []
+    if anos is not None:
+        condicoes.append(pc.field("CO_ANO").isin(_lista(anos)))
+    if ano_minimo is not None:
+        condicoes.append(pc.field("CO_ANO") >= ano_minimo)
+    if ano_maximo is not None:
+        condicoes.append(pc.field("CO_ANO") <= ano_maximo)
+    if ufs is not None:
+        condicoes.append(pc.field(coluna_uf).isin(_lista(ufs)))
+
+    filtro = None
+    for condicao in condicoes:
+        filtro = condicao if filtro is None else filtro & condicao
+    return filtro
+
+
+def ler_comexstat(
+    fluxo: str = "EXP",
+    anos: Optional[Union[int, Iterable[int]]] = None,
+    ufs: Optional[Union[str, Iterable[str]]] = None,
+    colunas: Optional[List[str]] = None,
+    ano_minimo: Optional[int] = None,
+    ano_maximo: Optional[int] = None,
+    codigos_texto: Optional[List[str]] = None,
+    caminho: str = CAMINHO_PARQUET,
+) -> pd.DataFrame:
+    """
+    Lê o dataset Parquet do ComexStat aplicando os filtros de ano e UF na
+    própria leitura (apenas as partições e colunas necessárias são lidas).
+    Os tipos das colunas seguem o esquema documentado no topo do módulo.
+
+    Enquanto o dataset Parquet do fluxo não existe, lê o CSV consolidado
+    (ARQUIVOS_COMPLETOS em CAMINHO_DADOS) em streaming, com os mesmos
+    filtros (ver ler_csv_comexstat).
+
+    Args:
+        fluxo (str): "EXP", "IMP" ou "MUN" (base municipal, particionada por
+            SG_UF_MUN: ler uma UF só lê a partição dela).
+        anos (int | Iterable[int], opcional): Anos a serem lidos.
+        ufs (str | Iterable[str], opcional): Siglas de UF (SG_UF_NCM ou
+            SG_UF_MUN, conforme o fluxo).
+        colunas (list[str], opcional): Colunas a serem lidas. Padrão: todas.
+        ano_minimo (int, opcional): Primeiro ano (inclusive).
+        ano_maximo (int, opcional): Último ano (inclusive).
+        codigos_texto (list[str], opcional): Colunas de código a serem
+            retornadas como texto com zeros à esquerda (ex: ["CO_NCM"]).
+            Como viram categorias, use observed=True ao agrupar por elas.
+        caminho (str): Diretório raiz dos datasets Parquet.
+
+    Returns:
+        pd.DataFrame: Base filtrada, com as colunas na ordem do layout original.
+    """
+    tabela = _ler_tabela(fluxo, anos, ufs, colunas, ano_minimo, ano_maximo, caminho)
+    return _para_pandas(tabela, codigos_texto)
+
+
+def _ler_tabela(
+    fluxo: str,
+    anos: Optional[Union[int, Iterable[int]]] = None,
+    ufs: Optional[Union[str, Iterable[str]]] = None,
+    colunas: Optional[List[str]] = None,
+    ano_minimo: Optional[int] = None,
+    ano_maximo: Optional[int] = None,
+    caminho: str = CAMINHO_PARQUET,
+) -> pa.Table:
+    """Leitura filtrada de um fluxo como tabela Arrow (Parquet ou, na falta dele, CSV)."""
+    if os.path.isdir(os.path.join(caminho, fluxo)):
+        dataset = abrir_dataset(fluxo, caminho)
+    else:
+        dataset = _abrir_csv(
+            os.path.join(CAMINHO_DADOS, ARQUIVOS_COMPLETOS[fluxo]), fluxo
+        )
+    filtro = filtro_comexstat(
+        anos=anos,
+        ufs=ufs,
+        ano_minimo=ano_minimo,
+        ano_maximo=ano_maximo,
+        coluna_uf=COLUNA_UF[fluxo],
+    )
+    colunas = colunas if colunas is not None else dataset.schema.names
+    return dataset.to_table(columns=_projecao(fluxo, colunas), filter=filtro)
+
+
+def ler_comexstat_fluxos(
+    fluxos: Iterable[str] = ("EXP", "IMP"),
+    anos: Optional[Union[int, Iterable[int]]] = None,
+    ufs: Optional[Union[str, Iterable[str]]] = None,
+    colunas: Optional[List[str]] = None,
+    ano_minimo: Optional[int] = None,
+    ano_maximo: Optional[int] = None,
+    codigos_texto: Optional[List[str]] = None,
+    rotulos: Optional[dict] = None,
+    caminho: str = CAMINHO_PARQUET,
+) -> pd.DataFrame:
+    """
+    Lê exportação e importação (ou outros fluxos) como uma única base, com a
+    coluna FLUXO identificando a origem de cada linha.
+
+    Os dois fluxos são lidos com os mesmos filtros e concatenados em Arrow,
+    de modo que agregações e junções com tradutores podem ser feitas uma vez
+    só sobre a base combinada (agrupando também por FLUXO), em vez de repetir
+    o mesmo pipeline para cada fluxo.
+
+    Args:
+        fluxos (Iterable[str]): Fluxos a serem lidos, na ordem das categorias
+            de FLUXO.
+        anos (int | Iterable[int], opcional): Anos a serem lidos.
+        ufs (str | Iterable[str], opcional): Siglas de UF.
+        colunas (list[str], opcional): Colunas a serem lidas. Padrão: as
+            colunas comuns a todos os fluxos.
+        ano_minimo (int, opcional): Primeiro ano (inclusive).
+        ano_maximo (int, opcional): Último ano (inclusive).
+        codigos_texto (list[str], opcional): Ver ler_comexstat.
+        rotulos (dict, opcional): Valor de FLUXO para cada fluxo (ex:
+            {"EXP": "Exp", "IMP": "Imp"}). Padrão: o próprio nome do fluxo.
+        caminho (str): Diretório raiz dos datasets Parquet.
+
+    Returns:
+        pd.DataFrame: Base combinada, com FLUXO (categoria) como última coluna.
+            Use observed=True ao agrupar por FLUXO.
+    """
+    fluxos = _lista(fluxos)
+    rotulos = [(rotulos or {}).get(fluxo, fluxo) for fluxo in fluxos]
+    if colunas is None:
+        colunas = [
+            c
+            for c in SCHEMAS[fluxos[0]].names
+            if all(c in SCHEMAS[fluxo].names for fluxo in fluxos)
+        ]
+
+    tabelas = []
+    for indice, fluxo in enumerate(fluxos):
+        tabela = _ler_tabela(fluxo, anos, ufs, colunas, ano_minimo, ano_maximo, caminho)
+        tabelas.append(
+            tabela.append_column(
+                "FLUXO",
+                pa.DictionaryArray.from_arrays(
+                    pa.repeat(pa.scalar(indice, pa.int8()), tabela.num_rows),
+                    pa.array(rotulos, pa.string()),
+                ),
+            )
+        )
+    return _para_pandas(pa.concat_tables(tabelas), codigos_texto)
+
+
+def hash_arquivo(caminho_arquivo: str, tamanho_bloco: int = 1 << 20) -> str:
+    """Calcula o hash SHA-256 do conteúdo de um arquivo, lendo em blocos."""
+    h = hashlib.sha256()
+    with open(caminho_arquivo, "rb") as f:
+        for bloco in iter(lambda: f.read(tamanho_bloco), b""):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def carregar_manifesto(caminho: str = CAMINHO_PARQUET) -> dict:
+    """Lê o manifesto dos arquivos de origem já incorporados ao dataset."""
+    arquivo = os.path.join(caminho, ARQUIVO_MANIFESTO)
+    if not os.path.exists(arquivo):
+        return {}
+    with open(arquivo, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def salvar_manifesto(manifesto: dict, caminho: str = CAMINHO_PARQUET) -> None:
+    """Grava o manifesto de forma atômica (arquivo temporário + replace)."""
+    os.makedirs(caminho, exist_ok=True)
+    arquivo = os.path.join(caminho, ARQUIVO_MANIFESTO)
+    with open(arquivo + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifesto, f, indent=2, sort_keys=True)
+    os.replace(arquivo + ".tmp", arquivo)
+
+
+def verificar_arquivo(caminho_arquivo: str, registro: Optional[dict]) -> tuple:
+    """
+    Compara um arquivo de origem com o seu registro no manifesto.
+
+    Tamanho e data de modificação são checados primeiro; o hash só é
+    calculado quando um deles mudou, para confirmar se o conteúdo mudou.
+
+    Returns:
+        tuple: (alterado, registro_atual).
+    """
+    stat = os.stat(caminho_arquivo)
+    registro_atual = {"tamanho": stat.st_size, "mtime": stat.st_mtime}
+
+    if registro is not None and (
+        registro["tamanho"] == registro_atual["tamanho"]
+        and registro["mtime"] == registro_atual["mtime"]
+    ):
+        registro_atual["hash"] = registro["hash"]
+        return False, registro_atual
+
+    registro_atual["hash"] = hash_arquivo(caminho_arquivo)
+    alterado = registro is None or registro["hash"] != registro_atual["hash"]
+    return alterado, registro_atual
+
+
+def versao_dataset(fluxo: str, caminho: str = CAMINHO_PARQUET) -> Optional[str]:
+    """
+    Identifica a versão dos dados de um fluxo, para uso em chaves de cache.
+
+    A versão é um hash dos registros do manifesto (hash do conteúdo de cada
+    arquivo de origem já incorporado): muda sempre que algum ano é atualizado.
+    Sem manifesto (leitura direta do CSV consolidado), usa o tamanho e a data
+    de modificação do CSV.
+
+    Args:
+        fluxo (str): "EXP", "IMP" ou "MUN".
+        caminho (str): Diretório raiz dos datasets Parquet.
+
+    Returns:
+        str | None: Versão (16 caracteres) ou None se não há dados do fluxo.
+    """
+    # A base municipal (EXP_COMPLETA_MUN.csv) também começa com "EXP_"
+    manifesto = carregar_manifesto(caminho)
+    arquivo_mun = os.path.basename(ARQUIVOS_COMPLETOS["MUN"])
+    if fluxo == "MUN":
+        nomes = {arquivo_mun}
+    else:
+        nomes = {
+            nome
+            for nome in manifesto
+            if nome.startswith(f"{fluxo}_") and nome != arquivo_mun
+        }
+    registros = {nome: manifesto[nome]["hash"] for nome in nomes if nome in manifesto}
+    if not registros:
+        arquivo = os.path.join(CAMINHO_DADOS, ARQUIVOS_COMPLETOS[fluxo])
+        if not os.path.exists(arquivo):
+            return None
+        stat = os.stat(arquivo)
+        registros = {arquivo: f"{stat.st_mtime_ns}_{stat.st_size}"}
+    chave = json.dumps(registros, sort_keys=True)
+    return hashlib.sha256(chave.encode()).hexdigest()[:16]
+
+
+def atualizar_parquet(
+    caminho_origem: str,
+    fluxo: str,
+    anos: Iterable[int],
+    caminho: str = CAMINHO_PARQUET,
+    forcar: bool = False,
+) -> List[int]:
+    """
+    Atualiza de forma incremental o dataset Parquet de um fluxo a partir dos
+    arquivos anuais do ComexStat ({fluxo}_{ano}.csv).
+
+    Só os anos cujo arquivo de origem mudou (tamanho, data e hash registrados
+    no manifesto) ou cuja partição não existe são regravados; os demais anos
+    do dataset não são lidos nem tocados.
+
+    Args:
+        caminho_origem (str): Diretório com os arquivos anuais.
+        fluxo (str): "EXP" ou "IMP".
+        anos (Iterable[int]): Anos a serem verificados.
+        caminho (str): Diretório raiz dos datasets Parquet.
+        forcar (bool): Se True, regrava todos os anos (carga completa).
+
+    Returns:
+        list[int]: Anos que foram regravados.
+    """
+    manifesto = carregar_manifesto(caminho)
+    anos_atualizados = []
+
+    for ano in anos:
+        nome_arquivo = f"{fluxo}_{ano}.csv"
+        caminho_arquivo = os.path.join(caminho_origem, nome_arquivo)
+        alterado, registro = verificar_arquivo(
+            caminho_arquivo, manifesto.get(nome_arquivo)
+        )
+        particao_existe = os.path.isdir(os.path.join(caminho, fluxo, f"CO_ANO={ano}"))
+
+        if alterado or forcar or not particao_existe:
+            tabela = _ler_tabela_csv(caminho_arquivo, SCHEMAS[fluxo])
+            escrever_parquet(tabela, fluxo=fluxo, caminho=caminho)
+            anos_atualizados.append(ano)
+
+        # O manifesto é salvo a cada ano para não perder o progresso
+        manifesto[nome_arquivo] = registro
+        salvar_manifesto(manifesto, caminho)
+
+    return anos_atualizados
+
+
+def atualizar_parquet_mun(
+    caminho_arquivo: str = os.path.join(CAMINHO_DADOS, ARQUIVOS_COMPLETOS["MUN"]),
+    caminho: str = CAMINHO_PARQUET,
+    forcar: bool = False,
+) -> bool:
+    """
+    Converte a base municipal (EXP_COMPLETA_MUN.csv) em um dataset Parquet
+    particionado por SG_UF_MUN e CO_ANO, com o SH4 gravado como texto de 4
+    dígitos. Uma leitura de uma UF (ex: RS) só abre a partição dessa UF.
+
+    O CSV é lido em blocos e gravado direto nas partições, sem carregar a base
+    inteira. A conversão só é refeita quando o arquivo mudou desde a última
+    execução (controle pelo mesmo manifesto da base EXP/IMP).
+
+    Args:
+        caminho_arquivo (str): Caminho do EXP_COMPLETA_MUN.csv.
+        caminho (str): Diretório raiz dos datasets Parquet.
+        forcar (bool): Se True, refaz a conversão mesmo sem mudança.
+
+    Returns:
+        bool: True se o dataset foi regravado.
+    """
+    manifesto = carregar_manifesto(caminho)
+    nome_arquivo = os.path.basename(caminho_arquivo)
+    alterado, registro = verificar_arquivo(caminho_arquivo, manifesto.get(nome_arquivo))
+    destino = os.path.join(caminho, "MUN")
+    if not (alterado or forcar or not os.path.isdir(destino)):
+        return False
+
+    dataset = _abrir_csv(caminho_arquivo, "MUN")
+    scanner = dataset.scanner(columns=_projecao("MUN", SCHEMA_MUN.names))
+    shutil.rmtree(destino, ignore_errors=True)
+    ds.write_dataset(
+        scanner,
+        destino,
+        format="parquet",
+        partitioning=ds.partitioning(
+            pa.schema([SCHEMA_MUN.field("SG_UF_MUN"), SCHEMA_MUN.field("CO_ANO")]),
+            flavor="hive",
+        ),
+        basename_template="part-{i}.parquet",
+        max_partitions=4096,
+        file_options=ds.ParquetFileFormat().make_write_options(compression="zstd"),
+    )
+
+    manifesto[nome_arquivo] = registro
+    salvar_manifesto(manifesto, caminho)
+    return True
+
+
+# Cubos pré-agregados (somas anuais) gravados ao lado da base bruta, em
+# {caminho}/cubos/{fluxo}/{nome}/CO_ANO=..., regerados a cada atualização.
+# CO_SH6 é derivado do NCM (6 primeiros dígitos). Os cubos de cada fluxo estão
+# em ordem crescente de tamanho: a leitura usa o primeiro que contém as
+# dimensões pedidas.
+CUBOS = {
+    "EXP": {
+        "ano_uf_pais": ["CO_ANO", "SG_UF_NCM", "CO_PAIS"],
+        "ano_uf_sh6": ["CO_ANO", "SG_UF_NCM", "CO_SH6"],
+        "ano_uf_sh6_pais": ["CO_ANO", "SG_UF_NCM", "CO_SH6", "CO_PAIS"],
+    },
+    "IMP": {
+        "ano_uf_pais": ["CO_ANO", "SG_UF_NCM", "CO_PAIS"],
+        "ano_uf_sh6": ["CO_ANO", "SG_UF_NCM", "CO_SH6"],
+        "ano_uf_sh6_pais": ["CO_ANO", "SG_UF_NCM", "CO_SH6", "CO_PAIS"],
+    },
+    "MUN": {
+        "ano_mun_sh4": ["CO_ANO", "SG_UF_MUN", "CO_MUN", "SH4"],
+    },
+}
+MEDIDAS_CUBOS = ["KG_LIQUIDO", "VL_FOB"]
+
+
+def _derivar_colunas(tabela: pa.Table) -> pa.Table:
+    """Acrescenta CO_SH6 (NCM sem os dois últimos dígitos) quando há CO_NCM."""
+    if "CO_NCM" in tabela.column_names and "CO_SH6" not in tabela.column_names:
+        tabela = tabela.append_column(
+            "CO_SH6", pc.divide(tabela["CO_NCM"], pa.scalar(100, pa.int32()))
+        )
+    return tabela
+
+
+def _agregar(tabela: pa.Table, dimensoes: List[str], medidas: List[str]) -> pa.Table:
+    """Soma as medidas por dimensões, mantendo os nomes originais das colunas."""
+    agregada = tabela.group_by(dimensoes, use_threads=True).aggregate(
+        [(medida, "sum") for medida in medidas]
+    )
+    return agregada.rename_columns(
+        [c[: -len("_sum")] if c.endswith("_sum") else c for c in agregada.column_names]
+    ).select(dimensoes + medidas)
+
+
+def _gravar_cubo(tabela: pa.Table, fluxo: str, nome: str, caminho: str) -> None:
+    """Grava um cubo particionado por CO_ANO, substituindo os anos presentes."""
+    destino = os.path.join(caminho, "cubos", fluxo, nome)
+    for ano in pc.unique(tabela["CO_ANO"]).to_pylist():
+        shutil.rmtree(os.path.join(destino, f"CO_ANO={ano}"), ignore_errors=True)
+
+    ordem = [(c, "ascending") for c in CUBOS[fluxo][nome]]
+    ds.write_dataset(
+        tabela.sort_by(ordem),
+        destino,
+        format="parquet",
+        partitioning=ds.partitioning(
+            pa.schema([tabela.schema.field("CO_ANO")]), flavor="hive"
+        ),
+        existing_data_behavior="overwrite_or_ignore",
+        basename_template="part-{i}.parquet",
+        file_options=ds.ParquetFileFormat().make_write_options(compression="zstd"),
+    )
+
+
+def anos_disponiveis(fluxo: str, caminho: str = CAMINHO_PARQUET) -> List[int]:
+    """Lista os anos (partições CO_ANO=, em qualquer nível) de um fluxo."""
+    anos = set()
+    for _, subdiretorios, _ in os.walk(os.path.join(caminho, fluxo)):
+        anos.update(
+            int(nome.split("=", 1)[1])
+            for nome in subdiretorios
+            if nome.startswith("CO_ANO=")
+        )
+    return sorted(anos)
+
+
+def construir_cubos(
+    fluxo: str,
+    anos: Optional[Iterable[int]] = None,
+    caminho: str = CAMINHO_PARQUET,
+) -> None:
+    """
+    Gera os cubos de um fluxo ("EXP", "IMP" ou "MUN") a partir do dataset
+    Parquet.
+
+    A base é lida um ano por vez, apenas com as colunas usadas nos cubos, e
+    cada ano é agregado em todos os cubos antes de passar para o seguinte.
+
+    Args:
+        fluxo (str): "EXP", "IMP" ou "MUN".
+        anos (Iterable[int], opcional): Anos a regerar. Padrão: todos.
+        caminho (str): Diretório raiz dos datasets Parquet.
+    """
+    dataset = abrir_dataset(fluxo, caminho)
+    dimensoes = {c for d in CUBOS[fluxo].values() for c in d}
+    colunas = [
+        c
+        for c in dataset.schema.names
+        if c in dimensoes
+        or c in MEDIDAS_CUBOS
+        or (c == "CO_NCM" and "CO_SH6" in dimensoes)
+    ]
+    anos = anos_disponiveis(fluxo, caminho) if anos is None else _lista(anos)
+
+    for ano in anos:
+        tabela = _derivar_colunas(
+            dataset.to_table(columns=colunas, filter=pc.field("CO_ANO") == ano)
+        )
+        for nome, dimensoes in CUBOS[fluxo].items():
+            _gravar_cubo(
+                _agregar(tabela, dimensoes, MEDIDAS_CUBOS), fluxo, nome, caminho
+            )
+
+
+def atualizar_cubos(
+    fluxo: str,
+    anos_atualizados: Iterable[int],
+    caminho: str = CAMINHO_PARQUET,
+) -> List[int]:
+    """
+    Regera os cubos dos anos atualizados na base bruta e dos anos que ainda
+    não existem em algum dos cubos (ex: primeira execução ou cubo novo).
+
+    Returns:
+        list[int]: Anos regerados.
+    """
+    anos = set(anos_atualizados)
+    for ano in anos_disponiveis(fluxo, caminho):
+        for nome in CUBOS[fluxo]:
+            if not os.path.isdir(
+                os.path.join(caminho, "cubos", fluxo, nome, f"CO_ANO={ano}")
+            ):
+                anos.add(ano)
+    anos = sorted(anos)
+    construir_cubos(fluxo, anos=anos, caminho=caminho)
+    return anos
+
+
+def escolher_cubo(fluxo: str, dimensoes: List[str]) -> Optional[str]:
+    """
+    Devolve o menor cubo do fluxo que contém todas as dimensões pedidas (a UF
+    sempre está disponível para filtro), ou None se nenhum cubo responde.
+    """
+    for nome, dimensoes_cubo in CUBOS[fluxo].items():
+        if set(dimensoes) <= set(dimensoes_cubo):
+            return nome
+    return None
+
+
+def ler_cubo(
+    fluxo: str,
+    dimensoes: List[str],
+    anos: Optional[Union[int, Iterable[int]]] = None,
+    ufs: Optional[Union[str, Iterable[str]]] = None,
+    ano_minimo: Optional[int] = None,
+    ano_maximo: Optional[int] = None,
+    medidas: Optional[List[str]] = None,
+    codigos_texto: Optional[List[str]] = None,
+    caminho: str = CAMINHO_PARQUET,
+) -> pd.DataFrame:
+    """
+    Lê as somas anuais do ComexStat agregadas pelas dimensões pedidas,
+    servidas pelo menor cubo que as contém. Se nenhum cubo responde (ex:
+    dimensão CO_NCM) ou o cubo ainda não foi gerado, agrega a base bruta.
+
+    Args:
+        fluxo (str): "EXP", "IMP" ou "MUN".
+        dimensoes (list[str]): Colunas de agrupamento (ex: ["CO_ANO", "CO_SH6"]).
+        anos (int | Iterable[int], opcional): Anos a serem lidos.
+        ufs (str | Iterable[str], opcional): Siglas de UF para filtro.
+        ano_minimo (int, opcional): Primeiro ano (inclusive).
+        ano_maximo (int, opcional): Último ano (inclusive).
+        medidas (list[str], opcional): Medidas somadas. Padrão: MEDIDAS_CUBOS.
+        codigos_texto (list[str], opcional): Colunas de código a serem
+            retornadas como texto com zeros à esquerda (ex: ["CO_SH6"]).
+        caminho (str): Diretório raiz dos datasets Parquet.
+
+    Returns:
+        pd.DataFrame: Uma linha por combinação das dimensões.
+    """
+    medidas = medidas or MEDIDAS_CUBOS
+    filtro = filtro_comexstat(
+        anos=anos,
+        ufs=ufs,
+        ano_minimo=ano_minimo,
+        ano_maximo=ano_maximo,
+        coluna_uf=COLUNA_UF[fluxo],
+    )
+
+    nome = escolher_cubo(fluxo, dimensoes)
+    destino = os.path.join(caminho, "cubos", fluxo, str(nome))
+    if nome is not None and os.path.isdir(destino):
+        dataset = ds.dataset(destino, format="parquet", partitioning="hive")
+        colunas = [COLUNA_UF[fluxo]] + CUBOS[fluxo][nome] + medidas
+        tabela = dataset.to_table(columns=list(dict.fromkeys(colunas)), filter=filtro)
+    else:
+        dataset = abrir_dataset(fluxo, caminho)
+        necessarias = dimensoes + medidas + [COLUNA_UF[fluxo]]
+        if "CO_SH6" in dimensoes:
+            necessarias.append("CO_NCM")
+        colunas = [c for c in dataset.schema.names if c in necessarias]
+        tabela = _derivar_colunas(dataset.to_table(columns=colunas, filter=filtro))
+
+    # CO_ANO vem da partição como int32; volta ao tipo do esquema
+    tabela = _agregar(tabela, dimensoes, medidas)
+    if "CO_ANO" in dimensoes:
+        tabela = tabela.set_column(
+            tabela.schema.get_field_index("CO_ANO"),
+            "CO_ANO",
+            pc.cast(tabela["CO_ANO"], pa.int16()),
+        )
+    return _para_pandas(tabela, codigos_texto)
+
+
+# Motor DuckDB: consultas SQL direto sobre os arquivos Parquet, com agregação
+# em várias threads e despejo em disco (temp_directory) quando a memória
+# configurada não basta, sem carregar a base inteira no pandas.
+MEMORIA_DUCKDB = "6GB"
+
+_conexoes_duckdb = {}
+
+
+def _colunas_particao(diretorio: str) -> List[str]:
+    """Lista as colunas de partição hive (nome=valor) de um dataset gravado."""
+    colunas = []
+    while True:
+        subdiretorios = [
+            nome
+            for nome in os.listdir(diretorio)
+            if "=" in nome and os.path.isdir(os.path.join(diretorio, nome))
+        ]
+        if not subdiretorios:
+            return colunas
+        colunas.append(subdiretorios[0].split("=", 1)[0])
+        diretorio = os.path.join(diretorio, subdiretorios[0])
+
+
+def conectar_duckdb(
+    caminho: str = CAMINHO_PARQUET,
+    memoria: str = MEMORIA_DUCKDB,
+    threads: Optional[int] = None,
+):
+    """
+    Abre (uma vez por configuração) uma conexão DuckDB com uma view por fluxo
+    gravado em `caminho` (EXP, IMP, MUN), com os tipos das partições iguais aos do
+    esquema do módulo.
+
+    Args:
+        caminho (str): Diretório raiz dos datasets Parquet.
+        memoria (str): Limite de memória do DuckDB (ex: "6GB").
+        threads (int, opcional): Número de threads. Padrão: todos os núcleos.
+
+    Returns:
+        duckdb.DuckDBPyConnection: Conexão pronta para consultas.
+    """
+    import duckdb
+
+    chave = (caminho, memoria, threads)
+    if chave in _conexoes_duckdb:
+        return _conexoes_duckdb[chave]
+
+    con = duckdb.connect()
+    con.execute(f"SET memory_limit = '{memoria}'")
+    con.execute(f"SET temp_directory = '{os.path.join(caminho, 'duckdb_tmp')}'")
+    if threads is not None:
+        con.execute(f"SET threads = {int(threads)}")
+
+    for fluxo, schema in SCHEMAS.items():
+        diretorio = os.path.join(caminho, fluxo)
+        if not os.path.isdir(diretorio):
+            continue
+        tipos = ", ".join(
+            f"'{c}': '{'SMALLINT' if c == 'CO_ANO' else 'VARCHAR'}'"
+            for c in _colunas_particao(diretorio)
+        )
+        padrao = os.path.join(diretorio, "**", "*.parquet").replace("\\", "/")
+        con.execute(
+            f"CREATE VIEW {fluxo} AS SELECT * FROM read_parquet('{padrao}', "
+            f"hive_partitioning = true, hive_types = {{{tipos}}})"
+        )
+
+    _conexoes_duckdb[chave] = con
+    return con
+
+
+def agregar_duckdb(
+    fluxo: Union[str, Iterable[str]],
+    dimensoes: List[str],
+    medidas: Optional[List[str]] = None,
+    anos: Optional[Union[int, Iterable[int]]] = None,
+    ufs: Optional[Union[str, Iterable[str]]] = None,
+    ano_minimo: Optional[int] = None,
+    ano_maximo: Optional[int] = None,
+    ufs_excluidas: Optional[Union[str, Iterable[str]]] = None,
+    caminho: str = CAMINHO_PARQUET,
+) -> pd.DataFrame:
+    """
+    Soma as medidas por dimensões em SQL (DuckDB) direto no dataset Parquet,
+    com os mesmos filtros de ano/UF de ler_comexstat. O resultado tem as
+    colunas `dimensoes + medidas`, como um groupby(as_index=False).sum().
+
+    Com uma lista de fluxos (ex: ["EXP", "IMP"]), os fluxos são unidos em
+    uma única consulta e FLUXO entra como primeira dimensão, de modo que
+    exportação e importação são agregadas em uma passada só.
+
+    Args:
+        fluxo (str | Iterable[str]): "EXP", "IMP" ou "MUN", ou uma lista de
+            fluxos.
+        dimensoes (list[str]): Colunas de agrupamento.
+        medidas (list[str], opcional): Colunas somadas. Padrão: ["VL_FOB"].
+        anos (int | Iterable[int], opcional): Anos a serem lidos.
+        ufs (str | Iterable[str], opcional): Siglas de UF.
+        ano_minimo (int, opcional): Primeiro ano (inclusive).
+        ano_maximo (int, opcional): Último ano (inclusive).
+        ufs_excluidas (str | Iterable[str], opcional): UFs a desconsiderar
+            (ex: "ND").
+        caminho (str): Diretório raiz dos datasets Parquet.
+
+    Returns:
+        pd.DataFrame: Base agregada, ordenada pelas dimensões.
+    """
+    medidas = medidas or ["VL_FOB"]
+    condicoes, parametros = [], []
+    if anos is not None:
+        anos = _lista(anos)
+        condicoes.append(f"CO_ANO IN ({', '.join('?' * len(anos))})")
+        parametros += [int(ano) for ano in anos]
+    if ano_minimo is not None:
+        condicoes.append("CO_ANO >= ?")
+        parametros.append(int(ano_minimo))
+    if ano_maximo is not None:
+        condicoes.append("CO_ANO <= ?")
+        parametros.append(int(ano_maximo))
+    fluxos = _lista(fluxo)
+    coluna_uf = COLUNA_UF[fluxos[0]]
+    if ufs is not None:
+        ufs = _lista(ufs)
+        condicoes.append(f"{coluna_uf} IN ({', '.join('?' * len(ufs))})")
+        parametros += ufs
+    if ufs_excluidas is not None:
+        ufs_excluidas = _lista(ufs_excluidas)
+        condicoes.append(f"{coluna_uf} NOT IN ({', '.join('?' * len(ufs_excluidas))})")
+        parametros += ufs_excluidas
+
+    where = f"WHERE {' AND '.join(condicoes)}" if condicoes else ""
+    if isinstance(fluxo, str):
+        origem = fluxo
+    else:
+        # Os filtros ficam dentro de cada SELECT, para podar as partições
+        necessarias = ", ".join(dict.fromkeys(dimensoes + medidas))
+        origem = "({})".format(
+            " UNION ALL ".join(
+                f"SELECT '{f}' AS FLUXO, {necessarias} FROM {f} {where}" for f in fluxos
+            )
+        )
+        dimensoes = ["FLUXO"] + dimensoes
+        parametros = parametros * len(fluxos)
+        where = ""
+
+    colunas = ", ".join(dimensoes)
+    somas = ", ".join(f"CAST(SUM({m}) AS BIGINT) AS {m}" for m in medidas)
+    sql = (
+        f"SELECT {colunas}, {somas} FROM {origem} {where} "
+        f"GROUP BY {colunas} ORDER BY {colunas}"
+    )
+    return conectar_duckdb(caminho).execute(sql, parametros).df()
@@ -1,30 +1,50 @@
 # %%
-import pandas as pd
+# ATENÇÃO: por padrão os CSVs consolidados (../data/EXP_COMPLETA.csv e
+# ../data/IMP_COMPLETA.csv) NÃO são mais gerados; os scripts consumidores leem
+# o dataset Parquet. Use gerar_csv = True para voltar a gerá-los: o CSV é
+# regravado quando algum ano do fluxo foi atualizado ou quando o arquivo não
+# existe.
+import os
+import comexstat
 
 anos = range(1997, 2026)
 caminho = "../data/comexstat_parcial/"
 
-lista_exp = []
-for ano in anos:
-    df_exp = pd.read_csv(f"{caminho}EXP_{ano}.csv", sep=";", engine="pyarrow")
-    lista_exp.append(df_exp)
+# Modo incremental: só regrava os anos cujos arquivos mudaram desde a última
+# execução (ver manifesto.json no diretório do dataset Parquet).
+# Use incremental = False para forçar a carga completa.
+incremental = True
 
-df_exp_completa = pd.concat(lista_exp, ignore_index=True)
+# CSVs consolidados desligados por padrão (ver aviso no topo)
+gerar_csv = False
 
-lista_imp = []
-for ano in anos:
-    df_imp = pd.read_csv(f"{caminho}IMP_{ano}.csv", sep=";", engine="pyarrow")
-    lista_imp.append(df_imp)
+anos_atualizados = {}
+for fluxo in ["EXP", "IMP"]:
+    anos_atualizados[fluxo] = comexstat.atualizar_parquet(
+        caminho, fluxo=fluxo, anos=anos, forcar=not incremental
+    )
+    print(f"{fluxo}: anos atualizados {anos_atualizados[fluxo]}")
 
-df_imp_completa = pd.concat(lista_imp, ignore_index=True)
-
-df_exp_completa.to_csv(
-    "../data/EXP_COMPLETA.csv",
-    sep=";",
-    index=False,
-    encoding="utf-8",
+# Base municipal (EXP_COMPLETA_MUN.csv), particionada por UF e ano
+mun_atualizada = comexstat.atualizar_parquet_mun(
+    "../data/EXP_COMPLETA_MUN.csv", forcar=not incremental
 )
+print(f"MUN: {'atualizada' if mun_atualizada else 'sem alterações'}")
 
-df_imp_completa.to_csv(
-    "../data/IMP_COMPLETA.csv", sep=";", index=False, encoding="utf-8"
-)
+# %% CUBOS
+# Somas anuais por UF x SH6 / UF x país (e município x SH4), lidas pelos
+# relatórios com comexstat.ler_cubo; só os anos atualizados são regerados
+for fluxo in ["EXP", "IMP"]:
+    anos_cubos = comexstat.atualizar_cubos(fluxo, anos_atualizados[fluxo])
+    print(f"{fluxo}: cubos regerados {anos_cubos}")
+
+anos_mun = comexstat.anos_disponiveis("MUN") if mun_atualizada else []
+print(f"MUN: cubos regerados {comexstat.atualizar_cubos('MUN', anos_mun)}")
+
+# %% CSV CONSOLIDADO
+for fluxo in ["EXP", "IMP"]:
+    arquivo_csv = f"../data/{fluxo}_COMPLETA.csv"
+    if gerar_csv and (anos_atualizados[fluxo] or not os.path.exists(arquivo_csv)):
+        comexstat.ler_comexstat(fluxo).to_csv(
+            arquivo_csv, sep=";", index=False, encoding=comexstat.ENCODING
+        )
@@ -0,0 +1,32 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable
+
+
+def executor_processos(
+    processos: int, inicializar: Callable, argumentos: tuple = ()
+) -> ProcessPoolExecutor:
+    """
+    Cria o pool de processos dos lotes (UFs da APEX, bases do ranqueamento).
+
+    Os dados compartilhados pelo lote são entregues a cada processo por
+    `inicializar(*argumentos)`. No Linux os processos são criados com fork e
+    herdam os dados já carregados por copy-on-write; no Windows (spawn) eles
+    são enviados a cada processo no initializer.
+
+    Args:
+        processos (int): Número de processos.
+        inicializar (Callable): Função que recebe os dados no processo.
+        argumentos (tuple): Argumentos de `inicializar`.
+
+    Returns:
+        ProcessPoolExecutor: Pool a ser usado como gerenciador de contexto.
+    """
+    metodos = multiprocessing.get_all_start_methods()
+    contexto = multiprocessing.get_context("fork" if "fork" in metodos else None)
+    return ProcessPoolExecutor(
+        max_workers=processos,
+        mp_context=contexto,
+        initializer=inicializar,
+        initargs=argumentos,
+    )
@@ -0,0 +1,46 @@
+# %%
+import argparse
+import os
+import sys
+import utils
+
+# Ranqueamento de várias bases de uma vez (bases/base_<arquivo>.xlsx), em
+# paralelo; cada resultado vai para resultados/ranqueamento_<arquivo>.xlsx.
+# Ex: python ranqueamento_lote.py
+#     python ranqueamento_lote.py --arquivos municipios_2023 municipios_2024
+arquivos = [f"municipios_{ano}" for ano in range(2019, 2025)]
+colunas_de_renomeacao = "descricao"  # pode ser ou "descricao" ou "coluna"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ranqueia várias bases em paralelo.")
+    parser.add_argument(
+        "--arquivos",
+        type=str,
+        nargs="+",
+        default=arquivos,
+        help="Nomes das bases (bases/base_<nome>.xlsx)",
+    )
+    parser.add_argument(
+        "--renomeacao",
+        type=str,
+        default=colunas_de_renomeacao,
+        choices=["descricao", "coluna"],
+        help="Coluna da classificação com os nomes finais",
+    )
+    parser.add_argument(
+        "--processos",
+        type=int,
+        default=None,
+        help="Número de processos (padrão: um por núcleo)",
+    )
+    args = parser.parse_args()
+
+    resultados = utils.ranquear_lote(
+        bases=[os.path.join("bases", f"base_{nome}.xlsx") for nome in args.arquivos],
+        caminho_saida="resultados",
+        colunas_de_renomeacao=args.renomeacao,
+        processos=args.processos,
+    )
+    print(resultados.to_string(index=False))
+    if not resultados["sucesso"].all():
+        sys.exit(1)
@@ -0,0 +1,70 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+from statsmodels.stats.diagnostic import lilliefors
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import utils  # noqa: E402
+
+# Tamanhos de amostra (do mínimo do teste até bases grandes) e distribuições
+# normais, de cauda pesada e assimétricas
+TAMANHOS = [5, 6, 7, 8, 10, 12, 15, 20, 30, 50, 100, 200, 500, 1000, 5000]
+DISTRIBUICOES = {
+    "normal": lambda rng, n: rng.normal(10, 3, n),
+    "t": lambda rng, n: rng.standard_t(3, n),
+    "lognormal": lambda rng, n: rng.lognormal(0, 1, n),
+    "exponencial": lambda rng, n: rng.exponential(2, n),
+    "arredondada": lambda rng, n: np.round(rng.normal(50, 15, n)),
+}
+AMOSTRAS_POR_CASO = 27
+
+
+def _bloco(tamanho, distribuicao, rng):
+    """
+    Bloco com AMOSTRAS_POR_CASO colunas de `tamanho` valores testados cada,
+    misturados a valores fora da máscara (inclusive NaN).
+    """
+    linhas = tamanho + 7
+    bloco = np.empty((linhas, AMOSTRAS_POR_CASO))
+    mascara = np.zeros_like(bloco, dtype=bool)
+    for j in range(AMOSTRAS_POR_CASO):
+        bloco[:, j] = DISTRIBUICOES[distribuicao](rng, linhas)
+        mascara[rng.choice(linhas, tamanho, replace=False), j] = True
+        bloco[np.flatnonzero(~mascara[:, j])[:2], j] = np.nan
+    return np.asfortranarray(bloco), mascara
+
+
+@pytest.mark.parametrize("distribuicao", sorted(DISTRIBUICOES))
+@pytest.mark.parametrize("tamanho", TAMANHOS)
+def test_p_lilliefors_igual_ao_statsmodels(tamanho, distribuicao):
+    rng = np.random.default_rng(tamanho * 31 + len(distribuicao))
+    bloco, mascara = _bloco(tamanho, distribuicao, rng)
+
+    p_valores = utils.p_lilliefors(bloco, mascara)
+    referencia = utils.p_lilliefors_statsmodels(bloco, mascara)
+
+    np.testing.assert_allclose(p_valores, referencia, rtol=0, atol=1e-10)
+    np.testing.assert_array_equal(p_valores >= 0.05, referencia >= 0.05)
+    for j in range(0, AMOSTRAS_POR_CASO, 9):
+        esperado = lilliefors(bloco[mascara[:, j], j], dist="norm")[1]
+        assert p_valores[j] == pytest.approx(esperado, abs=1e-10)
+
+
+def test_p_normalidade_cache_limitado(monkeypatch):
+    rng = np.random.default_rng(0)
+    bloco = np.asfortranarray(rng.normal(size=(40, 30)))
+    mascara = np.ones_like(bloco, dtype=bool)
+    monkeypatch.setattr(utils, "_CACHE_NORMALIDADE", utils.OrderedDict())
+    monkeypatch.setattr(utils, "TAMANHO_CACHE_NORMALIDADE", 10)
+
+    p_valores = utils._p_normalidade(bloco, mascara)
+    np.testing.assert_array_equal(p_valores, utils.p_lilliefors(bloco, mascara))
+    assert len(utils._CACHE_NORMALIDADE) == 10
+
+    # As colunas mais recentes continuam em cache e dão o mesmo resultado
+    np.testing.assert_array_equal(
+        utils._p_normalidade(bloco[:, -10:], mascara[:, -10:]), p_valores[-10:]
+    )
+    assert len(utils._CACHE_NORMALIDADE) == 10
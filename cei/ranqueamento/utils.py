@@ -1,160 +1,406 @@
+import hashlib
+import os
+import sys
+import time
 import numpy as np
 import pandas as pd
 import warnings
 import re
+from collections import OrderedDict
+from functools import lru_cache
+from scipy.special import ndtr
 from statsmodels.stats.diagnostic import lilliefors
+from statsmodels.stats._lilliefors import get_lilliefors_table
 from typing import List, Callable, Set
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from processos import executor_processos  # noqa: E402
 
-def nota_valor_1(df: pd.DataFrame, colunas: List[str]) -> pd.DataFrame:
+# Notas possíveis de cada faixa (abaixo de média - sd / quartil 1, ..., acima
+# de média + sd / quartil 3)
+NOTAS_FAIXAS = np.array([-1.0, 1.0, 3.0, 5.0])
+
+TIPOS_NOTA = ("valor", "taxa", "participacao")
+
+
+def _bloco_numerico(df: pd.DataFrame, colunas: List[str]) -> np.ndarray:
     """
-    Calcula notas (_1) para colunas de valor, baseadas na distribuição normal
-    da coluna transformada por logaritmo natural.
+    Converte as colunas em um bloco 2-D (linhas x variáveis) de float.
 
-    Assume que a coluna 'id' existe no DataFrame de entrada.
-    Realiza todos os cálculos intermediários necessários (log, teste KS, média, sd).
+    Valores não numéricos viram NaN (como pd.to_numeric(errors="coerce")). O
+    bloco é ordenado por coluna, para que as somas por variável sejam feitas
+    na mesma ordem (e com o mesmo arredondamento) das somas do pandas.
+    """
+    bloco = df[colunas]
+    if not all(pd.api.types.is_numeric_dtype(tipo) for tipo in bloco.dtypes):
+        bloco = bloco.apply(pd.to_numeric, errors="coerce")
+    return np.asfortranarray(bloco.to_numpy(dtype=float, na_value=np.nan))
+
+
+def _media_dp(bloco: np.ndarray) -> tuple:
+    """
+    Média e desvio padrão amostral (ddof=1) de cada coluna, ignorando NaN.
+
+    Segue o algoritmo do pandas (Series.mean/Series.std), de modo que os
+    limites média +/- sd sejam idênticos aos calculados coluna a coluna.
+    """
+    validos = ~np.isnan(bloco)
+    contagem = validos.sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        media = np.where(validos, bloco, 0.0).sum(axis=0) / contagem
+        quadrados = np.where(validos, (media - bloco) ** 2, 0.0)
+        dp = np.sqrt(quadrados.sum(axis=0) / (contagem - 1))
+    dp[contagem <= 1] = np.nan
+    return media, dp
+
+
+def _quartis(bloco: np.ndarray, mascara: np.ndarray, minimo: int) -> np.ndarray:
+    """
+    Quartis (25%, 50% e 75%, interpolação linear) dos valores selecionados
+    pela máscara em cada coluna.
+
+    Returns:
+        np.ndarray: Matriz 3 x variáveis; colunas com menos de `minimo`
+                    valores selecionados ficam com NaN.
+    """
+    ordenado = np.sort(np.where(mascara, bloco, np.nan), axis=0)
+    contagem = mascara.sum(axis=0)
+    quartis = np.full((3, bloco.shape[1]), np.nan)
+    colunas = np.flatnonzero(contagem >= max(minimo, 1))
+    if colunas.size == 0:
+        return quartis
+
+    # Mesmo índice virtual e interpolação do np.percentile (method="linear")
+    n = contagem[colunas]
+    q = np.array([[0.25], [0.50], [0.75]])
+    indice = n * q + (1 - q) - 1
+    anterior = np.floor(indice).astype(int)
+    proximo = np.minimum(anterior + 1, n - 1)
+    gamma = indice - anterior
+    a = ordenado[anterior, colunas]
+    b = ordenado[proximo, colunas]
+    diferenca = b - a
+    quartis[:, colunas] = np.where(
+        gamma >= 0.5, b - diferenca * (1 - gamma), a + diferenca * gamma
+    )
+    return quartis
+
+
+# Número mínimo de valores para o teste de normalidade; com menos, p-valor NaN
+MINIMO_TESTE_NORMALIDADE = 5
+
+# p-valores já calculados, por (teste, hash dos valores testados). As notas _1
+# e _2 testam recortes diferentes de uma mesma coluna, e recortes repetidos
+# (mesma coluna em outra base/rodada) não são testados de novo. O cache é
+# LRU, limitado a TAMANHO_CACHE_NORMALIDADE entradas, para não crescer sem
+# limite em execuções longas (ranquear_lote).
+TAMANHO_CACHE_NORMALIDADE = 50_000
+_CACHE_NORMALIDADE = OrderedDict()
+
+
+@lru_cache(maxsize=None)
+def _tabela_lilliefors(n: int) -> tuple:
+    """
+    Valores críticos do teste de Lilliefors (normal) para n observações,
+    em ordem crescente, e os p-valores correspondentes.
+
+    É a mesma tabela interpolada usada pelo statsmodels.lilliefors
+    (pvalmethod="table"), calculada uma vez por tamanho de amostra.
+    """
+    tabela = get_lilliefors_table(dist="norm")
+    criticos = np.asarray(tabela._critvals(n), dtype=float)
+    alpha = np.asarray(tabela.alpha, dtype=float)
+    if tabela.signcrit < 1:
+        criticos, alpha = criticos[::-1], alpha[::-1]
+    return criticos, alpha
+
+
+def p_lilliefors(bloco: np.ndarray, mascara: np.ndarray) -> np.ndarray:
+    """
+    p-valor do teste de Lilliefors (normal) de cada coluna, calculado para
+    todas as colunas de uma vez.
+
+    A estatística KS é obtida das colunas ordenadas (valores selecionados
+    primeiro, NaN no fim) e o p-valor é interpolado na tabela do statsmodels,
+    reproduzindo lilliefors(dados, dist="norm") coluna a coluna.
 
     Args:
-        df (pd.DataFrame): O DataFrame contendo os dados originais e a coluna 'id'.
-        colunas (list): Uma lista de nomes das colunas de *valor* originais
-                           a serem processadas.
+        bloco (np.ndarray): Bloco linhas x variáveis.
+        mascara (np.ndarray): Valores a testar em cada coluna.
 
     Returns:
-        pd.DataFrame: Um DataFrame contendo a coluna 'id' e as colunas
-                      de nota calculadas ('nota_col_1'). Notas não atribuídas
-                      pelas condições permanecerão como NaN.
+        np.ndarray: p-valores (NaN quando o desvio padrão é zero).
     """
-    df = df.copy()
-    nota_cols_final = []
-
-    for col in colunas:
-        log_col_name = f"{col}_ln"
-
-        # Lidar com coluna original toda NaN
-
-        numeric_col_check = pd.to_numeric(df[col], errors="coerce")
-        if numeric_col_check.isnull().all():
-            if log_col_name not in df.columns:
-                df[log_col_name] = np.nan
-            prob_ks_col = f"Prob_KS_{log_col_name}"
-            mean_col = f"{log_col_name}_mean"
-            sd_col = f"{log_col_name}_sd"
-            mean_minus_sd_col = f"{log_col_name}_mean_menos_sd"
-            mean_plus_sd_col = f"{log_col_name}_mean_mais_sd"
-            nota_col = f"nota_{col}_1"
-            for c_name in [
-                prob_ks_col,
-                mean_col,
-                sd_col,
-                mean_minus_sd_col,
-                mean_plus_sd_col,
-                nota_col,
-            ]:
-                if c_name not in df.columns:
-                    df[c_name] = np.nan
-            nota_cols_final.append(nota_col)
-            if log_col_name in df.columns and df[log_col_name].isnull().all():
-                try:
-                    del df[log_col_name]
-                except KeyError:
-                    pass
-            continue
+    ordenado = np.sort(np.where(mascara, bloco, np.nan), axis=0)
+    n = mascara.sum(axis=0)
+    selecionados = np.arange(ordenado.shape[0])[:, None] < n
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        media = np.where(selecionados, ordenado, 0.0).sum(axis=0) / n
+        desvios = np.where(selecionados, ordenado - media, 0.0)
+        dp = np.sqrt((desvios**2).sum(axis=0) / (n - 1))
+        acumulada = ndtr(desvios / dp)
+
+        posicao = np.arange(ordenado.shape[0], dtype=float)[:, None]
+        d_mais = np.where(selecionados, (posicao + 1) / n - acumulada, -np.inf)
+        d_menos = np.where(selecionados, acumulada - posicao / n, -np.inf)
+    estatistica = np.maximum(d_mais.max(axis=0), d_menos.max(axis=0))
+
+    p_valores = np.full(bloco.shape[1], np.nan)
+    for tamanho in np.unique(n[n >= 4]):
+        colunas = n == tamanho
+        criticos, alpha = _tabela_lilliefors(int(tamanho))
+        p_valores[colunas] = np.interp(estatistica[colunas], criticos, alpha)
+    return p_valores
+
+
+def p_lilliefors_statsmodels(bloco: np.ndarray, mascara: np.ndarray) -> np.ndarray:
+    """
+    p-valor do teste de Lilliefors chamando o statsmodels coluna a coluna
+    (implementação de referência, mais lenta).
+    """
+    p_valores = np.full(bloco.shape[1], np.nan)
+    for j in range(bloco.shape[1]):
+        try:
+            p_valores[j] = lilliefors(bloco[mascara[:, j], j], dist="norm")[1]
+        except Exception:
+            p_valores[j] = np.nan
+    return p_valores
+
+
+# Testes de normalidade disponíveis: recebem o bloco e a máscara dos valores
+# a testar e devolvem um p-valor por coluna
+TESTES_NORMALIDADE = {
+    "lilliefors": p_lilliefors,
+    "lilliefors_statsmodels": p_lilliefors_statsmodels,
+}
+
+
+def _p_normalidade(
+    bloco: np.ndarray, mascara: np.ndarray, teste="lilliefors"
+) -> np.ndarray:
+    """
+    p-valor do teste de normalidade dos valores selecionados pela máscara em
+    cada coluna; NaN quando há menos de 5 valores ou o teste falha.
+
+    Cada coluna é identificada pelo hash dos valores testados: colunas já
+    testadas com o mesmo teste vêm do cache, e o teste só roda (de uma vez)
+    para as demais.
 
-        # Calcular log, tratando 0 e negativos como NaN
+    Args:
+        bloco (np.ndarray): Bloco linhas x variáveis.
+        mascara (np.ndarray): Valores a testar em cada coluna.
+        teste (str | Callable): Nome em TESTES_NORMALIDADE ou função com a
+            mesma assinatura.
+    """
+    funcao = TESTES_NORMALIDADE[teste] if isinstance(teste, str) else teste
+    p_valores = np.full(bloco.shape[1], np.nan)
+    chaves = {}
+    for j in np.flatnonzero(mascara.sum(axis=0) >= MINIMO_TESTE_NORMALIDADE):
+        dados = np.ascontiguousarray(bloco[mascara[:, j], j])
+        chave = (teste, hashlib.sha1(dados.tobytes()).hexdigest())
+        if chave in _CACHE_NORMALIDADE:
+            _CACHE_NORMALIDADE.move_to_end(chave)
+            p_valores[j] = _CACHE_NORMALIDADE[chave]
+        else:
+            chaves[j] = chave
+
+    if chaves:
+        colunas = np.fromiter(chaves, dtype=int)
         with warnings.catch_warnings():
             warnings.simplefilter("ignore", category=RuntimeWarning)
-            df[log_col_name] = np.log(numeric_col_check.where(numeric_col_check > 0))
-        df[log_col_name] = df[log_col_name].replace([np.inf, -np.inf], np.nan)
-
-        # Teste de Normalidade (Lilliefors)
-        prob_ks_col = f"Prob_KS_{log_col_name}"
-        data_for_ks = df[log_col_name].dropna()
-        p_value = np.nan
-        if len(data_for_ks) >= 5:
-            try:
-                ks_stat, p_value = lilliefors(data_for_ks, dist="norm")
-            except Exception:
-                p_value = np.nan
-        df[prob_ks_col] = p_value
-
-        # Média e Desvio Padrão
-        mean_col = f"{log_col_name}_mean"
-        sd_col = f"{log_col_name}_sd"
-        col_mean = df[log_col_name].mean()
-        col_sd = df[log_col_name].std(ddof=1)
-        df[mean_col] = col_mean
-        df[sd_col] = col_sd
-
-        # Limites Mean +/- SD
-        mean_minus_sd_col = f"{log_col_name}_mean_menos_sd"
-        mean_plus_sd_col = f"{log_col_name}_mean_mais_sd"
-        if pd.notna(col_mean) and pd.notna(col_sd):
-            df[mean_minus_sd_col] = col_mean - col_sd
-            df[mean_plus_sd_col] = col_mean + col_sd
-        else:
-            df[mean_minus_sd_col] = np.nan
-            df[mean_plus_sd_col] = np.nan
+            p_valores[colunas] = funcao(bloco[:, colunas], mascara[:, colunas])
+        for j, chave in chaves.items():
+            _CACHE_NORMALIDADE[chave] = p_valores[j]
+        while len(_CACHE_NORMALIDADE) > TAMANHO_CACHE_NORMALIDADE:
+            _CACHE_NORMALIDADE.popitem(last=False)
+    return p_valores
 
-        # Cálculo da Nota (_1)
-        nota_col = f"nota_{col}_1"
-        nota_cols_final.append(nota_col)
-        df[nota_col] = np.nan
 
-        # Condicao para valores originais que eram não-NaN mas <= 0 (resultando em log NaN)
-        cond_zero_or_neg = numeric_col_check.notna() & df[log_col_name].isna()
+def _faixas(
+    bloco: np.ndarray, limites: np.ndarray, fechado_direita: bool = False
+) -> np.ndarray:
+    """
+    Classifica cada valor nas quatro faixas definidas por três limites por
+    coluna, atribuindo -1, 1, 3 ou 5.
 
-        p_val_check = df[prob_ks_col].fillna(0) >= 0.05
+    Com fechado_direita=False (limites média - sd, média, média + sd) o valor
+    igual ao limite vai para a faixa de cima; com fechado_direita=True
+    (quartis) vai para a faixa de baixo. Valores NaN e colunas com algum
+    limite NaN ficam sem nota.
+    """
+    if fechado_direita:
+        indice = (bloco[None] > limites[:, None, :]).sum(axis=0)
+    else:
+        indice = (bloco[None] >= limites[:, None, :]).sum(axis=0)
+    notas = NOTAS_FAIXAS[indice]
+    notas[np.isnan(bloco) | np.isnan(limites).any(axis=0)] = np.nan
+    return notas
 
-        cond1 = p_val_check & (df[log_col_name] < df[mean_minus_sd_col])
-        cond2 = (
-            p_val_check
-            & (df[log_col_name] >= df[mean_minus_sd_col])
-            & (df[log_col_name] < df[mean_col])
-        )
-        cond3 = (
-            p_val_check
-            & (df[log_col_name] >= df[mean_col])
-            & (df[log_col_name] < df[mean_plus_sd_col])
-        )
-        cond4 = p_val_check & (df[log_col_name] >= df[mean_plus_sd_col])
 
-        conditions = [cond_zero_or_neg, cond1, cond2, cond3, cond4]
+def _notas_bloco(
+    bloco: np.ndarray, tipo: str, variantes=(1, 2, 3), teste_normalidade="lilliefors"
+) -> dict:
+    """
+    Calcula as notas _1, _2 e _3 de todas as variáveis de um bloco de uma vez.
 
-        choices = [-1, -1, 1, 3, 5]
+    Regras por tipo (as mesmas das funções nota_<tipo>_<n>):
+    - valor: log dos valores positivos; zeros e negativos recebem -1.
+    - taxa: log de |mínimo| + valor; outliers a partir de |Z| > 2.
+    - participacao: sem transformação; 0 recebe -1 e 100 recebe 5.
 
-        df[nota_col] = np.select(conditions, choices, default=np.nan)
+    Args:
+        bloco (np.ndarray): Bloco linhas x variáveis (ver _bloco_numerico).
+        tipo (str): "valor", "taxa" ou "participacao".
+        variantes (tuple): Quais notas calcular (1, 2 e/ou 3).
+        teste_normalidade (str | Callable): Teste usado nas notas _1 e _2
+            (ver TESTES_NORMALIDADE).
 
-        cols_to_delete = [
-            log_col_name,
-            prob_ks_col,
-            mean_col,
-            sd_col,
-            mean_minus_sd_col,
-            mean_plus_sd_col,
-        ]
-        for c_del in cols_to_delete:
-            if c_del in df.columns:
-                try:
-                    del df[c_del]
-                except KeyError:
-                    pass
-
-    # Selecionar colunas finais
-    cols_to_keep_final = []
-    if "id" in df.columns:
-        cols_to_keep_final.append("id")
-    cols_to_keep_final.extend([nc for nc in nota_cols_final if nc in df.columns])
+    Returns:
+        dict: {variante: np.ndarray linhas x variáveis com as notas}.
+    """
+    if tipo not in TIPOS_NOTA:
+        raise ValueError(f"tipo deve ser um de {TIPOS_NOTA}, recebido: {tipo!r}")
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        if tipo == "valor":
+            transformado = np.log(np.where(bloco > 0, bloco, np.nan))
+        elif tipo == "taxa":
+            minimo = np.nanmin(bloco, axis=0)
+            deslocamento = np.where(np.isnan(minimo), 0.0, np.abs(minimo))
+            transformado = np.log(deslocamento + bloco)
+        else:
+            transformado = bloco
+    if tipo != "participacao":
+        transformado = np.where(np.isinf(transformado), np.nan, transformado)
+
+    validos = ~np.isnan(transformado)
+    # Valor original presente, mas sem log (zero/negativo)
+    ausentes = ~np.isnan(bloco) & ~validos
+
+    media, dp = _media_dp(transformado)
+    limites_dp = np.vstack([media - dp, media, media + dp])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        z = np.where(~np.isnan(dp) & (dp != 0), (transformado - media) / dp, np.nan)
+
+    limite_outlier = 2 if tipo == "taxa" else 3
+    baixo = z < -limite_outlier
+    alto = z > limite_outlier
+    entre_3 = (z > -3) & (z < 3)
+
+    notas = {}
+    if 1 in variantes:
+        if tipo == "participacao":
+            # Estatísticas e teste sem os zeros
+            sem_zeros = np.where(bloco == 0, np.nan, bloco)
+            media_1, dp_1 = _media_dp(sem_zeros)
+            p_ok = (
+                _p_normalidade(sem_zeros, ~np.isnan(sem_zeros), teste_normalidade)
+                >= 0.05
+            )
+            nota = _faixas(bloco, np.vstack([media_1 - dp_1, media_1, media_1 + dp_1]))
+            nota = np.where(dp_1 == 0, np.where(bloco == media_1, 1.0, np.nan), nota)
+            nota = np.where(bloco == 100, 5.0, nota)
+            nota = np.where(bloco == 0, -1.0, nota)
+            nota = np.where(p_ok, nota, np.nan)
+        else:
+            p_ok = _p_normalidade(transformado, validos, teste_normalidade) >= 0.05
+            nota = np.where(p_ok, _faixas(transformado, limites_dp), np.nan)
+            # Em valor, zeros/negativos recebem -1 mesmo sem normalidade
+            nota = np.where(ausentes & (p_ok | (tipo == "valor")), -1.0, nota)
+        notas[1] = nota
+
+    if 2 in variantes:
+        if tipo == "participacao":
+            p_ok = _p_normalidade(bloco, entre_3, teste_normalidade) >= 0.05
+            nota = np.where(entre_3, _faixas(bloco, limites_dp), np.nan)
+            nota = np.where(baixo, -1.0, np.where(alto, 5.0, nota))
+            nota = np.where(bloco == 100, 5.0, nota)
+            nota = np.where(bloco == 0, -1.0, nota)
+            nota = np.where(p_ok, nota, np.nan)
+        else:
+            normais = validos & ~baixo & ~alto
+            # Em valor o teste usa os não-outliers; em taxa, |Z| < 3
+            p_ok = (
+                _p_normalidade(
+                    transformado,
+                    normais if tipo == "valor" else entre_3,
+                    teste_normalidade,
+                )
+                >= 0.05
+            )
+            nota = np.where(normais, _faixas(transformado, limites_dp), np.nan)
+            nota = np.where(baixo, -1.0, np.where(alto, 5.0, nota))
+            nota = np.where(p_ok, nota, np.nan)
+            nota = np.where(ausentes & (p_ok | (tipo == "valor")), -1.0, nota)
+            if tipo == "taxa":
+                nota = np.where(np.isnan(nota), 0.0, nota)
+        notas[2] = nota
+
+    if 3 in variantes:
+        if tipo == "participacao":
+            # Outliers só são identificados onde o Z existe
+            normais = ~np.isnan(z) & ~baixo & ~alto
+            quartis = _quartis(bloco, normais, minimo=4)
+            nota = _faixas(bloco, quartis, fechado_direita=True)
+        else:
+            normais = validos & ~baixo & ~alto
+            quartis = _quartis(
+                transformado, normais, minimo=4 if tipo == "valor" else 1
+            )
+            nota = _faixas(transformado, quartis, fechado_direita=True)
+            nota = np.where(ausentes, -1.0, nota)
+        notas[3] = nota
 
-    return df[cols_to_keep_final].copy()
+    return notas
 
 
-def nota_valor_2(df: pd.DataFrame, colunas: List[str]) -> pd.DataFrame:
+def calcular_notas_tipo(
+    df: pd.DataFrame,
+    colunas: List[str],
+    tipo: str,
+    variantes=(1, 2, 3),
+    teste_normalidade="lilliefors",
+) -> pd.DataFrame:
     """
-    Calcula notas (_2) para colunas de valor, considerando outliers (+/- 3 SD)
-    e realizando teste K-S em dados filtrados.
+    Calcula as notas (_1, _2 e _3) de todas as colunas de um tipo de variável
+    em uma única passada sobre o bloco numérico.
+
+    Equivale a chamar nota_<tipo>_1, nota_<tipo>_2 e nota_<tipo>_3 e
+    concatenar os resultados, sem criar colunas intermediárias por variável.
+
+    Args:
+        df (pd.DataFrame): O DataFrame contendo os dados originais e a coluna 'id'.
+        colunas (list): Nomes das colunas a serem processadas.
+        tipo (str): "valor", "taxa" ou "participacao".
+        variantes (tuple): Quais notas calcular (1, 2 e/ou 3).
+        teste_normalidade (str | Callable): Teste usado nas notas _1 e _2
+            (ver TESTES_NORMALIDADE).
+
+    Returns:
+        pd.DataFrame: DataFrame com 'id' (se existir) e as colunas
+                      'nota_col_n', agrupadas por variante.
+    """
+    notas = _notas_bloco(
+        _bloco_numerico(df, colunas), tipo, variantes, teste_normalidade
+    )
+    resultado = {}
+    if "id" in df.columns:
+        resultado["id"] = df["id"].array
+    for variante in variantes:
+        for j, col in enumerate(colunas):
+            resultado[f"nota_{col}_{variante}"] = notas[variante][:, j]
+    return pd.DataFrame(resultado, index=df.index)
+
+
+def nota_valor_1(df: pd.DataFrame, colunas: List[str]) -> pd.DataFrame:
+    """
+    Calcula notas (_1) para colunas de valor, baseadas na distribuição normal
+    da coluna transformada por logaritmo natural.
 
     Assume que a coluna 'id' existe no DataFrame de entrada.
-    Realiza todos os cálculos intermediários necessários.
+    Realiza todos os cálculos intermediários necessários (log, teste KS, média, sd).
 
     Args:
         df (pd.DataFrame): O DataFrame contendo os dados originais e a coluna 'id'.
@@ -163,160 +409,33 @@ def nota_valor_2(df: pd.DataFrame, colunas: List[str]) -> pd.DataFrame:
 
     Returns:
         pd.DataFrame: Um DataFrame contendo a coluna 'id' e as colunas
-                      de nota calculadas ('nota_col_2'). Notas não atribuídas
+                      de nota calculadas ('nota_col_1'). Notas não atribuídas
                       pelas condições permanecerão como NaN.
     """
-    df = df.copy()
-    nota_cols_final = []
-
-    for col in colunas:
-        log_col_name = f"{col}_ln"
-
-        # Lidar com coluna original toda NaN
-        numeric_col_check = pd.to_numeric(df[col], errors="coerce")
-        if numeric_col_check.isnull().all():
-            if log_col_name not in df.columns:
-                df[log_col_name] = np.nan
-            outlier_col = f"outlier_{col}"
-            prob_ks_col = f"Prob_KS_{log_col_name}"
-            mean_col = f"{log_col_name}_mean"
-            sd_col = f"{log_col_name}_sd"
-            mean_minus_sd_col = f"{log_col_name}_mean_menos_sd"
-            mean_plus_sd_col = f"{log_col_name}_mean_mais_sd"
-            nota_col = f"nota_{col}_2"
-            for c_name in [
-                outlier_col,
-                prob_ks_col,
-                mean_col,
-                sd_col,
-                mean_minus_sd_col,
-                mean_plus_sd_col,
-                nota_col,
-            ]:
-                if c_name not in df.columns:
-                    df[c_name] = np.nan
-            nota_cols_final.append(nota_col)
-            if log_col_name in df.columns and df[log_col_name].isnull().all():
-                try:
-                    del df[log_col_name]
-                except KeyError:
-                    pass
-            continue
-
-        with warnings.catch_warnings():
-            warnings.simplefilter("ignore", category=RuntimeWarning)
-            df[log_col_name] = np.log(numeric_col_check.where(numeric_col_check > 0))
-        df[log_col_name] = df[log_col_name].replace([np.inf, -np.inf], np.nan)
-
-        # Média e Desvio Padrão Gerais
-        mean_col = f"{log_col_name}_mean"
-        sd_col = f"{log_col_name}_sd"
-        col_mean = df[log_col_name].mean()
-        col_sd = df[log_col_name].std(ddof=1)
-        df[mean_col] = col_mean
-        df[sd_col] = col_sd
-
-        # Cálculo do Z-Score
-        temp_z_score_col = pd.Series(np.nan, index=df.index)
-        if pd.notna(col_sd) and col_sd != 0:
-            temp_z_score_col = (df[log_col_name] - col_mean) / col_sd
-
-        # Identificação de Outliers (Threshold +/- 3)
-        outlier_col = f"outlier_{col}"
-        df[outlier_col] = np.nan
-        df.loc[df[log_col_name].notna(), outlier_col] = 0
-        df.loc[temp_z_score_col < -3, outlier_col] = 1
-        df.loc[temp_z_score_col > 3, outlier_col] = 2
-
-        # Filtragem TEMPORÁRIA para K-S (Z entre -3 e 3)
-        ks_filter_mask = df[outlier_col] == 0
-        data_for_ks_filtered = df.loc[ks_filter_mask, log_col_name]
-
-        # Realizar Teste K-S (Lilliefors) nos dados filtrados
-        p_value_filtered = np.nan
-        if len(data_for_ks_filtered) >= 5:
-            try:
-                ks_stat, p_value_filtered = lilliefors(
-                    data_for_ks_filtered, dist="norm"
-                )
-            except Exception:
-                p_value_filtered = np.nan
-        prob_ks_col = f"Prob_KS_{log_col_name}"
-        df[prob_ks_col] = p_value_filtered
-
-        # Calcular Limites (usando média/dp gerais)
-        mean_minus_sd_col = f"{log_col_name}_mean_menos_sd"
-        mean_plus_sd_col = f"{log_col_name}_mean_mais_sd"
-        if pd.notna(col_mean) and pd.notna(col_sd):
-            df[mean_minus_sd_col] = col_mean - col_sd
-            df[mean_plus_sd_col] = col_mean + col_sd
-        else:
-            df[mean_minus_sd_col] = np.nan
-            df[mean_plus_sd_col] = np.nan
-
-        #  Cálculo da Nota (_2)
-        nota_col = f"nota_{col}_2"
-        nota_cols_final.append(nota_col)
-        df[nota_col] = np.nan
 
-        cond_zero_or_neg = numeric_col_check.notna() & df[log_col_name].isna()
+    return calcular_notas_tipo(df, colunas, "valor", variantes=(1,))
 
-        p_val_check = df[prob_ks_col].fillna(0) >= 0.05
 
-        condA = p_val_check & (df[outlier_col] == 1)
-        condB = p_val_check & (df[outlier_col] == 2)
-        condC = (
-            p_val_check
-            & (df[outlier_col] == 0)
-            & (df[log_col_name] < df[mean_minus_sd_col])
-        )
-        condD = (
-            p_val_check
-            & (df[outlier_col] == 0)
-            & (df[log_col_name] >= df[mean_minus_sd_col])
-            & (df[log_col_name] < df[mean_col])
-        )
-        condE = (
-            p_val_check
-            & (df[outlier_col] == 0)
-            & (df[log_col_name] >= df[mean_col])
-            & (df[log_col_name] < df[mean_plus_sd_col])
-        )
-        condF = (
-            p_val_check
-            & (df[outlier_col] == 0)
-            & (df[log_col_name] >= df[mean_plus_sd_col])
-        )
+def nota_valor_2(df: pd.DataFrame, colunas: List[str]) -> pd.DataFrame:
+    """
+    Calcula notas (_2) para colunas de valor, considerando outliers (+/- 3 SD)
+    e realizando teste K-S em dados filtrados.
 
-        conditions = [cond_zero_or_neg, condA, condB, condC, condD, condE, condF]
-        choices = [-1, -1, 5, -1, 1, 3, 5]
+    Assume que a coluna 'id' existe no DataFrame de entrada.
+    Realiza todos os cálculos intermediários necessários.
 
-        df[nota_col] = np.select(conditions, choices, default=np.nan)
+    Args:
+        df (pd.DataFrame): O DataFrame contendo os dados originais e a coluna 'id'.
+        colunas (list): Uma lista de nomes das colunas de *valor* originais
+                           a serem processadas.
 
-        # Limpeza de Colunas Intermediárias
-        cols_to_delete = [
-            log_col_name,
-            mean_col,
-            sd_col,
-            outlier_col,
-            prob_ks_col,
-            mean_minus_sd_col,
-            mean_plus_sd_col,
-        ]
-        for c_del in cols_to_delete:
-            if c_del in df.columns:
-                try:
-                    del df[c_del]
-                except KeyError:
-                    pass
-
-    #  Selecionar colunas finais
-    cols_to_keep_final = []
-    if "id" in df.columns:
-        cols_to_keep_final.append("id")
-    cols_to_keep_final.extend([nc for nc in nota_cols_final if nc in df.columns])
+    Returns:
+        pd.DataFrame: Um DataFrame contendo a coluna 'id' e as colunas
+                      de nota calculadas ('nota_col_2'). Notas não atribuídas
+                      pelas condições permanecerão como NaN.
+    """
 
-    return df[cols_to_keep_final].copy()
+    return calcular_notas_tipo(df, colunas, "valor", variantes=(2,))
 
 
 def nota_valor_3(df: pd.DataFrame, colunas: List[str]) -> pd.DataFrame:
@@ -337,106 +456,8 @@ def nota_valor_3(df: pd.DataFrame, colunas: List[str]) -> pd.DataFrame:
                       de nota calculadas ('nota_col_3'). Notas não atribuídas
                       pelas condições permanecerão como NaN.
     """
-    df = df.copy()
-    nota_cols_final = []
-
-    for col in colunas:
-        log_col_name = f"{col}_ln"
-        outlier_col = f"outlier_{col}"
-        nota_col = f"nota_{col}_3"
-        nota_cols_final.append(nota_col)
-
-        # Tentar converter para numérico, tratando erros
-        numeric_col_check = pd.to_numeric(df[col], errors="coerce")
-
-        # Calcular log, tratando 0 e negativos como NaN
-        with warnings.catch_warnings():
-            warnings.simplefilter("ignore", category=RuntimeWarning)
-            # Usar numeric_col_check que já tratou não-números como NaN
-            df[log_col_name] = np.log(numeric_col_check.where(numeric_col_check > 0))
-        df[log_col_name] = df[log_col_name].replace([np.inf, -np.inf], np.nan)
-
-        # Calcular Outliers (Threshold +/- 3 SD) - SOMENTE se houver dados no log
-        col_mean = df[log_col_name].mean()
-        col_sd = df[log_col_name].std(ddof=1)
-
-        temp_z_score_col = pd.Series(np.nan, index=df.index)
-        # Calcular Z-score apenas se sd for válido e não zero
-        if pd.notna(col_sd) and col_sd != 0 and pd.notna(col_mean):
-            temp_z_score_col = (df[log_col_name] - col_mean) / col_sd
-
-        # Inicializar coluna outlier com NaN
-        df[outlier_col] = np.nan
-        # Marcar como 0 (não outlier) apenas onde o log NÃO é NaN
-        df.loc[df[log_col_name].notna(), outlier_col] = 0
-        # Marcar outliers onde Z-score foi calculado e excede o threshold
-        df.loc[temp_z_score_col < -3, outlier_col] = 1  # Threshold -3
-        df.loc[temp_z_score_col > 3, outlier_col] = 2  # Threshold +3
-
-        # Filtrar e Calcular Quartis
-        # Considerar apenas não-outliers (0) e onde log não é NaN
-        quartile_filter_mask = (df[outlier_col] == 0) & df[log_col_name].notna()
-        data_for_quartiles = df.loc[quartile_filter_mask, log_col_name]
-
-        k25, k50, k75 = np.nan, np.nan, np.nan  # Valores padrão
-        if (
-            not data_for_quartiles.empty and len(data_for_quartiles.dropna()) >= 4
-        ):  # Precisa de pontos suficientes para quartis
-            try:
-                quantiles = data_for_quartiles.quantile([0.25, 0.50, 0.75])
 
-                k25 = quantiles.get(0.25, np.nan)
-                k50 = quantiles.get(0.50, np.nan)
-                k75 = quantiles.get(0.75, np.nan)
-            except Exception:
-                k25, k50, k75 = np.nan, np.nan, np.nan
-
-        # Cálculo da Nota (_3)
-        df[nota_col] = np.nan  # Inicializa a coluna de nota
-
-        # Condição especial: Original não nulo, mas _ln é nulo
-        cond_missing = numeric_col_check.notna() & df[log_col_name].isna()
-
-        # Condições baseadas nos quartis (só aplicáveis se quartis foram calculados e log não é NaN)
-        # Checar se os quartis não são NaN antes de usar na condição
-        cond1 = pd.notna(k25) & df[log_col_name].notna() & (df[log_col_name] <= k25)
-        cond2 = (
-            pd.notna(k25)
-            & pd.notna(k50)
-            & df[log_col_name].notna()
-            & (df[log_col_name] > k25)
-            & (df[log_col_name] <= k50)
-        )
-        cond3 = (
-            pd.notna(k50)
-            & pd.notna(k75)
-            & df[log_col_name].notna()
-            & (df[log_col_name] > k50)
-            & (df[log_col_name] <= k75)
-        )
-        cond4 = pd.notna(k75) & df[log_col_name].notna() & (df[log_col_name] > k75)
-        conditions = [cond_missing, cond1, cond2, cond3, cond4]
-        choices = [-1, -1, 1, 3, 5]
-        df[nota_col] = np.select(conditions, choices, default=np.nan)
-
-        # Limpeza de Colunas Intermediárias
-        cols_to_delete = [log_col_name, outlier_col]
-        for c_del in cols_to_delete:
-            if c_del in df.columns:
-                try:
-                    del df[c_del]
-                except KeyError:
-                    pass
-
-    # Selecionar colunas finais
-    cols_to_keep_final = []
-    if "id" in df.columns:
-        cols_to_keep_final.append("id")
-    # Garantir que apenas colunas de nota realmente criadas sejam mantidas
-    cols_to_keep_final.extend([nc for nc in nota_cols_final if nc in df.columns])
-    existing_cols_to_keep = [col for col in cols_to_keep_final if col in df.columns]
-
-    return df[existing_cols_to_keep].copy()
+    return calcular_notas_tipo(df, colunas, "valor", variantes=(3,))
 
 
 def nota_taxa_1(df: pd.DataFrame, colunas: List[str]) -> pd.DataFrame:
@@ -458,149 +479,8 @@ def nota_taxa_1(df: pd.DataFrame, colunas: List[str]) -> pd.DataFrame:
                       pelas condições (incluindo p-valor KS < 0.05)
                       permanecerão como NaN.
     """
-    df = df.copy()
-    nota_cols_final = []
-    for col in colunas:
-        # Encontra o mínimo da coluna
-        min_val = df[col].min()
-
-        if df[col].isnull().all():
-            # Criar colunas resultantes com NaN
-            shifted_col_name = f"{col}_min"
-            log_col_name = f"{col}_min_ln"
-            prob_ks_col = f"Prob_KS_{log_col_name}"
-            mean_col = f"{log_col_name}_mean"
-            sd_col = f"{log_col_name}_sd"
-            mean_minus_sd_col = f"{log_col_name}_mean_menos_sd"
-            mean_plus_sd_col = f"{log_col_name}_mean_mais_sd"
-            nota_col = f"nota_{col}_1"
-            for c in [
-                shifted_col_name,
-                log_col_name,
-                prob_ks_col,
-                mean_col,
-                sd_col,
-                mean_minus_sd_col,
-                mean_plus_sd_col,
-                nota_col,
-            ]:
-                if c not in df.columns:  # Evitar sobrescrever se rodar duas vezes
-                    df[c] = np.nan
-            nota_cols_final.append(nota_col)  # Adicionar à lista de notas
-            continue  # Pular para a próxima coluna
-
-        abs_min = np.abs(min_val) if pd.notna(min_val) else 0
-
-        shifted_col_name = f"{col}_min"
-        df[shifted_col_name] = abs_min + df[col]
-
-        log_col_name = f"{col}_min_ln"
-        # Suprime avisos de log(0 ou negativo) e calcula o log
-        with warnings.catch_warnings():
-            warnings.simplefilter("ignore", category=RuntimeWarning)
-            df[log_col_name] = np.log(df[shifted_col_name])
-            # Substitui -inf (resultado de log(0)) ou +inf por NaN
-        df[log_col_name] = df[log_col_name].replace([np.inf, -np.inf], np.nan)
-
-        # --- Teste K-S (Equivalente a NPAR TESTS e manipulação OMS) ---
-        prob_ks_col = f"Prob_KS_{log_col_name}"
-        data_for_ks = df[log_col_name].dropna()
-
-        p_value = np.nan  # Valor padrão caso o teste não possa ser realizado
-
-        # O teste K-S e Lilliefors precisam de um número mínimo de pontos
-        if len(data_for_ks) >= 5:  # Um mínimo razoável, ajuste se necessário
-            ks_stat, p_value = lilliefors(data_for_ks, dist="norm")
-        else:
-            print(
-                f"  Aviso: Não há dados suficientes ({len(data_for_ks)}) para teste K-S em {log_col_name}."
-            )
-        # Adiciona o p-valor como uma coluna constante para todas as linhas (como MATCH FILES)
-        df[prob_ks_col] = p_value
-        # O comando LAG do SPSS provavelmente não é necessário aqui, pois o p-valor é constante.
-
-        # Média e Desvio Padrão
-        mean_col = f"{log_col_name}_mean"
-        sd_col = f"{log_col_name}_sd"
-        mean_minus_sd_col = f"{log_col_name}_mean_menos_sd"
-        mean_plus_sd_col = f"{log_col_name}_mean_mais_sd"
-
-        col_mean = df[log_col_name].mean()
-        col_sd = df[log_col_name].std(ddof=1)  # ddof=1 para desvio padrão amostral
-
-        df[mean_col] = col_mean
-        df[sd_col] = col_sd
-
-        # Calcula os limites apenas se a média e o desvio padrão puderem ser calculados
-        if pd.notna(col_mean) and pd.notna(col_sd):
-            df[mean_minus_sd_col] = col_mean - col_sd
-            df[mean_plus_sd_col] = col_mean + col_sd
-        else:
-            print(
-                f"  Aviso: Média ou Desvio Padrão não puderam ser calculados para {log_col_name}."
-            )
-            df[mean_minus_sd_col] = np.nan
-            df[mean_plus_sd_col] = np.nan
-
-        # Cálculo da Nota
-        nota_col = f"nota_{col}_1"
-        nota_cols_final.append(nota_col)  # Adiciona à lista de colunas de nota
-
-        # Inicializar a coluna de nota com NaN
-        df[nota_col] = np.nan
-
-        # Condições
-        # Condição 1: p-valor >= 0.05 (Normal) E log_val < mean - sd
-        cond1 = (df[prob_ks_col] >= 0.05) & (df[log_col_name] < df[mean_minus_sd_col])
-        # Condição 2: p-valor >= 0.05 (Normal) E mean - sd <= log_val < mean
-        cond2 = (
-            (df[prob_ks_col] >= 0.05)
-            & (df[log_col_name] >= df[mean_minus_sd_col])
-            & (df[log_col_name] < df[mean_col])
-        )
-        # Condição 3: p-valor >= 0.05 (Normal) E mean <= log_val < mean + sd
-        cond3 = (
-            (df[prob_ks_col] >= 0.05)
-            & (df[log_col_name] >= df[mean_col])
-            & (df[log_col_name] < df[mean_plus_sd_col])
-        )
-        # Condição 4: p-valor >= 0.05 (Normal) E log_val >= mean + sd
-        cond4 = (df[prob_ks_col] >= 0.05) & (df[log_col_name] >= df[mean_plus_sd_col])
-        # Condição 5: p-valor >= 0.05 (Normal) E valor original não é nulo E log_val é nulo
-        cond5 = (
-            (df[prob_ks_col] >= 0.05) & (df[col].notna()) & (df[log_col_name].isna())
-        )
-
-        conditions = [
-            cond5,  # Verificar esta condição primeiro
-            cond1,
-            cond2,
-            cond3,
-            cond4,
-        ]
-        choices = [
-            -1,  # Valor para cond5
-            -1,  # Valor para cond1
-            1,  # Valor para cond2
-            3,  # Valor para cond3
-            5,  # Valor para cond4
-        ]
-
-        # Aplicar as condições. O default é NaN (onde nenhuma condição é atendida)
-        df[nota_col] = np.select(conditions, choices, default=np.nan)
-
-        # Recodificar os NaNs restantes para 0
-        # df[nota_col] = df[nota_col].fillna(0)
-
-    # Selecionar as colunas a serem mantidas
-    cols_to_keep_final = []
-    cols_to_keep_final.append("id")
-    # Adicionar apenas as colunas de nota que foram realmente geradas
-    cols_to_keep_final.extend([nc for nc in nota_cols_final if nc in df.columns])
 
-    df = df[cols_to_keep_final].copy()
-
-    return df
+    return calcular_notas_tipo(df, colunas, "taxa", variantes=(1,))
 
 
 def nota_taxa_2(df: pd.DataFrame, colunas: List[str]) -> pd.DataFrame:
@@ -619,126 +499,9 @@ def nota_taxa_2(df: pd.DataFrame, colunas: List[str]) -> pd.DataFrame:
                       de nota calculadas ('nota_col_2'). Notas não atribuídas
                       pelas condições são recodificadas para 0.
     """
-    # Trabalhar em cópia apenas das colunas necessárias + id
-    cols_to_use = ["id"] + colunas
-    cols_existentes = [c for c in cols_to_use if c in df.columns]
-    if "id" not in cols_existentes and len(cols_existentes) > 0:
-        if "id" in df.columns:
-            cols_existentes.insert(0, "id")
-
-    if not cols_existentes or (len(cols_existentes) == 1 and "id" in cols_existentes):
-        return pd.DataFrame({"id": df["id"]}) if "id" in df.columns else pd.DataFrame()
 
-    df = df[cols_existentes].copy()
-    nota_cols_final = []
-
-    for col in colunas:
-        if col not in df.columns:
-            continue
-
-        nota_col = f"nota_{col}_2"
-        nota_cols_final.append(nota_col)
-
-        # Shift e Log (calculados como Series)
-        min_val = df[col].min()
-        log_col_series = pd.Series(np.nan, index=df.index)
-
-        if not df[col].isnull().all():
-            abs_min = np.abs(min_val) if pd.notna(min_val) else 0
-            temp_shifted_col = abs_min + df[col]
-            with warnings.catch_warnings():
-                warnings.simplefilter("ignore", category=RuntimeWarning)
-                log_col_series = np.log(temp_shifted_col)
-            log_col_series = log_col_series.replace([np.inf, -np.inf], np.nan)
-
-        #  Cálculos Intermediários
-        col_mean = np.nan
-        col_sd = np.nan
-        mean_minus_sd = np.nan
-        mean_plus_sd = np.nan
-        p_value_filtered = np.nan
-        z_score_series = pd.Series(np.nan, index=df.index)
-        outlier_series = pd.Series(np.nan, index=df.index)
-
-        if not log_col_series.isnull().all():
-            col_mean = log_col_series.mean()
-            col_sd = log_col_series.std(ddof=1)
-
-            if pd.notna(col_mean) and pd.notna(col_sd):
-                mean_minus_sd = col_mean - col_sd
-                mean_plus_sd = col_mean + col_sd
-
-            if pd.notna(col_sd) and col_sd != 0:
-                z_score_series = (log_col_series - col_mean) / col_sd
-
-            outlier_series.loc[log_col_series.notna()] = 0
-            outlier_series.loc[z_score_series < -2] = 1
-            outlier_series.loc[z_score_series > 2] = 2
-
-            # Filtragem TEMPORÁRIA para K-S
-            ks_filter_mask = (
-                log_col_series.notna() & (z_score_series > -3) & (z_score_series < 3)
-            )
-            data_for_ks_filtered = log_col_series[ks_filter_mask]
-
-            if len(data_for_ks_filtered) >= 5:
-                try:
-                    ks_stat, p_value_filtered = lilliefors(
-                        data_for_ks_filtered, dist="norm"
-                    )
-                except Exception:
-                    p_value_filtered = np.nan
-
-        #  Cálculo da Nota (_2)
-        df[nota_col] = np.nan
-
-        p_val_check_scalar = pd.notna(p_value_filtered) and (p_value_filtered >= 0.05)
-
-        if p_val_check_scalar:
-            condA = outlier_series == 1
-            condB = outlier_series == 2
-            condG = df[col].notna() & log_col_series.isna()
-            condC = (
-                (outlier_series == 0)
-                & pd.notna(mean_minus_sd)
-                & (log_col_series < mean_minus_sd)
-            )
-            condD = (
-                (outlier_series == 0)
-                & pd.notna(mean_minus_sd)
-                & pd.notna(col_mean)
-                & (log_col_series >= mean_minus_sd)
-                & (log_col_series < col_mean)
-            )
-            condE = (
-                (outlier_series == 0)
-                & pd.notna(col_mean)
-                & pd.notna(mean_plus_sd)
-                & (log_col_series >= col_mean)
-                & (log_col_series < mean_plus_sd)
-            )
-            condF = (
-                (outlier_series == 0)
-                & pd.notna(mean_plus_sd)
-                & (log_col_series >= mean_plus_sd)
-            )
-
-            conditions = [condA, condB, condG, condC, condD, condE, condF]
-            choices = [-1, 5, -1, -1, 1, 3, 5]
-
-            df[nota_col] = np.select(conditions, choices, default=np.nan)
-
-        # Recodificar os NaNs restantes para 0
-        df[nota_col] = df[nota_col].fillna(0)
-
-    #  Selecionar colunas finais
-    cols_to_keep_final = []
-    id_col_name = "id"
-    if id_col_name in df.columns:
-        cols_to_keep_final.append(id_col_name)
-    cols_to_keep_final.extend([nc for nc in nota_cols_final if nc in df.columns])
-
-    return df[cols_to_keep_final].copy()
+    colunas = [col for col in colunas if col in df.columns]
+    return calcular_notas_tipo(df, colunas, "taxa", variantes=(2,))
 
 
 def nota_taxa_3(df: pd.DataFrame, colunas: List[str]) -> pd.DataFrame:
@@ -759,98 +522,8 @@ def nota_taxa_3(df: pd.DataFrame, colunas: List[str]) -> pd.DataFrame:
                       de nota calculadas ('nota_col_3'). Notas não atribuídas
                       pelas condições permanecerão como NaN.
     """
-    df = df.copy()
-    nota_cols_final = []
-
-    for col in colunas:
-        min_val = df[col].min()
-        log_col_name = f"{col}_min_ln"  # Nome da coluna de log
-
-        # Lidar com coluna original toda NaN
-        if df[col].isnull().all():
-            outlier_col = f"outlier_{col}"
-            nota_col = f"nota_{col}_3"
-            for c_name in [log_col_name, outlier_col, nota_col]:
-                if c_name not in df.columns:
-                    df[c_name] = np.nan
-            nota_cols_final.append(nota_col)
-            continue
-
-        abs_min = np.abs(min_val) if pd.notna(min_val) else 0
-
-        temp_shifted_col = abs_min + df[col]  # Série temporária
-
-        with warnings.catch_warnings():
-            warnings.simplefilter("ignore", category=RuntimeWarning)
-            df[log_col_name] = np.log(temp_shifted_col)
-        df[log_col_name] = df[log_col_name].replace([np.inf, -np.inf], np.nan)
-
-        # Calcular Outliers
-        col_mean = df[log_col_name].mean()
-        col_sd = df[log_col_name].std(ddof=1)
-
-        temp_z_score_col = pd.Series(np.nan, index=df.index)
-        if pd.notna(col_sd) and col_sd != 0:
-            temp_z_score_col = (df[log_col_name] - col_mean) / col_sd
-
-        outlier_col = f"outlier_{col}"
-        df[outlier_col] = np.nan
-        df.loc[df[log_col_name].notna(), outlier_col] = 0
-        df.loc[temp_z_score_col < -2, outlier_col] = 1
-        df.loc[temp_z_score_col > 2, outlier_col] = 2
-
-        # Filtrar e Calcular Quartis
-        quartile_filter_mask = (df[outlier_col] == 0) & df[log_col_name].notna()
-        data_for_quartiles = df.loc[quartile_filter_mask, log_col_name]
-
-        k25, k50, k75 = np.nan, np.nan, np.nan
-        if not data_for_quartiles.empty:
-            quantiles = data_for_quartiles.quantile([0.25, 0.50, 0.75])
-            if 0.25 in quantiles.index:
-                k25 = quantiles.loc[0.25]
-            if 0.50 in quantiles.index:
-                k50 = quantiles.loc[0.50]
-            if 0.75 in quantiles.index:
-                k75 = quantiles.loc[0.75]
-
-        #  Cálculo da Nota (_3)
-        nota_col = f"nota_{col}_3"
-        nota_cols_final.append(nota_col)
-        df[nota_col] = np.nan
-
-        cond_missing = df[col].notna() & df[log_col_name].isna()
-        cond1 = pd.notna(k25) & (df[log_col_name] <= k25)
-        cond2 = (
-            pd.notna(k25)
-            & pd.notna(k50)
-            & (df[log_col_name] > k25)
-            & (df[log_col_name] <= k50)
-        )
-        cond3 = (
-            pd.notna(k50)
-            & pd.notna(k75)
-            & (df[log_col_name] > k50)
-            & (df[log_col_name] <= k75)
-        )
-        cond4 = pd.notna(k75) & (df[log_col_name] > k75)
 
-        conditions = [cond_missing, cond1, cond2, cond3, cond4]
-        choices = [-1, -1, 1, 3, 5]
-        df[nota_col] = np.select(conditions, choices, default=np.nan)
-
-        # Limpeza
-        if log_col_name in df.columns:
-            del df[log_col_name]
-        if outlier_col in df.columns:
-            del df[outlier_col]
-
-    # Selecionar colunas finais
-    cols_to_keep_final = []
-    if "id" in df.columns:
-        cols_to_keep_final.append("id")
-    cols_to_keep_final.extend([nc for nc in nota_cols_final if nc in df.columns])
-
-    return df[cols_to_keep_final].copy()
+    return calcular_notas_tipo(df, colunas, "taxa", variantes=(3,))
 
 
 def nota_participacao_1(df: pd.DataFrame, colunas: List[str]) -> pd.DataFrame:
@@ -870,85 +543,8 @@ def nota_participacao_1(df: pd.DataFrame, colunas: List[str]) -> pd.DataFrame:
     Returns:
         pd.DataFrame: DataFrame com 'id' e 'nota_col_1' calculadas.
     """
-    df_result = df[["id"]].copy()
 
-    for col in colunas:
-        nota_col = f"nota_{col}_1"
-
-        numeric_col_check = pd.to_numeric(df[col], errors="coerce")
-        col_data_for_stats = numeric_col_check.replace(
-            0, np.nan
-        )  # Zeros como NaN para stats
-
-        # --- Cálculos Stats (sem zeros) ---
-        data_for_ks = col_data_for_stats.dropna()
-        p_value = np.nan
-        if len(data_for_ks) >= 5:
-            try:
-                ks_stat, p_value = lilliefors(data_for_ks, dist="norm")
-            except Exception:
-                p_value = np.nan
-        prob_ks_check = (p_value >= 0.05) if pd.notna(p_value) else False
-
-        col_mean = col_data_for_stats.mean()
-        col_sd = col_data_for_stats.std(ddof=1)
-
-        # Calcular limites apenas se mean e sd forem válidos
-        mean_minus_sd = np.nan
-        mean_plus_sd = np.nan
-        is_sd_zero = pd.notna(col_sd) and col_sd == 0
-        is_sd_positive = pd.notna(col_sd) and col_sd > 0
-
-        if is_sd_positive and pd.notna(col_mean):
-            mean_minus_sd = col_mean - col_sd
-            mean_plus_sd = col_mean + col_sd
-        elif is_sd_zero and pd.notna(col_mean):  # Caso sd=0
-            mean_minus_sd = col_mean
-            mean_plus_sd = col_mean
-
-        # --- Definição das Condições para np.select ---
-        # Aplicadas à coluna numérica original
-        # Só avaliar se os limites são válidos
-        if pd.notna(mean_minus_sd):
-            # Condições Base (sem incluir o check de p-valor ainda)
-            base_cond_eq_0 = numeric_col_check == 0
-            base_cond_eq_100 = numeric_col_check == 100
-            base_cond_sd_zero_at_mean = is_sd_zero & (numeric_col_check == col_mean)
-            # Condições de banda válidas apenas se sd > 0
-            base_cond_lt_msd = is_sd_positive & (numeric_col_check < mean_minus_sd)
-            base_cond_bt_msd_m = (
-                is_sd_positive
-                & (numeric_col_check >= mean_minus_sd)
-                & (numeric_col_check < col_mean)
-            )
-            base_cond_bt_m_psd = (
-                is_sd_positive
-                & (numeric_col_check >= col_mean)
-                & (numeric_col_check < mean_plus_sd)
-            )
-            base_cond_gt_psd = is_sd_positive & (numeric_col_check >= mean_plus_sd)
-
-            # Combinar com prob_ks_check e ordenar por prioridade SPSS (0, 100, sd=0, bandas)
-            conditions = [
-                prob_ks_check & base_cond_eq_0,  # Nota -1
-                prob_ks_check & base_cond_eq_100,  # Nota 5
-                prob_ks_check
-                & base_cond_sd_zero_at_mean,  # Nota 1 (assumido para sd=0)
-                prob_ks_check & base_cond_lt_msd,  # Nota -1
-                prob_ks_check & base_cond_bt_msd_m,  # Nota 1
-                prob_ks_check & base_cond_bt_m_psd,  # Nota 3
-                prob_ks_check & base_cond_gt_psd,  # Nota 5
-            ]
-            choices = [-1, 5, 1, -1, 1, 3, 5]  # Notas correspondentes
-            default_value = np.nan  # Se nenhuma condição for True (inclui p<0.05)
-
-            # Calcular e atribuir a nota ao DataFrame resultado
-            df_result[nota_col] = np.select(conditions, choices, default=default_value)
-
-        else:  # Caso onde mean ou sd não puderam ser calculados
-            df_result[nota_col] = np.nan
-
-    return df_result
+    return calcular_notas_tipo(df, colunas, "participacao", variantes=(1,))
 
 
 def nota_participacao_2(df: pd.DataFrame, colunas: List[str]) -> pd.DataFrame:
@@ -971,117 +567,8 @@ def nota_participacao_2(df: pd.DataFrame, colunas: List[str]) -> pd.DataFrame:
     Returns:
         pd.DataFrame: DataFrame com 'id' e 'nota_col_2' calculadas.
     """
-    df_result = df[["id"]].copy()
 
-    for col in colunas:
-        nota_col = f"nota_{col}_2"
-
-        numeric_col_check = pd.to_numeric(df[col], errors="coerce")
-        col_data_for_stats = numeric_col_check
-
-        # Pular se coluna numérica for toda NaN
-        if col_data_for_stats.isnull().all():
-            df_result[nota_col] = np.nan
-            continue
-
-        # --- Cálculos Stats (COM zeros) ---
-        col_mean = col_data_for_stats.mean()
-        col_sd = col_data_for_stats.std(ddof=1)
-
-        # Calcular Z-Score (COM zeros)
-        temp_z_score_col = pd.Series(np.nan, index=df.index)
-        # Z-score é NaN se sd=NaN, sd=0, mean=NaN ou valor=NaN
-        if pd.notna(col_sd) and col_sd != 0 and pd.notna(col_mean):
-            mask_notna = col_data_for_stats.notna()
-            temp_z_score_col.loc[mask_notna] = (
-                col_data_for_stats[mask_notna] - col_mean
-            ) / col_sd
-
-        # --- KS Test (em dados não-missing, não-outliers) ---
-        # Filtro SPSS: not missing(...) and (Z > -3 and Z < 3)
-        # Equivalente a Z-score não ser NaN e estar entre -3 e 3
-        ks_filter_mask = temp_z_score_col.between(
-            -3, 3, inclusive="neither"
-        )  # 'neither' = exclusivo
-        # Teste KS feito nos dados originais (com zeros) filtrados
-        data_for_ks_filtered = col_data_for_stats[ks_filter_mask]
-
-        p_value_filtered = np.nan
-        if len(data_for_ks_filtered.dropna()) >= 5:
-            try:
-                ks_stat, p_value_filtered = lilliefors(
-                    data_for_ks_filtered.dropna(), dist="norm"
-                )
-            except Exception:
-                p_value_filtered = np.nan
-        prob_ks_check = (
-            (p_value_filtered >= 0.05) if pd.notna(p_value_filtered) else False
-        )
-
-        # --- Calcular Limites (usando Mean/SD com zeros) ---
-        mean_minus_sd = np.nan
-        mean_plus_sd = np.nan
-        # Calcular limites apenas se Média e SD são válidos
-        if pd.notna(col_mean) and pd.notna(col_sd):
-            # Se sd=0, os limites serão iguais à média
-            mean_minus_sd = col_mean - col_sd
-            mean_plus_sd = col_mean + col_sd
-
-        # --- Definição das Condições Base para np.select ---
-        # Aplicadas à coluna numérica original e ao Z-score calculado
-        base_cond_eq_0 = numeric_col_check == 0
-        base_cond_eq_100 = numeric_col_check == 100
-        # Definir condições de outlier diretamente do Z-score
-        # Precisamos checar se Z não é NaN antes da comparação
-        base_cond_outlier_1 = temp_z_score_col.notna() & (temp_z_score_col < -3)
-        base_cond_outlier_2 = temp_z_score_col.notna() & (temp_z_score_col > 3)
-        # Condição para ser um não-outlier válido (Z existe e está entre -3 e 3)
-        is_valid_non_outlier_z = ks_filter_mask
-
-        # Condições de banda (aplicadas apenas se for não-outlier válido E limites válidos)
-        base_cond_band_1 = pd.Series(False, index=df.index)
-        base_cond_band_2 = pd.Series(False, index=df.index)
-        base_cond_band_3 = pd.Series(False, index=df.index)
-        base_cond_band_4 = pd.Series(False, index=df.index)
-
-        if pd.notna(mean_minus_sd):
-            base_cond_band_1 = is_valid_non_outlier_z & (
-                numeric_col_check < mean_minus_sd
-            )
-            base_cond_band_2 = (
-                is_valid_non_outlier_z
-                & (numeric_col_check >= mean_minus_sd)
-                & (numeric_col_check < col_mean)
-            )
-            base_cond_band_3 = (
-                is_valid_non_outlier_z
-                & (numeric_col_check >= col_mean)
-                & (numeric_col_check < mean_plus_sd)
-            )
-            base_cond_band_4 = is_valid_non_outlier_z & (
-                numeric_col_check >= mean_plus_sd
-            )
-
-        # --- Atribuição da Nota via np.select (replicando IFs e prioridade SPSS) ---
-        conditions = [
-            prob_ks_check & base_cond_eq_0,  # P1: 0 (-1)
-            prob_ks_check & base_cond_eq_100,  # P2: 100 (5)
-            prob_ks_check & base_cond_outlier_1,  # P3: Outlier Low (-1)
-            prob_ks_check & base_cond_outlier_2,  # P4: Outlier High (5)
-            prob_ks_check & base_cond_band_1,  # P5: Band 1 (-1)
-            prob_ks_check & base_cond_band_2,  # P6: Band 2 (1)
-            prob_ks_check & base_cond_band_3,  # P7: Band 3 (3)
-            prob_ks_check & base_cond_band_4,  # P8: Band 4 (5)
-        ]
-        choices = [-1, 5, -1, 5, -1, 1, 3, 5]  # Notas correspondentes
-        default_value = (
-            np.nan
-        )  # Se nenhuma condição for True (inclui p<0.05, NaNs originais)
-
-        # Calcular e atribuir a nota ao DataFrame resultado
-        df_result[nota_col] = np.select(conditions, choices, default=default_value)
-
-    return df_result
+    return calcular_notas_tipo(df, colunas, "participacao", variantes=(2,))
 
 
 def nota_participacao_3(df: pd.DataFrame, colunas: List[str]) -> pd.DataFrame:
@@ -1101,86 +588,8 @@ def nota_participacao_3(df: pd.DataFrame, colunas: List[str]) -> pd.DataFrame:
         pd.DataFrame: DataFrame com 'id' e 'nota_col_3' calculadas.
 
     """
-    df = df.copy()
-    nota_cols_final = []
-
-    for col in colunas:
-        nota_col = f"nota_{col}_3"
-        nota_cols_final.append(nota_col)
 
-        numeric_col_check = pd.to_numeric(df[col], errors="coerce")
-        col_data_for_stats = numeric_col_check
-
-        outlier_col = f"outlier_{col}"
-        df[nota_col] = np.nan
-        df[outlier_col] = np.nan
-
-        # Pular se coluna numérica for toda NaN
-        if col_data_for_stats.isnull().all():
-            continue
-
-        # Recalcular Outliers
-        col_mean = col_data_for_stats.mean()
-        col_sd = col_data_for_stats.std(ddof=1)
-        temp_z_score_col = pd.Series(np.nan, index=df.index)
-        if pd.notna(col_sd) and col_sd != 0 and pd.notna(col_mean):
-            mask_notna = col_data_for_stats.notna()
-            temp_z_score_col.loc[mask_notna] = (
-                col_data_for_stats[mask_notna] - col_mean
-            ) / col_sd
-        df.loc[temp_z_score_col.notna(), outlier_col] = 0
-        df.loc[temp_z_score_col < -3, outlier_col] = 1
-        df.loc[temp_z_score_col > 3, outlier_col] = 2
-        # Valores onde Z não pôde ser calculado (NaN original) terão outlier_col = NaN
-
-        # Calcular Quartis (sobre não-outliers, pode incluir zeros)
-        quartile_filter_mask = (df[outlier_col] == 0) & numeric_col_check.notna()
-        data_for_quartiles = numeric_col_check[quartile_filter_mask]
-
-        k25, k50, k75 = np.nan, np.nan, np.nan
-        if not data_for_quartiles.empty and len(data_for_quartiles.dropna()) >= 4:
-            try:
-                # Usar interpolação linear, que é comum e similar a algumas opções do SPSS
-                quantiles = data_for_quartiles.quantile(
-                    [0.25, 0.50, 0.75], interpolation="linear"
-                )
-                k25 = quantiles.get(0.25, np.nan)
-                k50 = quantiles.get(0.50, np.nan)
-                k75 = quantiles.get(0.75, np.nan)
-            except Exception:
-                k25, k50, k75 = np.nan, np.nan, np.nan
-
-        # Aplicar a TODOS os valores não-NaN na coluna original.
-        # Outliers (que não estão no calculo de K) e NaNs originais ficarão NaN.
-
-        # Verificar se K foram calculados antes de definir condições
-        if pd.notna(k25) and pd.notna(k50) and pd.notna(k75):
-            cond_q1 = numeric_col_check <= k25
-            # Garantir exclusividade entre <=k25 e >k25
-            cond_q2 = (numeric_col_check > k25) & (numeric_col_check <= k50)
-            cond_q3 = (numeric_col_check > k50) & (numeric_col_check <= k75)
-            # >k75 cobre o resto dos valores não-NaN
-            cond_q4 = numeric_col_check > k75
-
-            # Ordem é importante se houver sobreposição (não deve haver com > e <=)
-            conditions = [cond_q1, cond_q2, cond_q3, cond_q4]
-            choices = [-1, 1, 3, 5]
-
-            # Aplicar np.select. O default=np.nan lida com NaNs originais
-            # e com os outliers (que não satisfarão nenhuma condição se K são válidos)
-            df[nota_col] = np.select(conditions, choices, default=np.nan)
-        # else: Se os K não puderam ser calculados, a nota permanece NaN.
-
-        del df[outlier_col]
-
-    # Selecionar colunas finais
-    cols_to_keep_final = []
-    if "id" in df.columns:
-        cols_to_keep_final.append("id")
-    cols_to_keep_final.extend([nc for nc in nota_cols_final if nc in df.columns])
-    existing_cols_to_keep = [col for col in cols_to_keep_final if col in df.columns]
-
-    return df[existing_cols_to_keep].copy()
+    return calcular_notas_tipo(df, colunas, "participacao", variantes=(3,))
 
 
 def nota_final(df: pd.DataFrame, colunas: List[str]) -> pd.DataFrame:
@@ -1245,6 +654,63 @@ def nota_final(df: pd.DataFrame, colunas: List[str]) -> pd.DataFrame:
     return df[cols_to_keep].copy()
 
 
+def _nota_final_bloco(notas: dict) -> np.ndarray:
+    """
+    Nota final de cada variável a partir das notas _1, _2 e _3 do kernel:
+    a primeira nota não nula e diferente de zero (mesma regra de nota_final).
+    """
+    final = np.full_like(notas[1], np.nan)
+    for variante in (3, 2, 1):
+        nota = notas[variante]
+        final = np.where(~np.isnan(nota) & (nota != 0), nota, final)
+    return final
+
+
+def _blocos_das_notas(colunas_nota, dicionario_bloco: dict) -> dict:
+    """
+    Agrupa as colunas 'nota_var_X' pelo bloco da variável.
+
+    Returns:
+        dict: {bloco: [colunas de nota do bloco]}, na ordem das colunas.
+    """
+    bloco_para_notas_cols = {}
+    prefixo_chave = "nota_"
+    for col_nota in colunas_nota:
+        if not col_nota.startswith("nota_var_"):
+            continue
+        bloco = dicionario_bloco.get(col_nota[len(prefixo_chave) :])
+        if bloco:
+            bloco_para_notas_cols.setdefault(bloco, []).append(col_nota)
+    return bloco_para_notas_cols
+
+
+def _media_linhas(notas: np.ndarray) -> np.ndarray:
+    """Média de cada linha ignorando NaN (NaN se a linha não tem valores)."""
+    validos = ~np.isnan(notas)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(validos, notas, 0.0).sum(axis=1) / validos.sum(axis=1)
+
+
+def _nota_bloco(notas: np.ndarray, bloco) -> tuple:
+    """
+    Média das notas das variáveis de um bloco (linhas x variáveis) e a nota
+    do bloco (-1, 1, 3, 5), pelas faixas de média +/- sd dessas médias.
+
+    Returns:
+        tuple: (media, nota), arrays com uma posição por linha.
+    """
+    media = _media_linhas(notas)
+    media_geral, sd_geral = _media_dp(media[:, None])
+    if np.isnan(media_geral[0]) or np.isnan(sd_geral[0]) or sd_geral[0] == 0:
+        print(
+            f"Aviso: Média ou SD da coluna 'media_bloco_{bloco}' é NaN. Notas para 'nota_bloco_{bloco}' serão NaN."
+        )
+        return media, np.full(len(media), np.nan)
+
+    limites = np.vstack([media_geral - sd_geral, media_geral, media_geral + sd_geral])
+    return media, _faixas(media[:, None], limites)[:, 0]
+
+
 def calcular_notas_bloco(
     df_variaveis_notas: pd.DataFrame, dicionario_bloco: dict
 ) -> pd.DataFrame:
@@ -1276,87 +742,16 @@ def calcular_notas_bloco(
 
     df_result = df_variaveis_notas.copy()
 
-    bloco_para_notas_cols = {}
-    colunas_de_nota_existentes = [
-        c for c in df_result.columns if c.startswith("nota_var_")
-    ]
-    prefixo_chave = "nota_"
-
-    for col_nota in colunas_de_nota_existentes:
-        var_original_key = col_nota[len(prefixo_chave) :]
-        bloco = dicionario_bloco.get(var_original_key)
-        if bloco:
-            if bloco not in bloco_para_notas_cols:
-                bloco_para_notas_cols[bloco] = []
-            bloco_para_notas_cols[bloco].append(col_nota)
-
-    # Calcular a média e 3. Categorizar para cada bloco
-    blocos_processados = 0
-    for bloco, lista_cols_nota in bloco_para_notas_cols.items():
-        media_col = f"media_bloco_{bloco}"
-        nota_final_col = f"nota_bloco_{bloco}"
-
-        cols_existentes_neste_bloco = [
-            c for c in lista_cols_nota if c in df_result.columns
-        ]
-
-        # Calcular a média das notas para o bloco
+    for bloco, lista_cols_nota in _blocos_das_notas(
+        df_result.columns, dicionario_bloco
+    ).items():
         try:
-            df_result[media_col] = df_result[cols_existentes_neste_bloco].mean(
-                axis=1, skipna=True
-            )
-        except Exception:
-            if media_col in df_result.columns:
-                del df_result[media_col]
-            continue
-
-        # Calcular a nota final para o bloco com base na média e desvio padrão
-        try:
-            # Calcular a média e o desvio padrão das médias para este bloco
-            media_geral_bloco = df_result[media_col].mean()
-            sd_geral_bloco = df_result[media_col].std(ddof=1)
-
-            # Limite inferior e superior baseados na média e desvio padrão
-            # Tratar casos onde o desvio padrão pode ser NaN ou zero
-            if (
-                pd.isna(media_geral_bloco)
-                or pd.isna(sd_geral_bloco)
-                or sd_geral_bloco == 0
-            ):
-                print(
-                    f"Aviso: Média ou SD da coluna '{media_col}' é NaN. Notas para '{nota_final_col}' serão NaN."
-                )
-                df_result[nota_final_col] = np.nan
-            else:
-                limite_inf = media_geral_bloco - sd_geral_bloco
-                limite_sup = media_geral_bloco + sd_geral_bloco
-
-                # Define as condicoes com base nos limites
-                cond1 = df_result[media_col] < limite_inf
-                cond2 = (df_result[media_col] >= limite_inf) & (
-                    df_result[media_col] < media_geral_bloco
-                )
-                cond3 = (df_result[media_col] >= media_geral_bloco) & (
-                    df_result[media_col] < limite_sup
-                )
-                cond4 = df_result[media_col] >= limite_sup
-
-                conditions = [cond1, cond2, cond3, cond4]
-                choices = [-1, 1, 3, 5]
-
-                # Use default=np.nan para linhas onde media_col era originalmente NaN
-                df_result[nota_final_col] = np.select(
-                    conditions, choices, default=np.nan
-                )
-
-            blocos_processados += 1
-
-        except Exception:
-            # Limpeza de colunas criadas potencialmente se ocorrer erro no meio do cálculo
-            if nota_final_col in df_result.columns:
-                del df_result[nota_final_col]
-            # Manter media_col como foi calculada com sucesso antes deste bloco try
+            notas = df_result[lista_cols_nota].to_numpy(dtype=float)
+        except (TypeError, ValueError):
             continue
+        media, nota = _nota_bloco(notas, bloco)
+        df_result[f"media_bloco_{bloco}"] = media
+        df_result[f"nota_bloco_{bloco}"] = nota
 
     return df_result
 
@@ -1370,26 +765,14 @@ def sort_key(col_name):
     return (col_name, 0)
 
 
-def ordenar_df_com_notas(
-    df: pd.DataFrame,
+def _ordem_colunas(
+    colunas,
     colunas_base: List[str],
     sort_key_func: Callable,
     id_col: str = "id",
-) -> pd.DataFrame:
-    """
-    Reordena as colunas de um DataFrame para o formato
-    [id, outras_colunas_sem_bloco, base, nota_base, ..., colunas_com_bloco].
-
-    Args:
-        df (pd.DataFrame): DataFrame de entrada (geralmente combinado).
-        colunas_base (List[str]): Lista dos nomes base das colunas (ex: 'var_1').
-        sort_key_func (Callable): Função usada para ordenar as listas de colunas.
-        id_col (str, optional): Nome da coluna de identificação. Defaults to 'id'.
-
-    Returns:
-        pd.DataFrame: DataFrame com colunas reordenadas.
-    """
-    colunas_existentes_set = set(df.columns)
+) -> List[str]:
+    """Ordem das colunas usada por ordenar_df_com_notas (só pelos nomes)."""
+    colunas_existentes_set = set(colunas)
     nova_ordem_colunas = []
 
     # Adiciona coluna ID se existir
@@ -1449,33 +832,36 @@ def ordenar_df_com_notas(
     colunas_bloco_sorted = sorted(colunas_bloco, key=sort_key_func)
     nova_ordem_colunas.extend(colunas_bloco_sorted)
 
-    # 8. Verificação final para garantir que todas as colunas existem e retorna o DataFrame reordenado
-    cols_existentes_na_ordem_final = [
-        col for col in nova_ordem_colunas if col in colunas_existentes_set
-    ]
+    # 8. Verificação final para garantir que todas as colunas existem
+    return [col for col in nova_ordem_colunas if col in colunas_existentes_set]
 
-    return df[cols_existentes_na_ordem_final]
 
-
-def renomear_colunas_mapeadas(
+def ordenar_df_com_notas(
     df: pd.DataFrame,
-    map_df: pd.DataFrame,
-    map_from_col: str = "var",
-    map_to_col: str = "coluna",
+    colunas_base: List[str],
+    sort_key_func: Callable,
+    id_col: str = "id",
 ) -> pd.DataFrame:
     """
-    Renomeia colunas do DataFrame baseadas em um mapeamento de outro DataFrame.
-    Procura por padrões 'map_from_col_value' e 'nota_map_from_col_value'.
+    Reordena as colunas de um DataFrame para o formato
+    [id, outras_colunas_sem_bloco, base, nota_base, ..., colunas_com_bloco].
 
     Args:
-        df (pd.DataFrame): DataFrame cujas colunas serão renomeadas.
-        map_df (pd.DataFrame): DataFrame contendo o mapeamento.
-        map_from_col (str, optional): Nome da coluna em map_df com os nomes atuais. Defaults to 'var'.
-        map_to_col (str, optional): Nome da coluna em map_df com os nomes novos. Defaults to 'coluna'.
+        df (pd.DataFrame): DataFrame de entrada (geralmente combinado).
+        colunas_base (List[str]): Lista dos nomes base das colunas (ex: 'var_1').
+        sort_key_func (Callable): Função usada para ordenar as listas de colunas.
+        id_col (str, optional): Nome da coluna de identificação. Defaults to 'id'.
 
     Returns:
-        pd.DataFrame: DataFrame com colunas renomeadas.
+        pd.DataFrame: DataFrame com colunas reordenadas.
     """
+    return df[_ordem_colunas(df.columns, colunas_base, sort_key_func, id_col)]
+
+
+def _mapa_renomeacao(
+    colunas, map_df: pd.DataFrame, map_from_col: str, map_to_col: str
+) -> dict:
+    """Mapeamento {coluna: novo nome} usado por renomear_colunas_mapeadas."""
     # Cria o dicionário de mapeamento, tratando possíveis NaNs
     map_df_clean = map_df.dropna(subset=[map_from_col, map_to_col])
     mapping_dict = pd.Series(
@@ -1487,7 +873,7 @@ def renomear_colunas_mapeadas(
     base_pattern_regex = re.compile(r"^(var_\d+)$")
     nota_pattern_regex = re.compile(r"^nota_(var_\d+)$")
 
-    for current_col in df.columns:
+    for current_col in colunas:
         match_nota = nota_pattern_regex.match(current_col)
         match_base = base_pattern_regex.match(current_col)
 
@@ -1508,7 +894,31 @@ def renomear_colunas_mapeadas(
         else:
             rename_mapping[current_col] = current_col
 
-    return df.rename(columns=rename_mapping)
+    return rename_mapping
+
+
+def renomear_colunas_mapeadas(
+    df: pd.DataFrame,
+    map_df: pd.DataFrame,
+    map_from_col: str = "var",
+    map_to_col: str = "coluna",
+) -> pd.DataFrame:
+    """
+    Renomeia colunas do DataFrame baseadas em um mapeamento de outro DataFrame.
+    Procura por padrões 'map_from_col_value' e 'nota_map_from_col_value'.
+
+    Args:
+        df (pd.DataFrame): DataFrame cujas colunas serão renomeadas.
+        map_df (pd.DataFrame): DataFrame contendo o mapeamento.
+        map_from_col (str, optional): Nome da coluna em map_df com os nomes atuais. Defaults to 'var'.
+        map_to_col (str, optional): Nome da coluna em map_df com os nomes novos. Defaults to 'coluna'.
+
+    Returns:
+        pd.DataFrame: DataFrame com colunas renomeadas.
+    """
+    return df.rename(
+        columns=_mapa_renomeacao(df.columns, map_df, map_from_col, map_to_col)
+    )
 
 
 def mapear_colunas_para_blocos_excel(
@@ -1683,3 +1093,447 @@ def formatar_cabecalhos_e_colunas_excel(
 
         adjusted_width = min(max(10, max_len + 3), 40)
         worksheet.set_column(col_idx, col_idx, adjusted_width, current_data_cell_format)
+
+
+# Inversão das notas das variáveis com ordem "invertido" (5 -> -1, 3 -> 1,
+# 1 -> 1, -1 -> 5)
+NOTAS_INVERTIDAS = {5: -1, 3: 1, 1: 1, -1: 5}
+
+
+def _inverter_notas(notas: np.ndarray) -> np.ndarray:
+    """Aplica NOTAS_INVERTIDAS; valores fora do mapeamento viram NaN."""
+    invertidas = np.full_like(notas, np.nan)
+    for nota, nota_invertida in NOTAS_INVERTIDAS.items():
+        invertidas[notas == nota] = nota_invertida
+    return invertidas
+
+
+# Cache persistente das notas por variável: cada coluna é identificada pelo
+# hash do seu conteúdo (mais tipo e teste de normalidade), e o arquivo guarda
+# as notas _1, _2, _3 e a nota final. Ao corrigir um indicador, só ele é
+# recalculado. O diretório pode ser apagado a qualquer momento.
+CAMINHO_CACHE_NOTAS = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "..", "data", "cache", "notas"
+)
+# Incrementar quando as regras das notas mudarem, invalidando o cache
+VERSAO_CACHE_NOTAS = 1
+
+
+def _chave_notas(coluna: np.ndarray, tipo: str, teste_normalidade) -> str:
+    """Hash do conteúdo de uma coluna do bloco, do tipo e do teste."""
+    if not isinstance(teste_normalidade, str):
+        teste_normalidade = (
+            f"{teste_normalidade.__module__}.{teste_normalidade.__qualname__}"
+        )
+    chave = hashlib.sha1(np.ascontiguousarray(coluna).tobytes())
+    chave.update(f"{tipo}|{teste_normalidade}|{VERSAO_CACHE_NOTAS}".encode())
+    return chave.hexdigest()
+
+
+def _ler_cache_notas(caminho_cache: str, chave: str, n_linhas: int):
+    """Notas (4 x linhas) guardadas para a chave, ou None."""
+    arquivo = os.path.join(caminho_cache, f"{chave}.npy")
+    if not os.path.exists(arquivo):
+        return None
+    try:
+        notas = np.load(arquivo)
+    except (OSError, ValueError):
+        return None
+    return notas if notas.shape == (4, n_linhas) else None
+
+
+def _gravar_cache_notas(caminho_cache: str, chave: str, notas: np.ndarray) -> None:
+    """Grava as notas de uma variável (arquivo temporário + rename)."""
+    os.makedirs(caminho_cache, exist_ok=True)
+    arquivo = os.path.join(caminho_cache, f"{chave}.npy")
+    # Vários processos (ranquear_lote) podem gravar a mesma chave
+    temporario = f"{arquivo}.{os.getpid()}.tmp"
+    with open(temporario, "wb") as destino:
+        np.save(destino, notas)
+    os.replace(temporario, arquivo)
+
+
+def _notas_finais_tipo(
+    base: pd.DataFrame,
+    colunas: List[str],
+    tipo: str,
+    teste_normalidade,
+    caminho_cache: str = None,
+) -> np.ndarray:
+    """
+    Notas finais (linhas x variáveis) das colunas de um tipo, usando o cache
+    por variável quando caminho_cache é informado: só as colunas sem notas
+    guardadas passam pelo kernel.
+    """
+    bloco = _bloco_numerico(base, colunas)
+    if caminho_cache is None:
+        return _nota_final_bloco(
+            _notas_bloco(bloco, tipo, teste_normalidade=teste_normalidade)
+        )
+
+    finais = np.empty_like(bloco)
+    chaves = [
+        _chave_notas(bloco[:, j], tipo, teste_normalidade) for j in range(len(colunas))
+    ]
+    faltantes = []
+    for j, chave in enumerate(chaves):
+        notas = _ler_cache_notas(caminho_cache, chave, bloco.shape[0])
+        if notas is None:
+            faltantes.append(j)
+        else:
+            finais[:, j] = notas[3]
+
+    if faltantes:
+        notas = _notas_bloco(
+            np.asfortranarray(bloco[:, faltantes]),
+            tipo,
+            teste_normalidade=teste_normalidade,
+        )
+        final = _nota_final_bloco(notas)
+        for i, j in enumerate(faltantes):
+            finais[:, j] = final[:, i]
+            _gravar_cache_notas(
+                caminho_cache,
+                chaves[j],
+                np.vstack(
+                    [notas[1][:, i], notas[2][:, i], notas[3][:, i], final[:, i]]
+                ),
+            )
+    return finais
+
+
+def ranquear(
+    base: pd.DataFrame,
+    classificacao: pd.DataFrame,
+    colunas_de_renomeacao: str = "descricao",
+    teste_normalidade="lilliefors",
+    casas_decimais: int = 3,
+    caminho_cache: str = CAMINHO_CACHE_NOTAS,
+) -> pd.DataFrame:
+    """
+    Executa o ranqueamento completo de uma base.
+
+    Calcula as notas de cada tipo de variável, a nota final, a inversão das
+    variáveis com ordem "invertido", as notas dos blocos e as médias gerais,
+    e devolve o DataFrame final já ordenado e renomeado (o mesmo resultado
+    do script ranqueamento.py, sem a gravação do Excel).
+
+    As notas são calculadas direto nos arrays numéricos e escritas em uma
+    única matriz (notas finais + média/nota de cada bloco); o DataFrame final
+    é montado uma vez a partir dela e das colunas da base.
+
+    As notas de cada variável dependem só da sua coluna e ficam em cache:
+    numa nova execução, só as variáveis alteradas são recalculadas, e as
+    etapas de inversão, blocos e médias gerais são refeitas.
+
+    Args:
+        base (pd.DataFrame): Base com a coluna 'id' e as variáveis ('var_X').
+        classificacao (pd.DataFrame): Colunas 'var', 'tipo', 'ordem' e,
+            opcionalmente, 'bloco' e a coluna de renomeação.
+        colunas_de_renomeacao (str): Coluna da classificacao com os nomes
+            finais ("descricao" ou "coluna").
+        teste_normalidade (str | Callable): Ver TESTES_NORMALIDADE.
+        casas_decimais (int): Arredondamento das colunas numéricas (None para
+            não arredondar).
+        caminho_cache (str): Diretório do cache de notas por variável (ver
+            CAMINHO_CACHE_NOTAS); None para recalcular tudo.
+
+    Returns:
+        pd.DataFrame: Base, notas das variáveis, médias/notas dos blocos e
+                      médias gerais.
+    """
+    colunas_tipo = {
+        tipo: classificacao.loc[classificacao["tipo"] == tipo, "var"].tolist()
+        for tipo in TIPOS_NOTA
+    }
+    variaveis = [var for tipo in TIPOS_NOTA for var in colunas_tipo[tipo]]
+    colunas_nota = [f"nota_{var}" for var in variaveis]
+
+    dicionario_bloco = {}
+    if "bloco" in classificacao.columns:
+        dicionario_bloco = classificacao.set_index("var")["bloco"].to_dict()
+    blocos = _blocos_das_notas(colunas_nota, dicionario_bloco)
+
+    # Matriz de resultados: notas finais das variáveis, seguidas de
+    # media_bloco/nota_bloco de cada bloco
+    matriz = np.empty((len(base), len(variaveis) + 2 * len(blocos)))
+    inicio = 0
+    for tipo in TIPOS_NOTA:
+        colunas = colunas_tipo[tipo]
+        if colunas:
+            matriz[:, inicio : inicio + len(colunas)] = _notas_finais_tipo(
+                base, colunas, tipo, teste_normalidade, caminho_cache
+            )
+        inicio += len(colunas)
+
+    if "ordem" in classificacao.columns:
+        ordem = classificacao.set_index("var")["ordem"].to_dict()
+        invertidas = [
+            j for j, var in enumerate(variaveis) if ordem.get(var) == "invertido"
+        ]
+        matriz[:, invertidas] = _inverter_notas(matriz[:, invertidas])
+
+    indice_coluna = {nome: j for j, nome in enumerate(colunas_nota)}
+    nomes_matriz = list(colunas_nota)
+    for bloco, colunas_bloco in blocos.items():
+        media, nota = _nota_bloco(
+            matriz[:, [indice_coluna[col] for col in colunas_bloco]], bloco
+        )
+        matriz[:, len(nomes_matriz)] = media
+        matriz[:, len(nomes_matriz) + 1] = nota
+        nomes_matriz += [f"media_bloco_{bloco}", f"nota_bloco_{bloco}"]
+    indice_matriz = {nome: j for j, nome in enumerate(nomes_matriz)}
+
+    # Ordem e nomes finais, a partir só dos nomes das colunas
+    colunas_base = ["id"] + [col for col in base.columns if col != "id"]
+    ordem_colunas = _ordem_colunas(
+        colunas_base + nomes_matriz, classificacao["var"].tolist(), sort_key
+    )
+    novos_nomes = _mapa_renomeacao(
+        ordem_colunas, classificacao, "var", colunas_de_renomeacao
+    )
+
+    # Médias gerais das médias e das notas dos blocos (antes do arredondamento)
+    medias_gerais = {}
+    for prefixo, nome_media in [
+        ("media_bloco_", "Média Geral dos Blocos"),
+        ("nota_bloco_", "Média Geral das Notas dos Blocos"),
+    ]:
+        colunas_media = [
+            indice_matriz[col] for col in ordem_colunas if col.startswith(prefixo)
+        ]
+        if colunas_media:
+            medias_gerais[nome_media] = _media_linhas(matriz[:, colunas_media])
+
+    if casas_decimais is not None:
+        np.round(matriz, casas_decimais, out=matriz)
+    valores = []
+    for col in ordem_colunas:
+        if col in indice_matriz:
+            valores.append(matriz[:, indice_matriz[col]])
+        else:
+            serie = base[col]
+            if casas_decimais is not None and pd.api.types.is_float_dtype(serie):
+                serie = serie.round(casas_decimais)
+            valores.append(serie.array)
+    nomes = [novos_nomes[col] for col in ordem_colunas]
+
+    for nome_media, media in medias_gerais.items():
+        if casas_decimais is not None:
+            media = media.round(casas_decimais)
+        valores.append(media)
+        nomes.append(nome_media)
+
+    df_final = pd.DataFrame(dict(enumerate(valores)), index=pd.RangeIndex(len(base)))
+    df_final.columns = nomes
+    return df_final
+
+
+def salvar_ranqueamento(
+    df_final: pd.DataFrame,
+    classificacao: pd.DataFrame,
+    arquivo_saida: str,
+    colunas_de_renomeacao: str = "descricao",
+    nome_planilha: str = "ranqueamento",
+) -> bool:
+    """
+    Grava o resultado de ranquear em Excel, com os cabeçalhos e colunas
+    coloridos por bloco.
+
+    Returns:
+        bool: True se o arquivo foi salvo.
+    """
+    colunas_por_bloco = mapear_colunas_para_blocos_excel(
+        df_final, classificacao, colunas_de_renomeacao
+    )
+    mapa_cores = definir_cores_para_blocos_excel(colunas_por_bloco)
+
+    pasta = os.path.dirname(arquivo_saida)
+    if pasta:
+        os.makedirs(pasta, exist_ok=True)
+    writer, workbook, worksheet = iniciar_excel_e_escrever_dados(
+        df_final, arquivo_saida, nome_planilha
+    )
+    if not writer:
+        print("ERRO: Não foi possível iniciar o escritor de Excel. Arquivo não gerado.")
+        return False
+
+    formatar_cabecalhos_e_colunas_excel(
+        worksheet, workbook, df_final, colunas_por_bloco, mapa_cores
+    )
+    try:
+        writer.close()
+        print(f"Arquivo Excel formatado salvo com sucesso em: {arquivo_saida}")
+        return True
+    except Exception as e_save:
+        print(f"ERRO CRÍTICO ao salvar o arquivo Excel: {e_save}")
+        return False
+
+
+# Classificações do lote (por hash do conteúdo), compartilhadas com os
+# processos pelo initializer
+_CLASSIFICACOES_LOTE = {}
+
+
+def _usar_classificacoes(classificacoes: dict) -> None:
+    """Define as classificações do lote no processo atual."""
+    global _CLASSIFICACOES_LOTE
+    _CLASSIFICACOES_LOTE = classificacoes
+
+
+def _chave_classificacao(classificacao: pd.DataFrame) -> str:
+    """Hash do conteúdo (nomes das colunas e valores) de uma classificação."""
+    conteudo = pd.util.hash_pandas_object(classificacao, index=False).to_numpy()
+    chave = hashlib.sha1(conteudo.tobytes())
+    chave.update(repr(list(classificacao.columns)).encode())
+    return chave.hexdigest()
+
+
+def _resultado_lote(
+    nome: str, inicio: float, arquivo_saida: str, erro: str = None
+) -> dict:
+    """Linha do resumo de ranquear_lote para uma base."""
+    return {
+        "base": nome,
+        "sucesso": erro is None,
+        "segundos": round(time.time() - inicio, 2),
+        "arquivo": arquivo_saida,
+        "erro": erro,
+    }
+
+
+def _ranquear_item_lote(tarefa: tuple) -> dict:
+    """Ranqueia e grava uma base do lote, devolvendo o tempo e o erro."""
+    (
+        nome,
+        origem,
+        chave,
+        arquivo_saida,
+        colunas_de_renomeacao,
+        teste,
+        caminho_cache,
+    ) = tarefa
+    inicio = time.time()
+    erro = None
+    try:
+        if isinstance(origem, pd.DataFrame):
+            base = origem
+        else:
+            base = pd.read_excel(
+                origem, sheet_name="base_ranqueamento", engine="calamine"
+            )
+        classificacao = _CLASSIFICACOES_LOTE[chave]
+        df_final = ranquear(
+            base=base,
+            classificacao=classificacao,
+            colunas_de_renomeacao=colunas_de_renomeacao,
+            teste_normalidade=teste,
+            caminho_cache=caminho_cache,
+        )
+        if not salvar_ranqueamento(
+            df_final, classificacao, arquivo_saida, colunas_de_renomeacao
+        ):
+            erro = "Arquivo Excel não gerado"
+    except Exception as e:
+        erro = f"{type(e).__name__}: {e}"
+    return _resultado_lote(nome, inicio, arquivo_saida, erro)
+
+
+def ranquear_lote(
+    bases,
+    caminho_saida: str = "resultados",
+    colunas_de_renomeacao="descricao",
+    processos: int = None,
+    teste_normalidade="lilliefors",
+    caminho_cache: str = CAMINHO_CACHE_NOTAS,
+) -> pd.DataFrame:
+    """
+    Ranqueia várias bases em paralelo, gravando um Excel por base
+    (caminho_saida/ranqueamento_<nome>.xlsx).
+
+    As abas de classificação são lidas uma vez no processo principal; as
+    idênticas (mesmo conteúdo) são compartilhadas por todas as bases que as
+    usam. As bases são lidas e ranqueadas nos processos. Uma planilha com
+    erro (inclusive na aba de classificação) só gera uma linha com
+    sucesso=False, sem interromper o lote.
+
+    Args:
+        bases (dict | list): {nome: item} ou lista de itens. Cada item é o
+            caminho de uma planilha com as abas 'base_ranqueamento' e
+            'classificacao' ou uma tupla (base, classificacao) de DataFrames.
+            Em listas, o nome vem do arquivo (base_<nome>.xlsx -> <nome>).
+        caminho_saida (str): Diretório dos resultados.
+        colunas_de_renomeacao (str | dict): Coluna de renomeação (ver
+            ranquear), única ou por nome de base.
+        processos (int, optional): Número de processos. Padrão: um por
+            núcleo (limitado ao número de bases). Com 1, processa em série.
+        teste_normalidade (str | Callable): Ver TESTES_NORMALIDADE.
+        caminho_cache (str): Cache de notas por variável (ver ranquear).
+
+    Returns:
+        pd.DataFrame: Uma linha por base (base, sucesso, segundos, arquivo,
+                      erro).
+    """
+    if not isinstance(bases, dict):
+        itens = {}
+        for i, item in enumerate(bases):
+            if isinstance(item, tuple):
+                nome = f"base_{i + 1}"
+            else:
+                nome = os.path.splitext(os.path.basename(item))[0]
+                nome = nome[len("base_") :] if nome.startswith("base_") else nome
+            itens[nome] = item
+        bases = itens
+
+    classificacoes, tarefas, falhas = {}, [], {}
+    for nome, item in bases.items():
+        arquivo_saida = os.path.join(caminho_saida, f"ranqueamento_{nome}.xlsx")
+        inicio = time.time()
+        try:
+            if isinstance(item, tuple):
+                origem, classificacao = item
+            else:
+                origem = item
+                classificacao = pd.read_excel(
+                    item, sheet_name="classificacao", engine="calamine"
+                )
+            chave = _chave_classificacao(classificacao)
+        except Exception as e:
+            falhas[nome] = _resultado_lote(
+                nome, inicio, arquivo_saida, f"{type(e).__name__}: {e}"
+            )
+            continue
+        classificacoes.setdefault(chave, classificacao)
+        renomeacao = (
+            colunas_de_renomeacao.get(nome, "descricao")
+            if isinstance(colunas_de_renomeacao, dict)
+            else colunas_de_renomeacao
+        )
+        tarefas.append(
+            (
+                nome,
+                origem,
+                chave,
+                arquivo_saida,
+                renomeacao,
+                teste_normalidade,
+                caminho_cache,
+            )
+        )
+
+    if not bases:
+        return pd.DataFrame(columns=["base", "sucesso", "segundos", "arquivo", "erro"])
+    processos = min(processos or os.cpu_count() or 1, len(tarefas))
+    if processos <= 1:
+        _usar_classificacoes(classificacoes)
+        resultados = [_ranquear_item_lote(tarefa) for tarefa in tarefas]
+    else:
+        with executor_processos(
+            processos, _usar_classificacoes, (classificacoes,)
+        ) as executor:
+            resultados = list(executor.map(_ranquear_item_lote, tarefas))
+
+    # Resumo na ordem das bases, com as que falharam na leitura
+    resultados = {resultado["base"]: resultado for resultado in resultados}
+    resultados.update(falhas)
+    return pd.DataFrame([resultados[nome] for nome in bases])
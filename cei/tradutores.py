@@ -0,0 +1,114 @@
+import hashlib
+import json
+import os
+
+import pandas as pd
+import pyarrow as pa
+
+# Cache dos tradutores: cada planilha/CSV é convertido uma vez para um arquivo
+# Arrow IPC, que nas execuções seguintes é lido por memory-map (sem parsing).
+CAMINHO_CACHE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "data", "cache", "tradutores"
+)
+
+LEITORES = {"excel": pd.read_excel, "csv": pd.read_csv}
+
+
+def _arquivos_cache(
+    caminho_arquivo: str, leitor: str, kwargs: dict, caminho_cache: str
+) -> tuple:
+    """
+    Monta o nome do arquivo de cache de uma leitura.
+
+    O prefixo identifica o arquivo de origem e os argumentos de leitura; o
+    sufixo identifica a versão (mtime e tamanho) do arquivo de origem.
+
+    Returns:
+        tuple: (arquivo_cache, prefixo).
+    """
+    caminho_abs = os.path.abspath(caminho_arquivo)
+    stat = os.stat(caminho_abs)
+    chave = json.dumps([caminho_abs, leitor, sorted(kwargs.items())], default=str)
+    nome = os.path.splitext(os.path.basename(caminho_abs))[0]
+    prefixo = f"{nome}_{hashlib.sha1(chave.encode()).hexdigest()[:12]}"
+    versao = f"{stat.st_mtime_ns}_{stat.st_size}"
+    return os.path.join(caminho_cache, f"{prefixo}_{versao}.arrow"), prefixo
+
+
+def _ler_com_cache(
+    leitor: str, caminho_arquivo: str, caminho_cache: str, **kwargs
+) -> pd.DataFrame:
+    """Lê um tradutor pelo cache Arrow, criando o cache na primeira leitura."""
+    arquivo_cache, prefixo = _arquivos_cache(
+        caminho_arquivo, leitor, kwargs, caminho_cache
+    )
+    if os.path.exists(arquivo_cache):
+        with pa.memory_map(arquivo_cache) as fonte:
+            return pa.ipc.open_file(fonte).read_all().to_pandas()
+
+    df = LEITORES[leitor](caminho_arquivo, **kwargs)
+    try:
+        tabela = pa.Table.from_pandas(df)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Colunas com tipos misturados não têm representação Arrow fiel;
+        # nesse caso o tradutor segue sendo lido da origem
+        return df
+
+    # Remove as versões antigas do mesmo tradutor
+    os.makedirs(caminho_cache, exist_ok=True)
+    for nome in os.listdir(caminho_cache):
+        antigo = os.path.join(caminho_cache, nome)
+        if (
+            nome.startswith(prefixo + "_")
+            and nome.endswith(".arrow")
+            and antigo != arquivo_cache
+        ):
+            os.remove(antigo)
+
+    # Grava em arquivo temporário e renomeia, pois várias execuções (ex: uma
+    # por UF) podem criar o mesmo cache ao mesmo tempo
+    temporario = f"{arquivo_cache}.{os.getpid()}.tmp"
+    with pa.OSFile(temporario, "wb") as destino:
+        with pa.ipc.new_file(destino, tabela.schema) as escritor:
+            escritor.write_table(tabela)
+    os.replace(temporario, arquivo_cache)
+    return df
+
+
+def ler_excel(
+    caminho_arquivo: str, caminho_cache: str = CAMINHO_CACHE, **kwargs
+) -> pd.DataFrame:
+    """
+    Lê uma planilha de tradutor (uma aba) com cache Arrow.
+
+    O cache é indexado pelo caminho, pelos argumentos de leitura e pela data
+    de modificação/tamanho da planilha: ao editar a planilha, a próxima
+    leitura refaz o cache.
+
+    Args:
+        caminho_arquivo (str): Caminho da planilha.
+        caminho_cache (str): Diretório do cache.
+        **kwargs: Argumentos repassados ao pd.read_excel (ex: engine,
+            sheet_name, usecols).
+
+    Returns:
+        pd.DataFrame: O mesmo resultado do pd.read_excel.
+    """
+    return _ler_com_cache("excel", caminho_arquivo, caminho_cache, **kwargs)
+
+
+def ler_csv(
+    caminho_arquivo: str, caminho_cache: str = CAMINHO_CACHE, **kwargs
+) -> pd.DataFrame:
+    """
+    Lê um CSV de tradutor com cache Arrow (mesmas regras de ler_excel).
+
+    Args:
+        caminho_arquivo (str): Caminho do CSV.
+        caminho_cache (str): Diretório do cache.
+        **kwargs: Argumentos repassados ao pd.read_csv.
+
+    Returns:
+        pd.DataFrame: O mesmo resultado do pd.read_csv.
+    """
+    return _ler_com_cache("csv", caminho_arquivo, caminho_cache, **kwargs)
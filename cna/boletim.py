@@ -1,31 +1,59 @@
 # %%
 import pandas as pd
 import time
+import sys
+
+sys.path.append("../cei")
+import comexstat  # noqa: E402
+import tradutores  # noqa: E402
 
 script_start_time = time.time()
 
 print("Script iniciado")
 
 ultimo_ano = 2025
-tradutor_agro = pd.read_excel("data/tradutor_agrostat.xlsx")
-tradutor_pais = pd.read_excel("data/tradutor_pais.xlsx")
-tradutor_ue = pd.read_excel("data/tradutor_ue.xlsx")
-
-df_exp_completa = pd.read_csv(
-    "../data/EXP_COMPLETA.csv", sep=";", engine="pyarrow"
-).query("CO_ANO > 2009")
+tradutor_agro = tradutores.ler_excel("data/tradutor_agrostat.xlsx")
+tradutor_pais = tradutores.ler_excel("data/tradutor_pais.xlsx")
+tradutor_ue = tradutores.ler_excel("data/tradutor_ue.xlsx")
+
+ano_inicial = 2010
+
+# "pandas" carrega as bases e agrega em memória; "duckdb" agrega por SQL direto
+# no dataset Parquet, sem carregar as bases completas
+motor = "pandas"
+
+# Exportação e importação em uma base só (coluna FLUXO): as agregações e os
+# tradutores são aplicados uma vez para os dois fluxos
+if motor == "pandas":
+    df_comex_completa = comexstat.ler_comexstat_fluxos(
+        ano_minimo=ano_inicial,
+        colunas=["CO_ANO", "CO_MES", "CO_NCM", "CO_PAIS", "KG_LIQUIDO", "VL_FOB"],
+    )
+else:
+    df_comex_completa = None
+
+
+def agregar_comex(df, colunas):
+    """
+    Soma KG_LIQUIDO e VL_FOB por FLUXO e pelas colunas. Com motor="duckdb",
+    df é ignorado e a soma é feita no dataset Parquet.
+    """
+    if motor == "duckdb":
+        return comexstat.agregar_duckdb(
+            ["EXP", "IMP"], colunas, ["KG_LIQUIDO", "VL_FOB"], ano_minimo=ano_inicial
+        )
+    return df.groupby(["FLUXO"] + colunas, as_index=False, observed=True).agg(
+        {"KG_LIQUIDO": "sum", "VL_FOB": "sum"}
+    )
 
 
-df_imp_completa = pd.read_csv(
-    "../data/IMP_COMPLETA.csv", sep=";", engine="pyarrow"
-).query("CO_ANO > 2009")
+def separar_fluxo(df, fluxo):
+    return df[df["FLUXO"] == fluxo].drop(columns=["FLUXO"]).reset_index(drop=True)
 
 
 def ajuste_mes_ncm_pais(df, tradutor_agro, tradutor_pais):
     return (
-        df.groupby(["CO_ANO", "CO_MES", "CO_NCM", "CO_PAIS"], as_index=False)
-        .agg({"KG_LIQUIDO": "sum", "VL_FOB": "sum"})
-        .merge(
+        df.merge(
             tradutor_agro[["NCM", "Setores", "Produtos"]],
             left_on="CO_NCM",
             right_on="NCM",
@@ -37,7 +65,7 @@ def ajuste_mes_ncm_pais(df, tradutor_agro, tradutor_pais):
 
 
 def ajuste_comex_total(df):
-    return df.groupby(["CO_ANO", "CO_MES"], as_index=False).agg(
+    return df.groupby(["FLUXO", "CO_ANO", "CO_MES"], as_index=False, observed=True).agg(
         {"KG_LIQUIDO": "sum", "VL_FOB": "sum"}
     )
 
@@ -105,12 +133,19 @@ def ajuste_setores_interesse(df_exp_mes_ncm_pais, df_exp_total, setores_interess
     )
 
 
+# Exportacao e importacao agregadas em uma passada
+df_comex_ncm_pais = agregar_comex(
+    df_comex_completa, ["CO_ANO", "CO_MES", "CO_NCM", "CO_PAIS"]
+)
+df_comex_mes_ncm_pais = ajuste_mes_ncm_pais(
+    df=df_comex_ncm_pais, tradutor_agro=tradutor_agro, tradutor_pais=tradutor_pais
+)
+df_comex_total = ajuste_comex_total(df_comex_ncm_pais)
+
 # Exportacao
 
-df_exp_mes_ncm_pais = ajuste_mes_ncm_pais(
-    df=df_exp_completa, tradutor_agro=tradutor_agro, tradutor_pais=tradutor_pais
-)
-df_exp_total = ajuste_comex_total(df_exp_completa)
+df_exp_mes_ncm_pais = separar_fluxo(df_comex_mes_ncm_pais, "EXP")
+df_exp_total = separar_fluxo(df_comex_total, "EXP")
 
 df_exp_agro = ajuste_comex_agro(df_exp_mes_ncm_pais)
 
@@ -137,11 +172,9 @@ df_exp_setores_interesse = ajuste_setores_interesse(
 )
 
 # ARQUIVO IMP_MES_TOTAL_AGRO
-df_imp_mes_ncm_pais = ajuste_mes_ncm_pais(
-    df=df_imp_completa, tradutor_agro=tradutor_agro, tradutor_pais=tradutor_pais
-)
+df_imp_mes_ncm_pais = separar_fluxo(df_comex_mes_ncm_pais, "IMP")
 
-df_imp_total = ajuste_comex_total(df_imp_completa)
+df_imp_total = separar_fluxo(df_comex_total, "IMP")
 
 df_imp_agro = ajuste_comex_agro(df_imp_mes_ncm_pais)
 
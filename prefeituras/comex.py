@@ -1,5 +1,9 @@
 # %%
 import pandas as pd
+import sys
+
+sys.path.append("../cei")
+import comexstat  # noqa: E402
 
 caminho = "D:/OneDrive - Associacao Antonio Vieira/UAPP_ProjetoCEI/Prefeituras/Comex/"
 # Tradutores
@@ -9,13 +13,11 @@ trad_sh4 = pd.read_excel(caminho + "bases/trad_sh4.xlsx").assign(
 trad_mun = pd.read_excel(caminho + "bases/trad_mun.xlsx").astype({"id_mun": str})
 trad_pais = pd.read_excel(caminho + "bases/trad_pais.xlsx")
 
-# Base Comex
-df_comex_mun_raw = pd.read_csv(
-    "../data/EXP_COMPLETA_MUN.csv", sep=";", encoding="latin1", engine="pyarrow"
-)
-
 anos = range(2019, 2026)
 
+# Base Comex (apenas a partição do RS no dataset municipal)
+df_comex_mun_raw = comexstat.ler_comexstat("MUN", anos=anos, ufs="RS")
+
 cols_to_rename = {
     "CO_ANO": "ano",
     "CO_MES": "mes",
@@ -35,7 +37,6 @@ def ajuste_comex_mun(df_raw, anos, cols_to_rename):
         .rename(columns=cols_to_rename)
         .assign(
             id_mun=lambda x: x["id_mun"].astype(str),
-            id_sh4=lambda x: x["id_sh4"].astype(str).str.zfill(4),
         )
         .merge(trad_sh4, on="id_sh4", how="left")
         .merge(trad_mun, on="id_mun", how="left")